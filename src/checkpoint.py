@@ -0,0 +1,221 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple, JsonPlusSerializer
+
+from src.config import CHECKPOINT_PATH
+from src.results import ResultStore
+
+# Checkpointed runs (python -m src run --checkpoint, then --resume RUN_ID after a crash). The micro-batch
+# StateGraph is compiled with this SQLite checkpointer, thread_id = run id, so LangGraph commits the chunk
+# state after every node: a chunk that finished detection is never sent to the LLM again, and a chunk that
+# was logged is never logged again. Resuming replays at most the one node that was running, and its writes
+# are idempotent (Notion and the issue index are keyed by error_hash, the sqlite sink upserts).
+# The saver implements LangGraph's public BaseCheckpointSaver over tables this module owns, so old
+# checkpoints can be pruned: only the newest of a run are kept, and all of them are removed once the run
+# finishes. The `runs` table remembers what each run was reading so --resume needs no other flags.
+
+# newest checkpoints kept per run; resuming needs only the latest
+KEEP = 2
+
+_STORE = "__result_store__"
+
+
+class _Serde:
+    # LangGraph's JSON serializer, through its public dumps/loads; a ResultStore (not a pydantic model)
+    # travels as the list of its EnrichedErrors and is rebuilt on load
+    def __init__(self) -> None:
+        self._json = JsonPlusSerializer()
+
+    def _out(self, obj: Any) -> Any:
+        if isinstance(obj, ResultStore):
+            return {_STORE: list(obj)}
+        if isinstance(obj, dict):
+            return {k: self._out(v) for k, v in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self._out(v) for v in obj)
+        return obj
+
+    def _in(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            if len(obj) == 1 and _STORE in obj:
+                return ResultStore(obj[_STORE])
+            return {k: self._in(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self._in(v) for v in obj]
+        return obj
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._json.dumps(self._out(obj))
+
+    def loads(self, data: bytes) -> Any:
+        return self._in(self._json.loads(data))
+
+
+def _config(run_id: str, ts: Optional[str]) -> Optional[Dict[str, Any]]:
+    return {"configurable": {"thread_id": run_id, "thread_ts": ts}} if ts else None
+
+
+class RunSaver(BaseCheckpointSaver):
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        super().__init__(serde=_Serde())
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            # WAL + NORMAL survives a killed process, which is what checkpoints are for
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS run_checkpoints (
+                    run_id TEXT NOT NULL,
+                    ts TEXT NOT NULL,
+                    parent_ts TEXT,
+                    checkpoint BLOB NOT NULL,
+                    metadata BLOB NOT NULL,
+                    PRIMARY KEY (run_id, ts)
+                )"""
+            )
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS run_writes (
+                    run_id TEXT NOT NULL,
+                    ts TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    PRIMARY KEY (run_id, ts, task_id, idx)
+                )"""
+            )
+            self.conn.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    # BaseCheckpointSaver
+
+    def get_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
+        run_id = str(config["configurable"]["thread_id"])
+        ts = config["configurable"].get("thread_ts")
+        with self.lock:
+            if ts:
+                row = self.conn.execute("SELECT ts, parent_ts, checkpoint, metadata FROM run_checkpoints "
+                                        "WHERE run_id = ? AND ts = ?", (run_id, str(ts))).fetchone()
+            else:
+                row = self.conn.execute("SELECT ts, parent_ts, checkpoint, metadata FROM run_checkpoints "
+                                        "WHERE run_id = ? ORDER BY ts DESC LIMIT 1", (run_id,)).fetchone()
+            if row is None:
+                return None
+            writes = self.conn.execute("SELECT task_id, channel, value FROM run_writes WHERE run_id = ? AND ts = ? "
+                                       "ORDER BY task_id, idx", (run_id, row[0])).fetchall()
+        return CheckpointTuple(_config(run_id, row[0]), self.serde.loads(row[2]), self.serde.loads(row[3]),
+                               _config(run_id, row[1]),
+                               [(task, channel, self.serde.loads(value)) for task, channel, value in writes])
+
+    def list(self, config: Optional[Dict[str, Any]], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query, args = "SELECT run_id, ts, parent_ts, checkpoint, metadata FROM run_checkpoints WHERE 1", []
+        if config is not None:
+            query += " AND run_id = ?"
+            args.append(str(config["configurable"]["thread_id"]))
+        if before is not None:
+            query += " AND ts < ?"
+            args.append(str(before["configurable"]["thread_ts"]))
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY ts DESC", args).fetchall()
+        n = 0
+        for run_id, ts, parent_ts, checkpoint, metadata in rows:
+            meta = self.serde.loads(metadata)
+            if filter and any(meta.get(k) != v for k, v in filter.items()):
+                continue
+            yield CheckpointTuple(_config(run_id, ts), self.serde.loads(checkpoint), meta, _config(run_id, parent_ts))
+            n += 1
+            if limit and n >= limit:
+                return
+
+    def put(self, config: Dict[str, Any], checkpoint: Dict[str, Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        run_id = str(config["configurable"]["thread_id"])
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO run_checkpoints VALUES (?, ?, ?, ?, ?)",
+                              (run_id, checkpoint["id"], config["configurable"].get("thread_ts"),
+                               self.serde.dumps(checkpoint), self.serde.dumps(metadata)))
+            # resuming needs only the newest checkpoints, and writes only belong to kept ones
+            self.conn.execute(
+                "DELETE FROM run_checkpoints WHERE run_id = ? AND ts NOT IN "
+                "(SELECT ts FROM run_checkpoints WHERE run_id = ? ORDER BY ts DESC LIMIT ?)",
+                (run_id, run_id, KEEP),
+            )
+            self.conn.execute(
+                "DELETE FROM run_writes WHERE run_id = ? AND ts NOT IN (SELECT ts FROM run_checkpoints WHERE run_id = ?)",
+                (run_id, run_id),
+            )
+            self.conn.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (time.time(), run_id))
+        return _config(run_id, checkpoint["id"])
+
+    def put_writes(self, config: Dict[str, Any], writes: List[Tuple[str, Any]], task_id: str) -> None:
+        run_id, ts = str(config["configurable"]["thread_id"]), str(config["configurable"]["thread_ts"])
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO run_writes VALUES (?, ?, ?, ?, ?, ?)",
+                                  [(run_id, ts, task_id, idx, channel, self.serde.dumps(value))
+                                   for idx, (channel, value) in enumerate(writes)])
+
+    # run registry
+
+    def run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT params, status, started_at, updated_at FROM runs WHERE run_id = ?",
+                                    (run_id,)).fetchone()
+        if row is None:
+            return None
+        return {"run_id": run_id, "params": json.loads(row[0]), "status": row[1],
+                "started_at": row[2], "updated_at": row[3]}
+
+    def runs(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            ids = [r[0] for r in self.conn.execute("SELECT run_id FROM runs ORDER BY started_at DESC")]
+        return [self.run(i) for i in ids]
+
+    def start(self, run_id: str, params: Dict[str, Any]) -> None:
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO runs VALUES (?, ?, 'running', ?, ?)", (run_id, json.dumps(params), now, now))
+
+    def has_checkpoint(self, run_id: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM run_checkpoints WHERE run_id = ? LIMIT 1",
+                                     (run_id,)).fetchone() is not None
+
+    def finish(self, run_id: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM run_checkpoints WHERE run_id = ?", (run_id,))
+            self.conn.execute("DELETE FROM run_writes WHERE run_id = ?", (run_id,))
+            self.conn.execute("UPDATE runs SET status = 'done', updated_at = ? WHERE run_id = ?", (time.time(), run_id))
+
+
+_saver: Optional[RunSaver] = None
+_lock = threading.Lock()
+
+
+def get_saver() -> RunSaver:
+    global _saver
+    if _saver is None:
+        with _lock:
+            if _saver is None:
+                _saver = RunSaver(CHECKPOINT_PATH)
+    return _saver
+
+
+def new_run_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
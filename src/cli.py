@@ -0,0 +1,368 @@
+import argparse
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# only argparse at import time: settings are read from the environment when src.config is imported,
+# so flags that map to settings are applied first, and each subcommand imports only what it needs
+
+COMMANDS = ("run", "shard", "issues", "serve")
+
+
+def _print_item(idx, e):
+    print(f"Review #{idx} ({e.review.review_id}, rating={e.review.rating})")
+    print(f"Text: {e.review.review}")
+    print(f" → Severity: {e.criticality}")
+    print(f" → Categories: {e.error.error_type}")
+    print(f" → Summary: {e.error.error_summary}")
+    print(f" → Rationale: {e.error.rationale}")
+    print()
+
+
+def _settings(p: argparse.ArgumentParser) -> None:
+    # flags shared by run, shard and serve
+    p.add_argument("--full", action="store_true",
+                   help="reprocess every row, not just reviews that are new or edited since the last run")
+    p.add_argument("--dry-run", action="store_true", help="print what would be logged instead of writing to Notion")
+    p.add_argument("--rules-only", action="store_true", help="keyword rules only; never loads or calls the LLM")
+    p.add_argument("--quiet", action="store_true", help="do not print every logged item")
+    p.add_argument("--metrics-json", default=None, help="where to write the JSON run report ('' = off)")
+    p.add_argument("--metrics-prom", default=None, help="also write Prometheus text format here")
+    p.add_argument("--sinks", default=None,
+                   help="where results go, comma-separated: notion,sqlite,jsonl,parquet (SINKS)")
+
+
+def _common(p: argparse.ArgumentParser) -> None:
+    # flags shared by run and shard
+    _settings(p)
+    p.add_argument("--top-issues", type=int, default=10,
+                   help="print the N worst / most reported issues from the issue index at the end (0 = none)")
+    p.add_argument("--export", default=None, metavar="PATH",
+                   help="also write every result to PATH, one row per error (.parquet needs pyarrow, or .csv)")
+
+
+def _parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="python -m src",
+                                 description="Detect, classify and log issues from customer reviews.")
+    sub = ap.add_subparsers(dest="command", metavar="{run,shard,issues,serve}")
+
+    run = sub.add_parser("run", help="process the review csv (default)")
+    run.add_argument("--stream", action="store_true",
+                     help="process the csv in micro-batches and log each batch as soon as it is ready")
+    run.add_argument("--chunk-size", type=int, default=None, help="reviews per micro-batch (STREAM_CHUNK_SIZE)")
+    run.add_argument("--checkpoint", action="store_true",
+                     help="micro-batches, with progress saved after every step so a crashed run can be resumed")
+    run.add_argument("--run-id", default=None, help="name for a --checkpoint run (default: its start time)")
+    run.add_argument("--resume", default=None, metavar="RUN_ID",
+                     help="continue a crashed --checkpoint run where it stopped (csv, offset, chunk size and --full "
+                          "come from the run; pass its other flags again)")
+    _common(run)
+
+    shard = sub.add_parser("shard", help="split the csv by review_id hash and process the shards in parallel")
+    shard.add_argument("--workers", type=int, default=None, help="worker processes (SHARD_WORKERS, 0 = one per core)")
+    shard.add_argument("--shards", type=int, default=None, help="number of shards (default: --workers)")
+    shard.add_argument("--only", type=int, action="append", default=None, metavar="K",
+                       help="run just shard K and stop, e.g. one per host sharing --checkpoint-dir (repeatable)")
+    shard.add_argument("--merge-only", action="store_true",
+                       help="merge and log shards that already finished (e.g. on other hosts)")
+    shard.add_argument("--run-id", default=None,
+                       help="checkpoint name; defaults to a hash of the csv and settings, so a re-run resumes")
+    shard.add_argument("--checkpoint-dir", default=None, help="where shard checkpoints live (STATE_DIR/shards)")
+    shard.add_argument("--chunk-size", type=int, default=None, help="csv rows per checkpoint (SHARD_CHUNK_SIZE)")
+    shard.add_argument("--keep-checkpoints", action="store_true", help="keep the checkpoints after a successful merge")
+    _common(shard)
+
+    issues = sub.add_parser("issues", help="list issues from the cross-review issue index")
+    issues.add_argument("--limit", type=int, default=20)
+
+    serve = sub.add_parser("serve", help="stay resident and process reviews posted over HTTP or dropped in a spool dir")
+    serve.add_argument("--host", default=None, help="HTTP address (SERVICE_HOST)")
+    serve.add_argument("--port", type=int, default=None, help="HTTP port, 0 = no HTTP endpoint (SERVICE_PORT)")
+    serve.add_argument("--spool", default=None, metavar="DIR", help="directory watched for review files (SERVICE_SPOOL_DIR)")
+    serve.add_argument("--batch-size", type=int, default=None, help="reviews per micro-batch (SERVICE_BATCH_SIZE)")
+    serve.add_argument("--batch-wait", type=float, default=None,
+                       help="seconds a micro-batch waits to fill after its first review (SERVICE_BATCH_WAIT)")
+    serve.add_argument("--queue-size", type=int, default=None,
+                       help="reviews queued before producers are pushed back (SERVICE_QUEUE_SIZE)")
+    _settings(serve)
+    serve.set_defaults(top_issues=0, export=None)
+    return ap
+
+
+def _report(args: argparse.Namespace) -> None:
+    from src import metrics
+    from src.config import ISSUE_INDEX_ENABLED, NOTION_MODE, METRICS_PATH, METRICS_PROM_PATH, DETECT_MODE
+    from src.graph import _dry_run
+    from src.issue_index import get_issue_index
+    from src.llm_cache import get_cache
+    from src.nodes.dedup import dedup_stats
+    from src.nodes.triage import triage_stats
+
+    # sharded runs triage and dedup in the worker processes, so the parent has nothing to show
+    if DETECT_MODE != "rules" and triage_stats()["reviews"]:
+        tr = triage_stats()
+        print(f"Triage: {tr['skipped']} of {tr['reviews']} reviews skipped the LLM "
+              f"(clean={tr['clean']} sampled={tr['sampled']} sampled_misses={tr['sampled_misses']})")
+        dd = dedup_stats()
+        if dd["enabled"]:
+            print(f"Dedup: {dd['reviews']} reviews in {dd['clusters']} clusters "
+                  f"(exact={dd['exact_duplicates']} near={dd['near_duplicates']}, LLM calls saved={dd['llm_calls_saved']})")
+    if ISSUE_INDEX_ENABLED or NOTION_MODE == "issue":
+        index = get_issue_index(":memory:") if _dry_run() else get_issue_index()
+        ist = index.stats()
+        print(f"Issues: {ist['mentions']} new mentions this run, {ist['issues']} distinct issues in the index")
+        for it in index.issues(limit=args.top_issues) if args.top_issues else []:
+            print(f"  {it['count']:>6}x [{it['criticality']}] {it['summary']} "
+                  f"({it['first_seen'][:10]} .. {it['last_seen'][:10]})")
+    # only if this run actually loaded them
+    if "src.llm_client" in sys.modules:
+        from src.llm_client import client_stats
+
+        print(f"LLM client stats: {client_stats()}")
+        cache = get_cache()
+        if cache:
+            print(f"LLM cache stats: {cache.stats()}")
+    from src.sinks import NotionSink, close_sinks, get_sinks
+
+    # only when Notion was written to (dry runs print instead, and SINKS may leave it out)
+    if any(isinstance(s, NotionSink) for s in get_sinks(_dry_run())):
+        from src.nodes.notion_logger import get_logger
+
+        st = get_logger().stats()
+        print(f"Notion: created={st['created']} updated={st['updated']} skipped={st['skipped']} failed={st['failed']}")
+        print(f"Notion stats: {st}")
+
+    # flushes file sinks (the parquet footer) before the run report
+    close_sinks()
+    json_path = METRICS_PATH if args.metrics_json is None else args.metrics_json
+    prom_path = METRICS_PROM_PATH if args.metrics_prom is None else args.metrics_prom
+    rep = metrics.export(json_path, prom_path)
+    for name, node in rep["nodes"].items():
+        print(f"[metrics] {name:<10} {node['seconds']:>8.2f}s  in={node['items_in']} out={node['items_out']}")
+    for name, sink in rep["sinks"].items():
+        print(f"[metrics] sink {name:<6} {sink['rows']} rows, p50 {sink['latency_ms'].get('p50', 0)}ms per batch"
+              f"{', ' + str(sink['errors']) + ' failed batches' if sink['errors'] else ''}")
+    lat = rep["llm"]["latency_ms"]
+    if lat["count"]:
+        print(f"[metrics] llm        {lat['count']} requests  p50={lat['p50']}ms p95={lat['p95']}ms "
+              f"tokens={rep['llm']['prompt_tokens']}+{rep['llm']['completion_tokens']}")
+    bad = {k: v for k, v in rep["llm"]["responses"].items() if k != "ok"}
+    if bad or rep["llm"]["items_dropped"]:
+        print(f"[metrics] replies    {rep['llm']['responses']}  items dropped={rep['llm']['items_dropped']}")
+    if rep["llm"]["escalations"] or len(rep["llm"]["by_model"]) > 1:
+        print(f"[metrics] routing    {rep['llm']['by_model']}  escalations={rep['llm']['escalations']}")
+    if rep["llm"]["concurrency_limit"] is not None:
+        print(f"[metrics] adaptive   limit={rep['llm']['concurrency_limit']:g} after "
+              f"{rep['llm']['concurrency_adjustments']} adjustments")
+    svc = rep["service"]
+    if svc["batches"]:
+        print(f"[metrics] service    {svc['reviews']} in {svc['batches']} batches, queue-to-logged "
+              f"p50={svc['latency_ms']['p50']}ms p95={svc['latency_ms']['p95']}ms, rejected={svc['rejected']}")
+    if json_path:
+        print(f"[metrics] report written to {json_path}")
+
+
+def _export(items: Iterable[Any], path: str) -> None:
+    from src.results import as_store
+
+    t0 = time.perf_counter()
+    store = as_store(items)
+    store.export(path)
+    print(f"[export] {len(store)} rows to {path} in {time.perf_counter() - t0:.2f}s")
+
+
+def _apply_flags(args: argparse.Namespace) -> None:
+    # before src.config is imported; shard workers inherit the environment too
+    if args.dry_run:
+        os.environ["NOTION_DRY_RUN"] = "1"
+    if args.rules_only:
+        os.environ["DETECT_MODE"] = "rules"
+    if args.sinks is not None:
+        os.environ["SINKS"] = args.sinks
+
+
+def _open_sinks() -> None:
+    # fail before any work if a sink is misnamed or its dependency is missing
+    from src.graph import _dry_run
+    from src.sinks import get_sinks
+
+    try:
+        get_sinks(_dry_run())
+    except (ImportError, ValueError) as ex:
+        raise SystemExit(f"error: {ex}")
+
+
+def _checkpoint_run(args: argparse.Namespace, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    # (run id, what it reads): a new run is registered, a resumed one reads what it started with
+    from src.checkpoint import get_saver, new_run_id
+
+    saver = get_saver()
+    if args.resume:
+        run = saver.run(args.resume)
+        if run is None:
+            known = ", ".join(r["run_id"] for r in saver.runs() if r["status"] != "done") or "none"
+            raise SystemExit(f"error: no checkpointed run {args.resume!r} (unfinished runs: {known})")
+        if run["status"] == "done":
+            raise SystemExit(f"error: run {args.resume!r} already finished")
+        print(f"[checkpoint] resuming run {args.resume}: {run['params']}")
+        return args.resume, run["params"]
+    run_id = args.run_id or new_run_id()
+    if saver.run(run_id) is not None:
+        raise SystemExit(f"error: run {run_id!r} already exists; pick another --run-id or --resume it")
+    saver.start(run_id, params)
+    print(f"[checkpoint] run {run_id}, saved to {saver.path}; "
+          f"if it stops, continue with: python -m src run --resume {run_id}")
+    return run_id, params
+
+
+def cmd_run(args: argparse.Namespace) -> None:
+    _apply_flags(args)
+    _open_sinks()
+
+    from src.config import DATA_PATH, REVIEW_OFFSET, STREAM_CHUNK_SIZE, DETECT_MODE
+    from src import graph
+    from src.results import ResultStore
+
+    if args.stream or args.checkpoint or args.resume:
+        n = 0
+        params = {"path": DATA_PATH, "offset": REVIEW_OFFSET, "chunk_size": args.chunk_size or STREAM_CHUNK_SIZE,
+                  "full": args.full}
+        run_id = None
+        if args.checkpoint or args.resume:
+            run_id, params = _checkpoint_run(args, params)
+        kept = ResultStore() if args.export else None
+        for chunk in graph.stream_enriched(params["path"], params["chunk_size"], params["offset"], params["full"],
+                                           run_id=run_id):
+            if kept is not None:
+                kept.extend(chunk)
+            for e in chunk:
+                n += 1
+                if not args.quiet:
+                    _print_item(n, e)
+        print(f"\n Done. Processed {n} enriched errors.\n")
+        if kept is not None:
+            _export(kept, args.export)
+    else:
+        if DETECT_MODE == "rules":
+            # same nodes without LangGraph, so nothing heavy is imported
+            enriched = graph.run_pipeline(full=args.full)
+        else:
+            enriched = (graph.build_graph(full=True).compile() if args.full else graph.wf).invoke({})
+        print(f"\n Done. Processed {len(enriched)} enriched errors.\n")
+        print("────────────────────────────────────────────────────────────")
+
+        if not args.quiet:
+            for idx, e in enumerate(enriched, 1):
+                # extra safety in case something upstream changes
+                if not hasattr(e, "review"):
+                    continue
+                _print_item(idx, e)
+        if args.export:
+            _export(enriched, args.export)
+
+    _report(args)
+
+
+def cmd_shard(args: argparse.Namespace) -> None:
+    _apply_flags(args)
+    _open_sinks()
+
+    from src import metrics, shard
+    from src.config import DATA_PATH, REVIEW_OFFSET, SHARD_WORKERS, SHARD_CHUNK_SIZE
+
+    workers = args.workers if args.workers is not None else SHARD_WORKERS
+    workers = workers or os.cpu_count() or 1
+    shards = args.shards or workers
+    run_id = args.run_id or shard.default_run_id(DATA_PATH, shards, REVIEW_OFFSET, args.full)
+    ckpt_dir = shard.checkpoint_dir(run_id, args.checkpoint_dir)
+    print(f"[shard] run {run_id}: {shards} shards, {workers} workers, checkpoints in {ckpt_dir}")
+
+    if not args.merge_only:
+        t0 = time.perf_counter()
+        rows = shard.split_csv(shards, ckpt_dir, path=DATA_PATH, chunk_size=args.chunk_size or SHARD_CHUNK_SIZE,
+                               offset=REVIEW_OFFSET)
+        split = time.perf_counter() - t0
+        metrics.observe("node_seconds", split, node="split")
+        print(f"[shard] split {rows} rows in {split:.2f}s")
+        t0 = time.perf_counter()
+        done = shard.run_shards(shards, workers, ckpt_dir, only=args.only, full=args.full)
+        wall = time.perf_counter() - t0
+        metrics.observe("node_seconds", wall, node="shards")
+        for st in done:
+            metrics.inc("node_items_in_total", st["reviews"], node="shards")
+            metrics.inc("node_items_out_total", st["items"], node="shards")
+            print(f"[shard] {st['shard']:>3}: {st['reviews']} reviews -> {st['items']} items in {st['seconds']}s "
+                  f"(cpu {st.get('cpu_seconds', 0)}s)"
+                  f"{' (resumed)' if st['resumed'] else ''}")
+        print(f"[shard] {len(done)} shards in {wall:.2f}s")
+        if args.only is not None:
+            return
+
+    items, reviews = metrics.instrument("merge", lambda _: shard.merge(shards, ckpt_dir),
+                                        items_out=lambda out: len(out[0]))(None)
+    enriched = metrics.instrument("tee", lambda its: shard.log_merged(its, reviews))(items)
+    if not args.keep_checkpoints:
+        shard.cleanup(ckpt_dir)
+    print(f"\n Done. Processed {len(enriched)} enriched errors.\n")
+    if not args.quiet:
+        for idx, e in enumerate(enriched, 1):
+            _print_item(idx, e)
+    if args.export:
+        _export(enriched, args.export)
+
+    _report(args)
+
+
+def cmd_issues(args: argparse.Namespace) -> None:
+    from src.issue_index import get_issue_index
+
+    index = get_issue_index()
+    print(f"{index.count()} issues")
+    for it in index.issues(limit=args.limit):
+        print(f"{it['count']:>7}x [{it['criticality']:<10}] {it['summary']}  "
+              f"({it['first_seen'][:10]} .. {it['last_seen'][:10]}, e.g. {it['sample_review_id']})")
+
+
+def cmd_serve(args: argparse.Namespace) -> None:
+    _apply_flags(args)
+    _open_sinks()
+
+    from src import service
+    from src.config import (SERVICE_HOST, SERVICE_PORT, SERVICE_SPOOL_DIR, SERVICE_SPOOL_POLL,
+                            SERVICE_BATCH_SIZE, SERVICE_BATCH_WAIT, SERVICE_QUEUE_SIZE)
+
+    n = 0
+
+    def show(items: Any) -> None:
+        nonlocal n
+        for e in items:
+            n += 1
+            _print_item(n, e)
+
+    svc = service.ReviewService(
+        batch_size=args.batch_size or SERVICE_BATCH_SIZE,
+        batch_wait=SERVICE_BATCH_WAIT if args.batch_wait is None else args.batch_wait,
+        queue_size=args.queue_size or SERVICE_QUEUE_SIZE,
+        full=args.full,
+        on_items=None if args.quiet else show,
+    )
+    port = SERVICE_PORT if args.port is None else args.port
+    spool = SERVICE_SPOOL_DIR if args.spool is None else args.spool
+    try:
+        service.serve(svc, args.host or SERVICE_HOST, port, spool, SERVICE_SPOOL_POLL)
+    except (OSError, ValueError) as ex:
+        raise SystemExit(f"error: {ex}")
+    st = svc.stats()
+    print(f"\n Done. {st['received']} reviews in {st['batches']} batches -> {st['items']} enriched errors "
+          f"({st['rejected']} rejected, {st['failed_batches']} failed batches).\n")
+    _report(args)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # no subcommand means "run", so `python -m src.run --full` keeps working
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv.insert(0, "run")
+    args = _parser().parse_args(argv)
+    {"run": cmd_run, "shard": cmd_shard, "issues": cmd_issues, "serve": cmd_serve}[args.command](args)
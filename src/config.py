@@ -4,9 +4,89 @@ import os
 load_dotenv()
 
 DATA_PATH = os.getenv("DATA_PATH", "./data/tech_service_reviews_500_with_names_ratings.csv")
+# rows skipped at the top of the csv (testing throttle; 0 = process everything)
+REVIEW_OFFSET = int(os.getenv("REVIEW_OFFSET", "495"))
+# trusted exports: columns are coerced once per column, then rows get a strict (no conversion) type check
+REVIEWS_TRUSTED = os.getenv("REVIEWS_TRUSTED", "0") in ("1", "true", "True")
+# local run state (processed-review watermark for incremental runs)
+STATE_DIR = os.getenv("STATE_DIR", "./.state")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(STATE_DIR, "state.sqlite"))
+# run metrics: JSON report written at the end of every run (empty = off), optional Prometheus text file
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(STATE_DIR, "metrics.json"))
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", "")
+# cross-review issue index (one row per underlying issue, with counts)
+ISSUE_INDEX_ENABLED = os.getenv("ISSUE_INDEX_ENABLED", "1") in ("1", "true", "True")
+ISSUE_DB_PATH = os.getenv("ISSUE_DB_PATH", STATE_DB_PATH)
+# optional: merge differently-worded summaries whose embeddings are at least ISSUE_SIMILARITY apart (cosine)
+ISSUE_EMBED_MODEL = os.getenv("ISSUE_EMBED_MODEL", "")
+ISSUE_SIMILARITY = float(os.getenv("ISSUE_SIMILARITY", "0.9"))
+# what a Notion row is: "review" (one per error per review) or "issue" (one per issue, with its count)
+NOTION_MODE = os.getenv("NOTION_MODE", "review")
+# where results go, comma-separated, written in parallel: notion, sqlite, jsonl, parquet
+# ("notion" only prints in dry runs; the local sinks always write)
+SINKS = os.getenv("SINKS", "notion")
+SINK_SQLITE_PATH = os.getenv("SINK_SQLITE_PATH", os.path.join(STATE_DIR, "results.sqlite"))
+SINK_JSONL_PATH = os.getenv("SINK_JSONL_PATH", os.path.join(STATE_DIR, "results.jsonl"))
+# one new part file per run in this directory (a Parquet file cannot be appended to once closed)
+SINK_PARQUET_DIR = os.getenv("SINK_PARQUET_DIR", os.path.join(STATE_DIR, "results_parquet"))
+# reviews per micro-batch in streaming mode (run.py --stream)
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "50"))
+# LangGraph checkpoints of resumable runs (run --checkpoint / --resume RUN_ID)
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", os.path.join(STATE_DIR, "checkpoints.sqlite"))
+# sharded runs (python -m src shard): worker processes (0 = one per core) and csv rows per checkpoint
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "0"))
+SHARD_CHUNK_SIZE = int(os.getenv("SHARD_CHUNK_SIZE", "5000"))
+# service mode (python -m src serve): HTTP endpoint (port 0 = off), watched spool directory (empty = off),
+# bounded queue (producers wait or get 429 when it is full), and micro-batches of up to SERVICE_BATCH_SIZE
+# reviews, started once full or SERVICE_BATCH_WAIT seconds after their first review arrived
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+SERVICE_SPOOL_DIR = os.getenv("SERVICE_SPOOL_DIR", "")
+SERVICE_SPOOL_POLL = float(os.getenv("SERVICE_SPOOL_POLL", "1.0"))
+SERVICE_QUEUE_SIZE = int(os.getenv("SERVICE_QUEUE_SIZE", "1000"))
+SERVICE_BATCH_SIZE = int(os.getenv("SERVICE_BATCH_SIZE", "20"))
+SERVICE_BATCH_WAIT = float(os.getenv("SERVICE_BATCH_WAIT", "0.5"))
 
 # LLM 
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+# point at a local fake server for tests/benchmarks
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# "llm" (LLM + keyword fallbacks) or "rules" (keyword rules only, no LLM)
+DETECT_MODE = os.getenv("DETECT_MODE", "llm")
+# max reviews in flight against Ollama at once (1 = sequential)
+DETECT_CONCURRENCY = int(os.getenv("DETECT_CONCURRENCY", "4"))
+# adaptive concurrency: hold the p95 of Ollama calls at DETECT_TARGET_P95 seconds by moving the number in
+# flight between DETECT_MIN/MAX_CONCURRENCY, starting from DETECT_CONCURRENCY (0 = off, fixed concurrency)
+DETECT_TARGET_P95 = float(os.getenv("DETECT_TARGET_P95", "0"))
+DETECT_MIN_CONCURRENCY = int(os.getenv("DETECT_MIN_CONCURRENCY", "1"))
+DETECT_MAX_CONCURRENCY = int(os.getenv("DETECT_MAX_CONCURRENCY", "16"))
+# model routing: short or single-rule reviews go to this smaller model first, and only unparseable or
+# low-confidence replies are escalated to OLLAMA_MODEL (empty = off, everything goes to OLLAMA_MODEL)
+OLLAMA_SMALL_MODEL = os.getenv("OLLAMA_SMALL_MODEL", "")
+ROUTE_MAX_CHARS = int(os.getenv("ROUTE_MAX_CHARS", "300"))
+# reviews packed into one LLM request (1 = one prompt per review)
+DETECT_BATCH_SIZE = int(os.getenv("DETECT_BATCH_SIZE", "1"))
+# keep-alive HTTP connections kept open to Ollama, shared by every client/thread
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+
+# rules-only pre-filter: high-rated, short reviews with no keyword hits skip the LLM
+# policy: skip | sample (send TRIAGE_SAMPLE_RATE of them anyway) | force (send all, count only) | off
+TRIAGE_POLICY = os.getenv("TRIAGE_POLICY", "skip")
+TRIAGE_MIN_RATING = int(os.getenv("TRIAGE_MIN_RATING", "4"))
+TRIAGE_MAX_LENGTH = int(os.getenv("TRIAGE_MAX_LENGTH", "400"))
+TRIAGE_SAMPLE_RATE = float(os.getenv("TRIAGE_SAMPLE_RATE", "0.1"))
+
+# near-duplicate clustering: one LLM call per group of reviews whose texts are at least
+# DEDUP_THRESHOLD similar (Jaccard over character shingles; 1.0 = identical after normalisation)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") in ("1", "true", "True")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+# on-disk cache of LLM detections (set LLM_CACHE_PATH= to disable)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./.cache/llm_detect.sqlite")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "200000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+# append every raw LLM reply to this JSONL file, a corpus for tests/bench_decode.py (empty = off)
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "")
 
 # placeholders for later 
 #Notion
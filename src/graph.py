@@ -1,77 +1,262 @@
 import os
-import hashlib
-from typing import List, Tuple
-from langgraph.graph import Graph
-
-from src.config import DATA_PATH, OLLAMA_MODEL
-from src.nodes.load_reviews import load_reviews
-from src.nodes.detect_errors import detect_errors_with_ollama
-from src.nodes.normalize import normalize
+from typing import TYPE_CHECKING, AbstractSet, Any, Callable, Iterator, List, Optional, Sequence, Set, Tuple, TypedDict
+
+from src.config import (
+    DATA_PATH, OLLAMA_MODEL, DETECT_CONCURRENCY, DETECT_BATCH_SIZE, REVIEW_OFFSET, STREAM_CHUNK_SIZE,
+    REVIEWS_TRUSTED, DEDUP_ENABLED, ISSUE_INDEX_ENABLED, NOTION_MODE, DETECT_MODE,
+)
+from src.nodes.load_reviews import load_reviews, iter_reviews
+from src.nodes.detect_errors import detect_errors_many, _apply_fallbacks
+from src.nodes.dedup import cluster
+from src.nodes.triage import route, record_sampled_miss
+from src.nodes.normalize import normalize_into
+from src.results import ResultStore
 from src.utils import RawReview, DetectedError, EnrichedError
-from src.nodes.notion_logger import upsert_enriched_error
+from src.state_store import get_state_store
+from src.metrics import instrument
+from src.issue_index import IssueIndex, get_issue_index
+from src.sinks import get_sinks, write_all
 
+# langgraph (and the LLM / Notion clients) load only when a graph is built or a stage needs them,
+# so `--help`, dry runs and rules-only runs start fast
+if TYPE_CHECKING:
+    from langgraph.graph import Graph, StateGraph
 
-def _sha12(text: str) -> str:
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
 
+# stage bodies shared by the whole-list graph and the streaming graph
 
-def build_graph() -> Graph:
-    g = Graph()
+def _detect(reviews: List[RawReview]) -> List[Tuple[RawReview, List[DetectedError]]]:
+    if DETECT_MODE == "rules":
+        # keyword rules only, no LLM
+        return [(r, _apply_fallbacks(r.review, [])) for r in reviews]
+    # triaged-clean reviews skip the LLM and report nothing; order is kept for normalize/tee
+    to_llm, _, sampled = route(reviews)
+    results: List[List[DetectedError]] = [[] for _ in reviews]
+    pending = [reviews[i] for i in to_llm]
+    # one LLM call per near-duplicate group; normalize gives every member its own error_hash
+    reps, assign = cluster(pending) if DEDUP_ENABLED else (list(range(len(pending))), list(range(len(pending))))
+    detected = dict(zip(reps, detect_errors_many(
+        [pending[j] for j in reps], OLLAMA_MODEL, max_workers=DETECT_CONCURRENCY, batch_size=DETECT_BATCH_SIZE
+    )))
+    for i, j in zip(to_llm, assign):
+        # a member whose representative found nothing still gets its own keyword fallbacks
+        results[i] = detected[j] or _apply_fallbacks(reviews[i].review, [])
+    record_sampled_miss(sum(1 for i in sampled if results[i]))
+    return list(zip(reviews, results))
+
+
+def _normalize(pairs: List[Tuple[RawReview, List[DetectedError]]]) -> ResultStore:
+    # columnar: reviews by row index, interned strings; EnrichedError objects are built on access
+    out = ResultStore()
+    for r, errs in pairs:
+        normalize_into(out, r, errs)
+    return out
+
+
+def _dry_run() -> bool:
+    return os.getenv("NOTION_DRY_RUN", "0") in ("1", "true", "True")
+
+
+def _only_new(reviews: List[RawReview], full: bool) -> List[RawReview]:
+    # incremental mode: drop reviews already detected + logged with the same content
+    if full:
+        return reviews
+    fresh = get_state_store().filter_new(reviews)
+    if len(fresh) < len(reviews):
+        print(f"[incremental] {len(fresh)} new/edited of {len(reviews)} reviews")
+    return fresh
+
+
+def _mark_done(reviews: List[RawReview], failed: AbstractSet[str] = frozenset()) -> None:
+    # only after tee, so a crash mid-log means those reviews are retried next run;
+    # reviews with a dead-lettered item are retried too
+    if not _dry_run():
+        get_state_store().mark_processed(r for r in reviews if r.review_id not in failed)
+
+
+def _issue_index() -> IssueIndex:
+    # dry runs aggregate into a throwaway in-memory index
+    return get_issue_index(":memory:") if _dry_run() else get_issue_index()
+
+
+def _tee(items: Sequence[EnrichedError]) -> Tuple[Sequence[EnrichedError], Set[str]]:
+    # returns the items plus the review_ids some sink could not write (dead-lettered, or the sink failed)
+    keys: List[str] = []
+    if ISSUE_INDEX_ENABLED or NOTION_MODE == "issue":
+        keys = _issue_index().add(items)
+    # Notion (or its dry-run printout) and any local sinks from SINKS, in parallel
+    return items, write_all(get_sinks(_dry_run()), items, keys)
 
-    #load reviews
+
+def _pipeline(full: bool = False) -> List[Tuple[str, Callable[[Any], Any]]]:
+    # the whole-list pipeline as ordered (name, node) pairs, each node taking the previous one's output
+    # reviews of this run, marked processed once tee has logged their errors
+    loaded: List[RawReview] = []
+
+    #load reviews (only new/edited ones unless full)
     def n_load(_: dict) -> List[RawReview]:
-        data = load_reviews(DATA_PATH)
-        return data[495:]  # throttle while testing
-        # return data
+        data = load_reviews(DATA_PATH, validate=not REVIEWS_TRUSTED)
+        data = data[REVIEW_OFFSET:]  # throttle while testing (REVIEW_OFFSET=0 for everything)
+        loaded[:] = _only_new(data, full)
+        return loaded
 
-    #detect errors with LLM
+    #detect errors with LLM, DETECT_CONCURRENCY requests in flight, DETECT_BATCH_SIZE reviews per request
     def n_detect(reviews: List[RawReview]) -> List[Tuple[RawReview, List[DetectedError]]]:
-        pairs: List[Tuple[RawReview, List[DetectedError]]] = []
-        for r in reviews:
-            errs = detect_errors_with_ollama(r, OLLAMA_MODEL)
-            pairs.append((r, errs))
-        return pairs
+        return _detect(reviews)
 
     #normalise and classify based on severity
-    def n_normalize(pairs: List[Tuple[RawReview, List[DetectedError]]]) -> List[EnrichedError]:
-        out: List[EnrichedError] = []
-        for r, errs in pairs:
-            out.extend(normalize(r, errs))
-        return out
+    def n_normalize(pairs: List[Tuple[RawReview, List[DetectedError]]]) -> ResultStore:
+        return _normalize(pairs)
 
     #write to Notion and return the same list
-    def n_tee(items: List[EnrichedError]) -> List[EnrichedError]:
-        dry = os.getenv("NOTION_DRY_RUN", "0") in ("1", "true", "True")
-        for i, e in enumerate(items, 1):
-            hash_value = getattr(e, "error_hash", None) or _sha12(
-                f"{e.review.review_id}|{e.error.error_summary}"
-            )
-            if dry:
-                print(f"[dry-run] Would upsert {e.review.review_id} | {e.error.error_summary} | {hash_value}")
-            else:
-                upsert_enriched_error(e)
-            if i % 20 == 0:
-                print(f"… processed {i} rows")
+    def n_tee(items: ResultStore) -> ResultStore:
         # pass through so run.py receives EnrichedError objects
-        return items
+        out, failed = _tee(items)
+        _mark_done(loaded, failed)
+        return out
+
+    # timed, with items in/out
+    return [(name, instrument(name, fn)) for name, fn in
+            (("load", n_load), ("detect", n_detect), ("normalize", n_normalize), ("tee", n_tee))]
+
+
+def build_graph(full: bool = False) -> "Graph":
+    from langgraph.graph import Graph
+
+    g = Graph()
+    nodes = _pipeline(full)
 
     # Nodes
-    g.add_node("load", n_load)
-    g.add_node("detect", n_detect)
-    g.add_node("normalize", n_normalize)
-    g.add_node("tee", n_tee)
+    for name, fn in nodes:
+        g.add_node(name, fn)
+
+    # Edges
+    for (a, _), (b, _) in zip(nodes, nodes[1:]):
+        g.add_edge(a, b)
+
+    # Entry & finish
+    g.set_entry_point(nodes[0][0])
+    g.set_finish_point(nodes[-1][0])
+
+    return g
 
-    # Edges 
-    g.add_edge("load", "detect")
+
+def run_pipeline(full: bool = False) -> ResultStore:
+    # the same nodes called in order without LangGraph; used where startup time matters (rules-only)
+    out: Any = {}
+    for _, fn in _pipeline(full):
+        out = fn(out)
+    return out
+
+
+# streaming mode: state only ever holds the current chunk, so memory is bounded by chunk size
+class ChunkState(TypedDict, total=False):
+    reviews: List[RawReview]
+    pairs: List[Tuple[RawReview, List[DetectedError]]]
+    items: ResultStore
+    cursor: int  # rows consumed from the csv so far
+    done: bool
+
+
+def _count(key: str) -> Callable[[ChunkState], int]:
+    return lambda s: len(s.get(key) or [])
+
+
+def _add_chunk_nodes(g: "StateGraph") -> None:
+    # detect -> normalize -> tee over state["reviews"], shared by the streaming and the batch graph
+    def n_detect(state: ChunkState) -> ChunkState:
+        return {"pairs": _detect(state["reviews"])}
+
+    def n_normalize(state: ChunkState) -> ChunkState:
+        return {"items": _normalize(state["pairs"]), "pairs": []}
+
+    def n_tee(state: ChunkState) -> ChunkState:
+        items, failed = _tee(state["items"])
+        _mark_done(state["reviews"], failed)
+        return {"items": items, "reviews": []}
+
+    g.add_node("detect", instrument("detect", n_detect, items_in=_count("reviews"), items_out=_count("pairs")))
+    g.add_node("normalize", instrument("normalize", n_normalize, items_in=_count("pairs"), items_out=_count("items")))
+    g.add_node("tee", instrument("tee", n_tee, items_in=_count("items"), items_out=_count("items")))
     g.add_edge("detect", "normalize")
     g.add_edge("normalize", "tee")
 
-    # Entry & finish
+
+def build_stream_graph(path: str = DATA_PATH, chunk_size: int = STREAM_CHUNK_SIZE,
+                       offset: int = REVIEW_OFFSET, full: bool = False) -> "StateGraph":
+    from langgraph.graph import END, StateGraph
+
+    g = StateGraph(ChunkState)
+    chunks: Optional[Iterator[List[RawReview]]] = None
+
+    #pull the next chunk; the csv reader is opened lazily and resumes from cursor
+    def n_load(state: ChunkState) -> ChunkState:
+        nonlocal chunks
+        cursor = state.get("cursor", 0)
+        if chunks is None:
+            chunks = iter_reviews(path, chunk_size, skip=offset + cursor, validate=not REVIEWS_TRUSTED)
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"reviews": [], "items": ResultStore(), "done": True}
+        # the previous chunk's items are dropped here, so checkpoints only ever hold one chunk
+        return {"reviews": _only_new(chunk, full), "items": ResultStore(), "cursor": cursor + len(chunk), "done": False}
+
+    g.add_node("load", instrument("load", n_load, items_in=lambda s: 0, items_out=_count("reviews")))
+    _add_chunk_nodes(g)
+
     g.set_entry_point("load")
-    g.set_finish_point("tee")
+    g.add_conditional_edges("load", lambda s: END if s.get("done") else "detect")
+    g.add_edge("tee", "load")
 
     return g
 
 
-# export workflow for run.py
-wf = build_graph().compile()
+def build_batch_graph() -> "StateGraph":
+    # one micro-batch given as {"reviews": [...]}: detect -> normalize -> tee, no csv (service mode)
+    from langgraph.graph import StateGraph
+
+    g = StateGraph(ChunkState)
+    _add_chunk_nodes(g)
+    g.set_entry_point("detect")
+    g.set_finish_point("tee")
+    return g
+
+
+def stream_enriched(path: str = DATA_PATH, chunk_size: int = STREAM_CHUNK_SIZE,
+                    offset: int = REVIEW_OFFSET, full: bool = False,
+                    run_id: Optional[str] = None) -> Iterator[ResultStore]:
+    #yield each chunk's logged EnrichedErrors as soon as its tee step finishes
+    # with a run_id, state is checkpointed after every node and a run with checkpoints continues from them
+    g = build_stream_graph(path, chunk_size, offset, full)
+    # every chunk is 4 super-steps, so the default recursion limit would stop after ~6 chunks
+    config: dict = {"recursion_limit": 10**9}
+    start: Optional[ChunkState] = {"cursor": 0}
+    saver = None
+    if run_id is None:
+        app = g.compile()
+    else:
+        from src.checkpoint import get_saver
+
+        saver = get_saver()
+        app = g.compile(checkpointer=saver)
+        config["configurable"] = {"thread_id": run_id}
+        if saver.has_checkpoint(run_id):
+            start = None  # continue after the last committed node
+    for update in app.stream(start, config=config, stream_mode="updates"):
+        if "tee" in update:
+            yield update["tee"]["items"]
+    if saver is not None:
+        saver.finish(run_id)
+
+
+_wf = None
+
+
+def __getattr__(name: str) -> Any:
+    # `from src.graph import wf` still works; the default workflow is compiled on first access
+    global _wf
+    if name == "wf":
+        if _wf is None:
+            _wf = build_graph().compile()
+        return _wf
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
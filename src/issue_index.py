@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import ISSUE_DB_PATH, ISSUE_EMBED_MODEL, ISSUE_SIMILARITY, OLLAMA_BASE_URL
+from src.utils import DetectedError, EnrichedError, RawReview
+
+# sqlite caps bound parameters per statement
+_IN_CHUNK = 500
+
+# lower = worse
+CRITICALITY_RANK = {"Critical": 0, "Major": 1, "Minor": 2, "Suggestion": 3, "None": 4}
+
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "been", "being", "it", "its", "this", "that", "of", "to",
+    "in", "on", "at", "for", "with", "by", "from", "and", "or", "when", "while", "during", "after", "user",
+    "users", "reports", "reported", "report", "issue", "problem",
+}
+_WORDS = re.compile(r"[a-z0-9]+")
+
+
+def _stem(w: str) -> str:
+    # plural folding only: crashes -> crash, workspaces -> workspace, policies -> policy
+    if len(w) > 4 and w.endswith("ies"):
+        return w[:-3] + "y"
+    if len(w) > 4 and w.endswith("es") and w[:-2].endswith(("s", "x", "ch", "sh")):
+        return w[:-2]
+    if len(w) > 3 and w.endswith("s") and not w.endswith("ss"):
+        return w[:-1]
+    return w
+
+
+def canonical_summary(summary: str) -> str:
+    # order-insensitive bag of content words, so rewordings of one summary land on the same key
+    words = {_stem(w) for w in _WORDS.findall(summary.lower().replace("’", "'")) if w not in _STOPWORDS}
+    return " ".join(sorted(words))
+
+
+def _seen(date: str) -> datetime:
+    # review dates are free text; ISO first, then whatever pandas can read. Naive times are taken as UTC
+    try:
+        d = datetime.fromisoformat(date.strip())
+    except ValueError:
+        import pandas as pd
+
+        d = pd.to_datetime(date, errors="coerce", utc=True)
+        if d is pd.NaT:
+            raise ValueError(f"unreadable date {date!r}") from None
+        d = d.to_pydatetime()
+    return d.replace(tzinfo=timezone.utc) if d.tzinfo is None else d.astimezone(timezone.utc)
+
+
+def seen_at(date: str) -> str:
+    # first_seen / last_seen are stored as UTC "YYYY-MM-DD HH:MM:SS", so MIN/MAX on the text is by time;
+    # "" when the date cannot be read, and such a mention never moves first/last seen
+    try:
+        return _seen(date).strftime("%Y-%m-%d %H:%M:%S")
+    except (ValueError, TypeError, OverflowError, AttributeError):
+        return ""
+
+
+def issue_key(canonical: str) -> str:
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class IssueIndex:
+    # one row per underlying issue across all reviews: mention count, first/last seen, worst criticality.
+    # Mentions are keyed by error_hash, so re-processing a review never counts it twice.
+
+    def __init__(self, path: str, embed_model: str = ISSUE_EMBED_MODEL, similarity: float = ISSUE_SIMILARITY):
+        d = os.path.dirname(path) if path != ":memory:" else ""
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.embed_model = embed_model
+        self.similarity = similarity
+        self._embedder = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS issues (
+                issue_key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                error_type TEXT NOT NULL,
+                rationale TEXT NOT NULL,
+                sample_review_id TEXT NOT NULL,
+                sample_review TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                worst_rank INTEGER NOT NULL,
+                embedding BLOB,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        # canonical summary -> issue it was merged into (itself unless embeddings merged it)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS issue_aliases (canonical TEXT PRIMARY KEY, issue_key TEXT NOT NULL)"
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS issue_mentions (
+                error_hash TEXT PRIMARY KEY,
+                issue_key TEXT NOT NULL,
+                review_id TEXT NOT NULL
+            )"""
+        )
+        self._db.commit()
+        self._aliases: Dict[str, str] = dict(self._db.execute("SELECT canonical, issue_key FROM issue_aliases"))
+        self._vectors: Optional[np.ndarray] = None
+        self._vector_keys: List[str] = []
+        self._stats = {"mentions": 0, "duplicate_mentions": 0, "issues_created": 0, "issues_merged_by_embedding": 0}
+
+    # embeddings (optional): only a canonical summary never seen before is embedded
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        if not self.embed_model:
+            return None
+        if self._embedder is None:
+            from langchain_community.embeddings import OllamaEmbeddings
+
+            self._embedder = OllamaEmbeddings(model=self.embed_model, base_url=OLLAMA_BASE_URL)
+        v = np.asarray(self._embedder.embed_query(text), dtype=np.float32)
+        n = np.linalg.norm(v)
+        return v / n if n else v
+
+    def _load_vectors(self) -> None:
+        if self._vectors is not None:
+            return
+        rows = self._db.execute("SELECT issue_key, embedding FROM issues WHERE embedding IS NOT NULL").fetchall()
+        self._vector_keys = [k for k, _ in rows]
+        self._vectors = (np.vstack([np.frombuffer(b, dtype=np.float32) for _, b in rows])
+                         if rows else np.zeros((0, 0), dtype=np.float32))
+
+    def _nearest(self, v: np.ndarray) -> Optional[str]:
+        self._load_vectors()
+        if not len(self._vector_keys) or self._vectors.shape[1] != v.shape[0]:
+            return None
+        sims = self._vectors @ v
+        best = int(sims.argmax())
+        return self._vector_keys[best] if sims[best] >= self.similarity else None
+
+    def _remember_vector(self, key: str, v: np.ndarray) -> None:
+        self._load_vectors()
+        if not len(self._vector_keys):
+            self._vectors = v[None, :]
+        elif self._vectors.shape[1] == v.shape[0]:
+            self._vectors = np.vstack([self._vectors, v[None, :]])
+        else:
+            return
+        self._vector_keys.append(key)
+
+    def _resolve(self, summary: str, new_vectors: Dict[str, np.ndarray]) -> str:
+        canonical = canonical_summary(summary)
+        key = self._aliases.get(canonical)
+        if key is not None:
+            return key
+        key = issue_key(canonical)
+        v = self._embed(canonical or summary)
+        if v is not None:
+            near = self._nearest(v)
+            if near is not None and near != key:
+                self._stats["issues_merged_by_embedding"] += 1
+                key = near
+            else:
+                new_vectors[key] = v
+                self._remember_vector(key, v)
+        self._aliases[canonical] = key
+        self._db.execute("INSERT OR REPLACE INTO issue_aliases VALUES (?, ?)", (canonical, key))
+        return key
+
+    def add(self, items: Sequence[EnrichedError]) -> List[str]:
+        # returns the issue key of every item, in order; only mentions not seen before change the counts.
+        # items is read in one pass (a ResultStore builds each EnrichedError on access)
+        if not items:
+            return []
+        with self._lock:
+            new_vectors: Dict[str, np.ndarray] = {}
+            rows = [(e.error.error_summary, e.error_hash, e.review.review_id, seen_at(e.review.date),
+                     CRITICALITY_RANK.get(e.criticality, len(CRITICALITY_RANK))) for e in items]
+            keys = [self._resolve(r[0], new_vectors) for r in rows]
+
+            hashes = [r[1] for r in rows]
+            known = set()
+            for i in range(0, len(hashes), _IN_CHUNK):
+                part = hashes[i:i + _IN_CHUNK]
+                known.update(h for (h,) in self._db.execute(
+                    f"SELECT error_hash FROM issue_mentions WHERE error_hash IN ({','.join('?' * len(part))})", part))
+
+            # fold the batch per issue, then one upsert per issue
+            agg: Dict[str, dict] = {}
+            mentions: List[Tuple[str, str, str]] = []
+            for i, ((_, h, review_id, date, rank), key) in enumerate(zip(rows, keys)):
+                if h in known:
+                    self._stats["duplicate_mentions"] += 1
+                    continue
+                known.add(h)
+                mentions.append((h, key, review_id))
+                a = agg.get(key)
+                if a is None:
+                    agg[key] = a = {"i": i, "count": 0, "first": date, "last": date, "rank": rank}
+                a["count"] += 1
+                if date:
+                    a["first"] = min(a["first"] or date, date)
+                    a["last"] = max(a["last"], date)
+                if rank < a["rank"]:
+                    # the worst mention also becomes the example shown for the issue
+                    a["i"], a["rank"] = i, rank
+
+            now = time.time()
+            created = 0
+            for key, a in agg.items():
+                e = items[a["i"]]
+                v = new_vectors.get(key)
+                cur = self._db.execute(
+                    """INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(issue_key) DO UPDATE SET
+                         count = count + excluded.count,
+                         first_seen = CASE WHEN first_seen = '' OR (excluded.first_seen <> ''
+                           AND excluded.first_seen < first_seen) THEN excluded.first_seen ELSE first_seen END,
+                         last_seen = MAX(last_seen, excluded.last_seen),
+                         summary = CASE WHEN excluded.worst_rank < worst_rank THEN excluded.summary ELSE summary END,
+                         error_type = CASE WHEN excluded.worst_rank < worst_rank THEN excluded.error_type ELSE error_type END,
+                         rationale = CASE WHEN excluded.worst_rank < worst_rank THEN excluded.rationale ELSE rationale END,
+                         sample_review_id = CASE WHEN excluded.worst_rank < worst_rank THEN excluded.sample_review_id ELSE sample_review_id END,
+                         sample_review = CASE WHEN excluded.worst_rank < worst_rank THEN excluded.sample_review ELSE sample_review END,
+                         worst_rank = MIN(worst_rank, excluded.worst_rank),
+                         embedding = COALESCE(embedding, excluded.embedding),
+                         updated_at = excluded.updated_at
+                       RETURNING count""",
+                    (key, e.error.error_summary, json.dumps(e.error.error_type), e.error.rationale,
+                     e.review.review_id, e.review.review, a["count"], a["first"], a["last"], a["rank"],
+                     v.tobytes() if v is not None else None, now),
+                )
+                (total,) = cur.fetchone()
+                if total == a["count"]:
+                    created += 1
+            self._db.executemany("INSERT OR IGNORE INTO issue_mentions VALUES (?, ?, ?)", mentions)
+            self._db.commit()
+            self._stats["mentions"] += len(mentions)
+            self._stats["issues_created"] += created
+        return keys
+
+    def issues(self, keys: Optional[List[str]] = None, limit: Optional[int] = None) -> List[dict]:
+        # issue rows, worst and most reported first
+        sql = ("SELECT issue_key, summary, error_type, rationale, sample_review_id, sample_review, count, "
+               "first_seen, last_seen, worst_rank FROM issues")
+        params: List = []
+        with self._lock:
+            if keys is not None:
+                rows = []
+                keys = list(keys)
+                for i in range(0, len(keys), _IN_CHUNK):
+                    part = keys[i:i + _IN_CHUNK]
+                    rows += self._db.execute(f"{sql} WHERE issue_key IN ({','.join('?' * len(part))})", part).fetchall()
+            else:
+                if limit is not None:
+                    sql += " ORDER BY worst_rank, count DESC LIMIT ?"
+                    params.append(limit)
+                rows = self._db.execute(sql, params).fetchall()
+        names = list(CRITICALITY_RANK)
+        out = [{
+            "issue_key": k, "summary": s, "error_type": json.loads(t), "rationale": ra,
+            "sample_review_id": rid, "sample_review": rv, "count": c, "first_seen": f, "last_seen": l,
+            "criticality": names[w] if w < len(names) else "None",
+        } for k, s, t, ra, rid, rv, c, f, l, w in rows]
+        out.sort(key=lambda r: (CRITICALITY_RANK[r["criticality"]], -r["count"]))
+        return out
+
+    def count(self) -> int:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM issues").fetchone()
+        return n
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = dict(self._stats)
+        out["issues"] = self.count()
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def issue_as_enriched(issue: dict) -> EnrichedError:
+    # one issue row shaped like a single logged error, so the Notion writer can upsert it keyed by issue_key
+    reports = f"{issue['count']} report" + ("s" if issue["count"] != 1 else "")
+    return EnrichedError(
+        review=RawReview(
+            review_id=f"ISSUE-{issue['issue_key'][:8]}",
+            review=issue["sample_review"],
+            username="",
+            email="",
+            date=issue["last_seen"],
+            reviewer_name=reports,
+            rating=0,
+        ),
+        error=DetectedError(
+            error_summary=issue["summary"],
+            error_type=issue["error_type"],
+            rationale=f"{reports}, first seen {issue['first_seen']}, last seen {issue['last_seen']}. "
+                      f"Example ({issue['sample_review_id']}): {issue['rationale']}",
+        ),
+        criticality=issue["criticality"],
+        error_hash=issue["issue_key"],
+    )
+
+
+_indexes: Dict[str, IssueIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_issue_index(path: str = ISSUE_DB_PATH) -> IssueIndex:
+    # ":memory:" keeps a throwaway index (dry runs)
+    with _indexes_lock:
+        idx = _indexes.get(path)
+        if idx is None:
+            idx = _indexes[path] = IssueIndex(path)
+    return idx
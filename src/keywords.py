@@ -0,0 +1,82 @@
+import re
+import threading
+from typing import Dict, FrozenSet, Hashable, Iterable, Optional, Set, Tuple
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    # shared prefixes become one branch, so the regex engine does a trie walk per position
+    # instead of trying every keyword; optional tails are greedy, so the longest keyword wins
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def walk(node: Dict[str, dict]) -> str:
+        alts = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return walk(trie)
+
+
+class KeywordMatcher:
+    # compiles many labelled keyword lists into a single regex and reports every label hit in one pass.
+    # Keywords match as plain substrings of the lowercased text, same as `kw in text.lower()`.
+
+    def __init__(self, groups: Iterable[Tuple[Hashable, Iterable[str]]]):
+        labels: Dict[str, Set[Hashable]] = {}
+        for label, keywords in groups:
+            for kw in keywords:
+                kw = kw.lower()
+                if kw:
+                    labels.setdefault(kw, set()).add(label)
+        self.keywords = frozenset(labels)
+        # the regex reports the longest keyword starting at each position; any other keyword starting
+        # there is a prefix of it, so its labels are folded in up front
+        self._closure: Dict[str, FrozenSet[Hashable]] = {
+            kw: frozenset(lb for other, lbs in labels.items() if kw.startswith(other) for lb in lbs)
+            for kw in labels
+        }
+        self._regex = re.compile("(?=(" + _trie_pattern(labels) + "))") if labels else None
+
+    def scan(self, text: str) -> Set[Hashable]:
+        hits: Set[Hashable] = set()
+        if self._regex is None:
+            return hits
+        seen: Set[str] = set()
+        for m in self._regex.finditer(text.lower()):
+            kw = m.group(1)
+            if kw not in seen:
+                seen.add(kw)
+                hits |= self._closure[kw]
+        return hits
+
+
+_engine: Optional[KeywordMatcher] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> KeywordMatcher:
+    # one matcher for every rule list in the pipeline; labels are (kind, key):
+    #   ("criticality", level), ("fallback", rule index), ("suggestion", None), ("suggestion_summary", index),
+    #   ("triage_cue", None)
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # imported here: the node modules import this one
+                from src.nodes.classify_criticality import BUCKETS
+                from src.nodes.detect_errors import FALLBACK_RULES, SUGGESTION_TERMS, SUGGESTION_SUMMARIES
+                from src.nodes.triage import NEGATIVE_CUES
+
+                groups = [(("criticality", level), kws) for level, kws in BUCKETS.items()]
+                groups += [(("fallback", i), kws) for i, (_, _, kws) in enumerate(FALLBACK_RULES)]
+                groups += [(("suggestion", None), SUGGESTION_TERMS)]
+                groups += [(("suggestion_summary", i), kws) for i, (kws, _) in enumerate(SUGGESTION_SUMMARIES)]
+                groups += [(("triage_cue", None), NEGATIVE_CUES)]
+                _engine = KeywordMatcher(groups)
+    return _engine
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from src.config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS
+
+# how often (in writes) to run size/age eviction
+_EVICT_EVERY = 1000
+
+
+def fingerprint(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class DetectionCache:
+    # content-addressed store of parsed LLM detections: key = sha256(model, prompt fingerprint, review text)
+    # one connection shared by all worker threads, serialised with a lock
+
+    def __init__(self, path: str, max_entries: int = 200_000, max_age_days: float = 30):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_s = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS detections (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_fp TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS detections_used_at ON detections(used_at)")
+        self._db.commit()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+        self.evict()
+
+    @staticmethod
+    def key(review_text: str, model: str, prompt_fp: str) -> str:
+        return fingerprint(model, prompt_fp, review_text)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, created_at FROM detections WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age_s and now - row[1] > self.max_age_s):
+                self._stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE detections SET used_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._stats["hits"] += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, prompt_fp: str, errors: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_fp, json.dumps(errors, ensure_ascii=False), now, now),
+            )
+            self._db.commit()
+            self._stats["writes"] += 1
+            due = self._stats["writes"] % _EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        # drop expired rows, then the least recently used rows beyond max_entries
+        removed = 0
+        with self._lock:
+            if self.max_age_s:
+                cur = self._db.execute(
+                    "DELETE FROM detections WHERE created_at < ?", (time.time() - self.max_age_s,)
+                )
+                removed += cur.rowcount
+            if self.max_entries:
+                (n,) = self._db.execute("SELECT COUNT(*) FROM detections").fetchone()
+                if n > self.max_entries:
+                    cur = self._db.execute(
+                        "DELETE FROM detections WHERE key IN "
+                        "(SELECT key FROM detections ORDER BY used_at ASC LIMIT ?)",
+                        (n - self.max_entries,),
+                    )
+                    removed += cur.rowcount
+            self._db.commit()
+            self._stats["evicted"] += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM detections").fetchone()
+            out: Dict[str, Any] = dict(self._stats, entries=n)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+
+_cache: Optional[DetectionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[DetectionCache]:
+    # None when LLM_CACHE_PATH is empty (cache disabled)
+    global _cache
+    if not LLM_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DetectionCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS)
+    return _cache
@@ -0,0 +1,205 @@
+import asyncio
+import sys
+import threading
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_community.chat_models import ChatOllama
+from langchain_community.llms import ollama as _ollama_module
+
+from src import metrics
+from src.config import OLLAMA_BASE_URL, OLLAMA_POOL_SIZE
+
+# process-wide registry: one PooledChatOllama per (model, temperature, format),
+# all of them sharing one keep-alive HTTP pool (sync) and one aiohttp session per event loop (async)
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, float, Optional[str]], "PooledChatOllama"] = {}
+_session: Optional[requests.Session] = None
+# loop -> (its shared session, the async generator that closes it when the loop shuts down)
+_async_sessions: Dict[asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, AsyncIterator[None]]] = {}
+_stats = {"clients_created": 0, "client_lookups": 0, "async_requests": 0, "async_sessions_created": 0,
+          "async_sessions_closed": 0}
+_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+# set only while a PooledChatOllama call runs; any other ChatOllama/Ollama in the process is untouched
+_pooled: ContextVar[bool] = ContextVar("ollama_pooled", default=False)
+
+
+def _http_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OLLAMA_POOL_SIZE)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                _session = s
+    return _session
+
+
+async def _close_with_loop(loop: asyncio.AbstractEventLoop, sess: aiohttp.ClientSession) -> AsyncIterator[None]:
+    # an async generator is closed by loop.shutdown_asyncgens() (asyncio.run does that), while the loop
+    # can still run the session's close
+    try:
+        yield
+    finally:
+        with _lock:
+            if _async_sessions.get(loop, (None,))[0] is sess:
+                del _async_sessions[loop]
+            _stats["async_sessions_closed"] += 1
+        await sess.close()
+
+
+async def _async_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        # loops closed without shutdown_asyncgens(): nothing can await their sessions any more, so they are
+        # evicted and marked closed; their sockets go with the objects
+        for dead in [l for l in _async_sessions if l.is_closed()]:
+            _async_sessions.pop(dead)[0].detach()
+            _stats["async_sessions_closed"] += 1
+        entry = _async_sessions.get(loop)
+        _stats["async_requests"] += 1
+        if entry is not None and not entry[0].closed:
+            return entry[0]
+        sess = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=OLLAMA_POOL_SIZE))
+        closer = _close_with_loop(loop, sess)
+        _async_sessions[loop] = (sess, closer)
+        _stats["async_sessions_created"] += 1
+    # first step registers the generator with the loop's shutdown hooks
+    await closer.__anext__()
+    return sess
+
+
+class _PooledRequests:
+    # stands in for `requests` inside langchain_community.llms.ollama: upstream's own request code runs
+    # unchanged; during a PooledChatOllama call requests.post goes through the shared keep-alive pool
+    def __getattr__(self, name: str) -> Any:
+        return getattr(requests, name)
+
+    def post(self, *args: Any, **kwargs: Any) -> requests.Response:
+        if _pooled.get():
+            return _http_session().post(*args, **kwargs)
+        return requests.post(*args, **kwargs)
+
+
+class _BorrowedSession:
+    # `async with aiohttp.ClientSession() as session:` yielding the loop's shared session, left open on exit
+    async def __aenter__(self) -> aiohttp.ClientSession:
+        return await _async_session()
+
+    async def __aexit__(self, *exc: Any) -> bool:
+        return False
+
+
+class _PooledAiohttp:
+    # stands in for `aiohttp` inside langchain_community.llms.ollama
+    def __getattr__(self, name: str) -> Any:
+        return getattr(aiohttp, name)
+
+    def ClientSession(self, *args: Any, **kwargs: Any) -> Any:
+        if _pooled.get():
+            return _BorrowedSession()
+        return aiohttp.ClientSession(*args, **kwargs)
+
+
+def _install_pools() -> bool:
+    # the stand-ins only change anything inside PooledChatOllama calls; if a later langchain_community
+    # stops importing these modules there, say so instead of quietly running unpooled
+    for name, real, shim in (("requests", requests, _PooledRequests), ("aiohttp", aiohttp, _PooledAiohttp)):
+        current = getattr(_ollama_module, name, None)
+        if isinstance(current, shim):
+            continue
+        if current is not real:
+            print(f"[llm] langchain_community.llms.ollama no longer uses {name}; Ollama calls are not pooled",
+                  file=sys.stderr)
+            return False
+        setattr(_ollama_module, name, shim())
+    return True
+
+
+POOLED = _install_pools()
+
+
+class PooledChatOllama(ChatOllama):
+    # ChatOllama whose invoke/ainvoke go through the shared pools; the overrides are LangChain's
+    # documented chat-model hooks and only wrap the upstream implementation
+    def _generate(self, *args: Any, **kwargs: Any) -> Any:
+        token = _pooled.set(True)
+        try:
+            return super()._generate(*args, **kwargs)
+        finally:
+            _pooled.reset(token)
+
+    async def _agenerate(self, *args: Any, **kwargs: Any) -> Any:
+        token = _pooled.set(True)
+        try:
+            return await super()._agenerate(*args, **kwargs)
+        finally:
+            _pooled.reset(token)
+
+
+def get_chat_model(model: str, temperature: float = 0, format: Optional[str] = "json") -> PooledChatOllama:
+    key = (model, float(temperature), format)
+    with _lock:
+        _stats["client_lookups"] += 1
+        llm = _clients.get(key)
+        if llm is None:
+            llm = PooledChatOllama(model=model, temperature=temperature, format=format, base_url=OLLAMA_BASE_URL)
+            _clients[key] = llm
+            _stats["clients_created"] += 1
+    return llm
+
+
+def client_stats() -> Dict[str, int]:
+    # urllib3 tracks connections opened vs requests sent per host pool
+    conns = reqs = 0
+    if _session is not None:
+        for adapter in set(_session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                conns += pool.num_connections
+                reqs += pool.num_requests
+    with _lock:
+        out = dict(_stats)
+    out.update({
+        "pooled": POOLED,
+        "http_connections_opened": conns,
+        "http_requests": reqs,
+        "http_connections_reused": max(reqs - conns, 0),
+    })
+    return out
+
+
+def record_usage(resp: Any, seconds: float) -> None:
+    # Ollama reports token counts in the final stream chunk, surfaced as response_metadata
+    meta = getattr(resp, "response_metadata", None) or {}
+    prompt = int(meta.get("prompt_eval_count") or 0)
+    completion = int(meta.get("eval_count") or 0)
+    with _lock:
+        _usage["calls"] += 1
+        _usage["prompt_tokens"] += prompt
+        _usage["completion_tokens"] += completion
+        _usage["seconds"] += seconds
+    metrics.inc("llm_requests_total")
+    metrics.inc("llm_prompt_tokens_total", prompt)
+    metrics.inc("llm_completion_tokens_total", completion)
+    metrics.observe("llm_request_seconds", seconds)
+
+
+def usage_stats() -> Dict[str, Any]:
+    with _lock:
+        return dict(_usage)
+
+
+async def aclose_clients() -> None:
+    # close the aiohttp session bound to the current loop (loops run by asyncio.run close it on their own)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _async_sessions.get(loop)
+    if entry is not None:
+        await entry[1].aclose()
@@ -0,0 +1,179 @@
+import json
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from src import metrics
+from src.config import LLM_RECORD_PATH
+from src.utils import DetectedError
+
+try:
+    import orjson
+except ImportError:  # optional; parses a typical reply ~2.5x faster than json
+    orjson = None
+
+# Decoder for the JSON the detection prompts ask Ollama for. Every reply ends up in one of four states,
+# counted as llm_responses_total{status}:
+#   ok        parsed as the exact shape asked for (zero errors is still ok)
+#   rescued   usable after repair: JSON wrapped in prose or a code fence, a bare list of errors, or a
+#             single error object without the {"errors": [...]} envelope
+#   malformed no usable JSON, or JSON of the wrong shape; `problem` says what was wrong
+#   empty     blank content
+# Only ok / rescued replies may be cached. An item already in the exact shape DetectedError wants goes
+# straight to its compiled pydantic-core validator; anything else is repaired first (summary trimmed to
+# 140 chars, labels outside TYPES dropped, "Other" when none are left). An item that cannot be repaired is
+# dropped and counted, and the rest of the reply is kept.
+
+JSON_BACKEND = "orjson" if orjson else "json"
+_loads = orjson.loads if orjson else json.loads
+_DecodeError = (ValueError, TypeError)  # orjson.JSONDecodeError and json.JSONDecodeError are ValueErrors
+
+TYPES = frozenset({"Crash", "Billing", "Auth", "API", "Performance", "Docs", "Permissions", "Mobile", "UI",
+                   "Webhooks", "Other"})
+_OTHER = ("Other",)
+_validate = DetectedError.__pydantic_validator__.validate_python
+
+
+class Decoded(NamedTuple):
+    status: str  # ok | rescued | malformed | empty
+    errors: List[DetectedError]
+    problem: str = ""  # why the reply was rescued or malformed
+    dropped: int = 0  # items that failed the schema check
+
+    @property
+    def usable(self) -> bool:
+        return self.status in ("ok", "rescued")
+
+
+def _load(s: str) -> Tuple[Any, str]:
+    # (value, "" | rescue note); raises ValueError when nothing in s parses
+    try:
+        return _loads(s), ""
+    except _DecodeError as ex:
+        first = ex
+    a, b = s.find("{"), s.rfind("}")
+    if a != -1 and b > a:
+        try:
+            return _loads(s[a:b + 1]), "json inside surrounding text"
+        except _DecodeError:
+            pass
+    raise ValueError(f"{type(first).__name__}: {first}")
+
+
+def _conforms(e: dict) -> bool:
+    s, t, r = e.get("error_summary"), e.get("error_type"), e.get("rationale")
+    try:
+        return (type(s) is str and 0 < len(s) <= 140 and s == s.strip() and type(r) is str and r == r.strip()
+                and type(t) is list and bool(t) and TYPES.issuperset(t))
+    except TypeError:  # unhashable label
+        return False
+
+
+def parse_item(e: Any) -> Optional[DetectedError]:
+    # one {"error_summary", "error_type", "rationale"} object; None when it cannot be used
+    if not isinstance(e, dict):
+        return None
+    if _conforms(e):
+        return _validate(e)
+    summary = e.get("error_summary") or ""
+    if not isinstance(summary, str):
+        return None
+    summary = summary.strip()[:140]
+    if not summary:
+        return None
+    types = e.get("error_type") or []
+    if isinstance(types, str):
+        types = [types]
+    elif not isinstance(types, list):
+        types = []
+    types = [t for t in types if isinstance(t, str) and t in TYPES] or list(_OTHER)
+    rationale = e.get("rationale") or ""
+    rationale = rationale.strip() if isinstance(rationale, str) else ""
+    return _validate({"error_summary": summary, "error_type": types, "rationale": rationale})
+
+
+def parse_errors(items: Any) -> Tuple[List[DetectedError], int]:
+    # (usable errors in order, how many items were dropped)
+    if not isinstance(items, list):
+        return [], 0
+    out = [e for e in map(parse_item, items) if e is not None]
+    return out, len(items) - len(out)
+
+
+def _count(kind: str, d: Decoded) -> Decoded:
+    metrics.inc("llm_responses_total", status=d.status, kind=kind)
+    if d.dropped:
+        metrics.inc("llm_items_dropped_total", d.dropped, kind=kind)
+    return d
+
+
+def decode_errors(raw: Optional[str]) -> Decoded:
+    # reply to the single-review prompt: {"errors": [...]}
+    s = (raw or "").strip()
+    if not s:
+        return _count("single", Decoded("empty", [], "blank reply"))
+    try:
+        data, note = _load(s)
+    except ValueError as ex:
+        return _count("single", Decoded("malformed", [], str(ex)))
+    if isinstance(data, dict) and "errors" in data:
+        items = data["errors"]
+        if not isinstance(items, list):
+            return _count("single", Decoded("malformed", [], f"'errors' is {type(items).__name__}, not a list"))
+    elif isinstance(data, dict) and "error_summary" in data:
+        items, note = [data], "single error object without the errors list"
+    elif isinstance(data, list):
+        items, note = data, "bare list of errors"
+    else:
+        return _count("single", Decoded("malformed", [], f"{type(data).__name__} without an 'errors' list"))
+    errors, dropped = parse_errors(items)
+    return _count("single", Decoded("rescued" if note else "ok", errors, note, dropped))
+
+
+def decode_batch(raw: Optional[str], ids: List[str]) -> Tuple[Decoded, Dict[str, List[DetectedError]]]:
+    # reply to the batched prompt: {"results": [{"review_id", "errors"}]}; entries for ids not sent,
+    # repeated or without an errors list are left out, so those reviews are asked again one by one
+    s = (raw or "").strip()
+    if not s:
+        return _count("batch", Decoded("empty", [], "blank reply")), {}
+    try:
+        data, note = _load(s)
+    except ValueError as ex:
+        return _count("batch", Decoded("malformed", [], str(ex))), {}
+    results = data.get("results") if isinstance(data, dict) else data if isinstance(data, list) else None
+    if not isinstance(results, list):
+        return _count("batch", Decoded("malformed", [], "no 'results' list")), {}
+    if isinstance(data, list):
+        note = "bare list of results"
+    wanted = set(ids)
+    out: Dict[str, List[DetectedError]] = {}
+    repeated = set()
+    dropped = 0
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        rid = item.get("review_id")
+        errs = item.get("errors")
+        if not isinstance(rid, str) or rid not in wanted or not isinstance(errs, list):
+            continue
+        if rid in out:
+            # neither answer is trusted over the other
+            repeated.add(rid)
+            continue
+        out[rid], n = parse_errors(errs)
+        dropped += n
+    for rid in repeated:
+        del out[rid]
+    return _count("batch", Decoded("rescued" if note else "ok", [], note, dropped)), out
+
+
+# raw replies appended to LLM_RECORD_PATH (one JSON object per line), a corpus for tests/bench_decode.py
+_record_lock = threading.Lock()
+
+
+def record(kind: str, raw: Optional[str], ids: Optional[List[str]] = None) -> None:
+    if not LLM_RECORD_PATH:
+        return
+    line = json.dumps({"kind": kind, "content": raw or "", "ids": ids or []}, ensure_ascii=False) + "\n"
+    with _record_lock:
+        with open(LLM_RECORD_PATH, "a", encoding="utf-8") as f:
+            f.write(line)
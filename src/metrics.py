@@ -0,0 +1,298 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+# process-wide counters and histograms, exported as a JSON report or Prometheus text.
+# Names follow Prometheus conventions (counters end in _total, durations in _seconds).
+
+PREFIX = "review_agent_"
+
+# seconds; covers cache hits (sub-ms) up to slow local models
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+# observations kept per histogram for percentiles; past this a uniform reservoir sample is kept
+_RESERVOIR = 20000
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._sample: List[float] = []
+        self._rng = random.Random(0)
+
+    def observe(self, v: float) -> None:
+        self.sum += v
+        self.count += 1
+        self.max = max(self.max, v)
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+                break
+        if len(self._sample) < _RESERVOIR:
+            self._sample.append(v)
+        else:
+            j = self._rng.randrange(self.count)
+            if j < _RESERVOIR:
+                self._sample[j] = v
+
+    def percentiles(self, ps: Sequence[float] = (50, 90, 95, 99)) -> Dict[str, float]:
+        s = sorted(self._sample)
+        if not s:
+            return {f"p{p:g}": 0.0 for p in ps}
+        return {f"p{p:g}": s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))] for p in ps}
+
+
+_lock = threading.Lock()
+_counters: Dict[Tuple[str, Labels], float] = {}
+_hists: Dict[Tuple[str, Labels], Histogram] = {}
+_gauges: Dict[Tuple[str, Labels], float] = {}
+
+
+# label sets repeat on every hot-path call; normalising each one once keeps inc() / observe() cheap
+_label_cache: Dict[Tuple[Tuple[str, Any], ...], Labels] = {}
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    raw = tuple(labels.items())
+    try:
+        return _label_cache[raw]
+    except KeyError:
+        lb = _label_cache[raw] = tuple(sorted((k, str(v)) for k, v in raw))
+        return lb
+    except TypeError:  # unhashable label value
+        return tuple(sorted((k, str(v)) for k, v in raw))
+
+
+def inc(name: str, n: float = 1, **labels: Any) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        h = _hists.get(key)
+        if h is None:
+            h = _hists[key] = Histogram()
+        h.observe(value)
+
+
+def gauge(name: str, value: float, **labels: Any) -> None:
+    # last value wins, e.g. the current adaptive concurrency limit
+    with _lock:
+        _gauges[(name, _labels(labels))] = value
+
+
+def peak_rss_bytes() -> int:
+    # process high-water mark; ru_maxrss is KiB on Linux
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _size(x: Any) -> int:
+    # lists, tuples and list-like containers such as ResultStore
+    return len(x) if isinstance(x, Sequence) and not isinstance(x, str) else 0
+
+
+def instrument(node: str, fn: Callable[[Any], Any], items_in: Callable[[Any], int] = _size,
+               items_out: Callable[[Any], int] = _size) -> Callable[[Any], Any]:
+    # wrap a graph node: wall time per call, items in/out, and how much it raised the peak RSS
+    @functools.wraps(fn)
+    def wrapped(x: Any) -> Any:
+        rss0 = peak_rss_bytes()
+        t0 = time.perf_counter()
+        out = fn(x)
+        observe("node_seconds", time.perf_counter() - t0, node=node)
+        inc("node_items_in_total", items_in(x), node=node)
+        inc("node_items_out_total", items_out(out), node=node)
+        inc("node_peak_rss_growth_bytes_total", peak_rss_bytes() - rss0, node=node)
+        return out
+
+    return wrapped
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _hists.clear()
+        _gauges.clear()
+
+
+def _by_label(table: Dict[Tuple[str, Labels], Any], name: str, label: str) -> Dict[str, Any]:
+    return {dict(lb).get(label, ""): v for (n, lb), v in table.items() if n == name}
+
+
+def _sum_by_label(counters: Dict[Tuple[str, Labels], float], name: str, label: str) -> Dict[str, int]:
+    # counters that carry more labels than the one grouped by
+    out: Dict[str, int] = {}
+    for (n, lb), v in counters.items():
+        if n == name:
+            k = dict(lb).get(label, "")
+            out[k] = out.get(k, 0) + int(v)
+    return out
+
+
+def _ms(h: Optional[Histogram]) -> Dict[str, float]:
+    if h is None or not h.count:
+        return {"count": 0}
+    out = {"count": h.count, "mean": round(1000 * h.sum / h.count, 2), "max": round(1000 * h.max, 2)}
+    out.update({k: round(1000 * v, 2) for k, v in h.percentiles().items()})
+    return out
+
+
+def report() -> Dict[str, Any]:
+    with _lock:
+        counters = dict(_counters)
+        hists = dict(_hists)
+        gauges = dict(_gauges)
+
+    def total(name: str) -> float:
+        return sum(v for (n, _), v in counters.items() if n == name)
+
+    nodes = {}
+    for node, h in _by_label(hists, "node_seconds", "node").items():
+        nodes[node] = {
+            "calls": h.count,
+            "seconds": round(h.sum, 4),
+            "items_in": int(_by_label(counters, "node_items_in_total", "node").get(node, 0)),
+            "items_out": int(_by_label(counters, "node_items_out_total", "node").get(node, 0)),
+            "peak_rss_growth_mb": round(_by_label(counters, "node_peak_rss_growth_bytes_total", "node").get(node, 0) / 2**20, 1),
+            "latency_ms": _ms(h),
+        }
+
+    llm_h = hists.get(("llm_request_seconds", ()))
+    llm_seconds = llm_h.sum if llm_h else 0.0
+    completion = total("llm_completion_tokens_total")
+    checks = total("fallback_checks_total")
+    hits = _by_label(counters, "fallback_hits_total", "rule")
+
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "peak_rss_mb": round(peak_rss_bytes() / 2**20, 1),
+        "nodes": nodes,
+        "detect": {
+            "reviews": int(total("detect_reviews_total")),
+            "latency_ms": _ms(hists.get(("detect_review_seconds", ()))),
+            "results_by_source": {k: int(v) for k, v in _by_label(counters, "detections_total", "source").items()},
+        },
+        "llm": {
+            "requests": int(total("llm_requests_total")),
+            "prompt_tokens": int(total("llm_prompt_tokens_total")),
+            "completion_tokens": int(completion),
+            "completion_tokens_per_second": round(completion / llm_seconds, 1) if llm_seconds else 0.0,
+            "latency_ms": _ms(llm_h),
+            "by_model": {k: int(v) for k, v in _by_label(counters, "llm_route_total", "model").items()},
+            "escalations": {k: int(v) for k, v in _by_label(counters, "llm_escalations_total", "reason").items()},
+            "responses": _sum_by_label(counters, "llm_responses_total", "status"),
+            "items_dropped": int(total("llm_items_dropped_total")),
+            "concurrency_limit": gauges.get(("llm_concurrency_limit", ())),
+            "concurrency_adjustments": int(total("llm_concurrency_adjustments_total")),
+        },
+        "fallback_rules": {
+            "checked": int(checks),
+            "hits": {k: int(v) for k, v in hits.items()},
+            "hit_rate": {k: round(v / checks, 4) for k, v in hits.items()} if checks else {},
+        },
+        "notion": {
+            "api_calls": {k: int(v) for k, v in _by_label(counters, "notion_api_calls_total", "op").items()},
+            "api_latency_ms": {k: _ms(h) for k, h in _by_label(hists, "notion_api_seconds", "op").items()},
+            "upserts": {k: int(v) for k, v in _by_label(counters, "notion_upserts_total", "result").items()},
+        },
+        "service": {
+            "reviews": {k: int(v) for k, v in _by_label(counters, "service_reviews_total", "source").items()},
+            "rejected": int(total("service_rejected_total")),
+            "batches": int(total("service_batches_total")),
+            "failed_batches": int(total("service_batch_failures_total")),
+            "latency_ms": _ms(hists.get(("service_latency_seconds", ()))),
+        },
+        "sinks": {
+            name: {
+                "rows": int(_by_label(counters, "sink_rows_total", "sink").get(name, 0)),
+                "errors": int(_by_label(counters, "sink_errors_total", "sink").get(name, 0)),
+                "latency_ms": _ms(_by_label(hists, "sink_seconds", "sink").get(name)),
+            }
+            for name in sorted(set(_by_label(hists, "sink_seconds", "sink")) |
+                               set(_by_label(counters, "sink_errors_total", "sink")))
+        },
+    }
+
+
+def _escape(v: str) -> str:
+    # label values in the text exposition format: backslash, double quote and newline are escaped
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def to_prometheus() -> str:
+    with _lock:
+        counters = sorted(_counters.items())
+        hists = sorted(_hists.items(), key=lambda kv: kv[0])
+        gauges = sorted(_gauges.items())
+    lines: List[str] = []
+    typed = set()
+    for (name, labels), v in gauges:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            typed.add(name)
+        lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), v in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            typed.add(name)
+        lines.append(f"{PREFIX}{name}{_fmt_labels(labels)} {v:g}")
+    for (name, labels), h in hists:
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            typed.add(name)
+        cum = 0
+        for b, c in zip(h.buckets, h.counts):
+            cum += c
+            le = "+Inf" if b == float("inf") else f"{b:g}"
+            lines.append(f"{PREFIX}{name}_bucket{_fmt_labels(labels, (('le', le),))} {cum}")
+        lines.append(f"{PREFIX}{name}_sum{_fmt_labels(labels)} {h.sum:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_fmt_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+
+def _write(path: str, text: str) -> None:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export(json_path: Optional[str], prom_path: Optional[str] = None) -> Dict[str, Any]:
+    rep = report()
+    if json_path:
+        _write(json_path, json.dumps(rep, indent=2))
+    if prom_path:
+        _write(prom_path, to_prometheus())
+    return rep
@@ -1,4 +1,5 @@
 from typing import List
+from src.keywords import get_engine
 from src.utils import DetectedError, Criticality
 
 #keyword buckets for classificaiton
@@ -35,12 +36,13 @@ BUCKETS: dict[Criticality, List[str]] = {
 def classify_criticality(err: DetectedError) -> Criticality:
     s = f"{err.error_summary} {' '.join(err.error_type)}".lower()
 
-    #priority order matters
+    #one pass over the text for every bucket, then priority order decides
+    hits = get_engine().scan(s)
     for level in ("Critical", "Major", "Minor", "Suggestion"):
-        for kw in BUCKETS[level]:  
-            if kw in s:
-                return level  
-            
+        if ("criticality", level) in hits:
+            return level
+
+
     # typebased fallbacks this helps even if no keywords
     if "Crash" in err.error_type or "Billing" in err.error_type and "duplicate" in s:
         return "Critical"
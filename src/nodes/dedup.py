@@ -0,0 +1,123 @@
+import re
+import threading
+import zlib
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+from src.config import DEDUP_ENABLED, DEDUP_THRESHOLD
+from src.utils import RawReview
+
+# groups near-identical review texts so only one representative per group reaches the LLM.
+# Exact duplicates (after normalisation) are grouped by a dict lookup; the remaining distinct texts
+# go through MinHash + LSH banding to find candidates, and a candidate only joins a group when the
+# exact Jaccard similarity of its character shingles with the representative is >= DEDUP_THRESHOLD.
+
+SHINGLE = 5
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs around Jaccard 0.5 and up become candidates
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_PUNCT = re.compile(r"[^a-z0-9 ]+")
+_SPACES = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_stats = {"reviews": 0, "clusters": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+
+def normalize_text(text: str) -> str:
+    t = text.lower().replace("’", "'")
+    t = _PUNCT.sub(" ", t)
+    return _SPACES.sub(" ", t).strip()
+
+
+def shingles(norm: str) -> Set[int]:
+    if len(norm) <= SHINGLE:
+        return {zlib.crc32(norm.encode("utf-8"))}
+    return {zlib.crc32(norm[i:i + SHINGLE].encode("utf-8")) for i in range(len(norm) - SHINGLE + 1)}
+
+
+def minhash(sh: Set[int]) -> np.ndarray:
+    # crc32 values and the coefficients are < 2^32, so a*h + b fits in uint64 before the modulo
+    h = np.fromiter(sh, dtype=np.uint64, count=len(sh))
+    return ((_A[:, None] * h[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def _jaccard(a: Set[int], b: Set[int]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def cluster(reviews: List[RawReview], threshold: float = DEDUP_THRESHOLD) -> Tuple[List[int], List[int]]:
+    # returns (representative indices, assignment) where assignment[i] is the index of review i's
+    # representative; the first review of each group in input order represents it
+    assign = list(range(len(reviews)))
+    reps: List[int] = []
+    by_text: Dict[str, int] = {}
+    by_norm: Dict[str, int] = {}
+    rep_shingles: Dict[int, Set[int]] = {}
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    exact = near = 0
+
+    for i, r in enumerate(reviews):
+        # byte-identical texts skip normalisation entirely
+        j = by_text.get(r.review)
+        if j is None:
+            norm = normalize_text(r.review)
+            j = by_norm.get(norm)
+        if j is not None:
+            assign[i] = j
+            by_text[r.review] = j
+            exact += 1
+            continue
+
+        match = -1
+        keys: List[Tuple[int, bytes]] = []
+        if threshold < 1.0:
+            sh = shingles(norm)
+            sig = minhash(sh)
+            keys = [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+            seen: Set[int] = set()
+            for k in keys:
+                for c in buckets.get(k, ()):
+                    if c not in seen:
+                        seen.add(c)
+                        if _jaccard(sh, rep_shingles[c]) >= threshold:
+                            match = c
+                            break
+                if match >= 0:
+                    break
+
+        if match >= 0:
+            assign[i] = match
+            by_text[r.review] = match
+            by_norm[norm] = match
+            near += 1
+            continue
+
+        reps.append(i)
+        by_text[r.review] = i
+        by_norm[norm] = i
+        if threshold < 1.0:
+            rep_shingles[i] = sh
+            for k in keys:
+                buckets.setdefault(k, []).append(i)
+
+    with _lock:
+        _stats["reviews"] += len(reviews)
+        _stats["clusters"] += len(reps)
+        _stats["exact_duplicates"] += exact
+        _stats["near_duplicates"] += near
+    return reps, assign
+
+
+def dedup_stats() -> Dict[str, int]:
+    with _lock:
+        out = dict(_stats)
+    out["llm_calls_saved"] = out["exact_duplicates"] + out["near_duplicates"]
+    out["enabled"] = int(DEDUP_ENABLED)
+    return out
@@ -1,11 +1,23 @@
-from typing import List
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, TypeVar
 import json
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.chat_models import ChatOllama
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from src import metrics
+from src.config import (
+    DETECT_CONCURRENCY, DETECT_TARGET_P95, DETECT_MIN_CONCURRENCY, DETECT_MAX_CONCURRENCY,
+    OLLAMA_SMALL_MODEL, ROUTE_MAX_CHARS,
+)
+from src.keywords import get_engine
+from src.llm_cache import fingerprint, get_cache
+from src.llm_decode import Decoded, decode_batch, decode_errors, record
+from src.rate_limit import AdaptiveLimit
 from src.utils import RawReview, DetectedError
 
-# labels for errors
-TYPES = {"Crash","Billing","Auth","API","Performance","Docs","Permissions","Mobile","UI","Webhooks","Other"}
+T = TypeVar("T")
+R = TypeVar("R")
 
 #system prompt
 SYSTEM = """You are a precise QA assistant.
@@ -52,23 +64,48 @@ FEWSHOT_ASSISTANT_2 = """{
 
 
 def make_llm(ollama_model: str = "llama3.2:latest"):
-    #force JSON output from Ollama
-    return ChatOllama(model=ollama_model, temperature=0, format="json")
+    #force JSON output from Ollama; shared client, so this is cheap to call per review
+    # imported here: the LLM client stack is only loaded once a model is actually called
+    from src.llm_client import get_chat_model
 
-def _json_load(s: str) -> dict:
-    if not s:
-        return {"errors": []}
-    s = s.strip()
-    try:
-        return json.loads(s)
-    except Exception:
-        a, b = s.find("{"), s.rfind("}")
-        if a != -1 and b != -1 and b > a:
-            try:
-                return json.loads(s[a:b+1])
-            except Exception:
-                return {"errors": []}
-        return {"errors": []}
+    return get_chat_model(ollama_model, temperature=0, format="json")
+
+# adaptive concurrency (DETECT_TARGET_P95 > 0): one limit shared by every thread calling Ollama
+_limit: Optional[AdaptiveLimit] = None
+_limit_lock = threading.Lock()
+
+
+def _on_limit_change(limit: int) -> None:
+    metrics.gauge("llm_concurrency_limit", limit)
+    metrics.inc("llm_concurrency_adjustments_total")
+
+
+def adaptive_limit() -> Optional[AdaptiveLimit]:
+    global _limit
+    if DETECT_TARGET_P95 <= 0:
+        return None
+    if _limit is None:
+        with _limit_lock:
+            if _limit is None:
+                _limit = AdaptiveLimit(DETECT_CONCURRENCY, DETECT_MIN_CONCURRENCY, DETECT_MAX_CONCURRENCY,
+                                       target_p95=DETECT_TARGET_P95, on_change=_on_limit_change)
+                metrics.gauge("llm_concurrency_limit", _limit.limit)
+    return _limit
+
+
+def _invoke(llm, prompt: str):
+    # every Ollama request goes through here: timed into the usage metrics, and held to the adaptive limit
+    # when it is on (the limit sees service time plus the queueing Ollama does past its parallel slots)
+    from src.llm_client import record_usage
+
+    def call():
+        t0 = time.perf_counter()
+        resp = llm.invoke(prompt)
+        record_usage(resp, time.perf_counter() - t0)
+        return resp
+
+    limit = adaptive_limit()
+    return limit.call(call) if limit else call()
 
 #keyword fallback to guarantees something for obvious cases
 FALLBACK_RULES = [
@@ -90,11 +127,12 @@ FALLBACK_RULES = [
 
 
 
-def _fallback_detect(text: str) -> List[DetectedError]:
-    s = text.lower()
+def _fallback_detect(text: str, hits: Optional[Set[Hashable]] = None) -> List[DetectedError]:
+    if hits is None:
+        hits = get_engine().scan(text)
     out: List[DetectedError] = []
-    for summary, types, kws in FALLBACK_RULES:
-        if any(k in s for k in kws):
+    for i, (summary, types, _) in enumerate(FALLBACK_RULES):
+        if ("fallback", i) in hits:
             out.append(DetectedError(
                 error_summary=summary[:140],
                 error_type=types,
@@ -113,46 +151,45 @@ SUGGESTION_TERMS = [
     "saved views", "granular permissions", "custom roles", "api endpoint", "webhook"
 ]
 
-def _fallback_suggestion(text: str) -> List[DetectedError]:
+# tidy summaries for common requests, first match wins
+SUGGESTION_SUMMARIES = [
+    (["bulk edit"], "Feature request: bulk edit for tasks"),
+    (["offline mode"], "Feature request: offline mode"),
+    (["dark mode"], "Feature request: dark mode"),
+    (["export to csv"], "Feature request: export to CSV"),
+    (["keyboard shortcuts"], "Feature request: keyboard shortcuts"),
+    (["granular permissions", "custom roles"], "Feature request: granular permissions"),
+    # try to capture the target integration name
+    (["integration with"], "Feature request: integration with external service"),
+]
+
+def _fallback_suggestion(text: str, hits: Optional[Set[Hashable]] = None) -> List[DetectedError]:
     t = text.strip()
-    t_low = t.lower()
     if not t:
         return []
-    for term in SUGGESTION_TERMS:
-        if term in t_low:
-            # produce a tidy summary for common cases
-            if "bulk edit" in t_low:
-                summary = "Feature request: bulk edit for tasks"
-            elif "offline mode" in t_low:
-                summary = "Feature request: offline mode"
-            elif "dark mode" in t_low:
-                summary = "Feature request: dark mode"
-            elif "export to csv" in t_low:
-                summary = "Feature request: export to CSV"
-            elif "keyboard shortcuts" in t_low:
-                summary = "Feature request: keyboard shortcuts"
-            elif "granular permissions" in t_low or "custom roles" in t_low:
-                summary = "Feature request: granular permissions"
-            elif "integration with" in t_low:
-                # try to capture the target integration name
-                summary = "Feature request: integration with external service"
-            else:
-                summary = "Feature request: " + t.replace("\n", " ")
-            return [DetectedError(
-                error_summary=summary[:140],
-                error_type=["Other"],
-                rationale="Detected enhancement/feature request from user phrasing."
-            )]
-    return []
+    if hits is None:
+        hits = get_engine().scan(t)
+    if ("suggestion", None) not in hits:
+        return []
+    # produce a tidy summary for common cases
+    summary = next(
+        (s for i, (_, s) in enumerate(SUGGESTION_SUMMARIES) if ("suggestion_summary", i) in hits),
+        "Feature request: " + t.replace("\n", " "),
+    )
+    return [DetectedError(
+        error_summary=summary[:140],
+        error_type=["Other"],
+        rationale="Detected enhancement/feature request from user phrasing."
+    )]
 
-def detect_errors_with_ollama(
-    review: RawReview,
-    ollama_model: str = "llama3.2:latest",
-) -> List[DetectedError]:
-    llm = make_llm(ollama_model)
 
+# any edit to the prompt text changes this, so cached results from an older prompt are never reused
+PROMPT_FINGERPRINT = fingerprint(SYSTEM, FEWSHOT_USER, FEWSHOT_ASSISTANT, FEWSHOT_USER_2, FEWSHOT_ASSISTANT_2, USER)
+
+
+def build_prompt(review_text: str) -> str:
     # Include BOTH few-shots before the real review, then the user template
-    full_prompt = f"""{SYSTEM}
+    return f"""{SYSTEM}
 
 {FEWSHOT_USER}
 
@@ -162,42 +199,269 @@ def detect_errors_with_ollama(
 
 {FEWSHOT_ASSISTANT_2}
 
-{USER.format(review_text=review.review[:4000])}
+{USER.format(review_text=review_text[:4000])}
 """
-    
-    resp = llm.invoke(full_prompt)
 
-    raw = (getattr(resp, "content", "") or "").strip()
-    data = _json_load(raw)
-    items = data.get("errors", [])
-    out: List[DetectedError] = []
-
-    if isinstance(items, list):
-        for e in items:
-            if not isinstance(e, dict):
-                continue
-            summary = (e.get("error_summary") or "").strip()[:140]
-            types = e.get("error_type") or []
-            if isinstance(types, str):
-                types = [types]
-            types = [t for t in types if isinstance(t, str) and t in TYPES] or ["Other"]
-            rationale = (e.get("rationale") or "").strip()
-            if summary:
-                out.append(DetectedError(
-                    error_summary=summary,
-                    error_type=types,
-                    rationale=rationale
-                ))
 
+def _apply_fallbacks(text: str, out: List[DetectedError]) -> List[DetectedError]:
     # fallback if LLM returned nothing to the set keywords
-    if not out:
-        # 1) try error fallbacks (crash/billing/etc.)
-        out = _fallback_detect(review.review)
+    if out:
+        metrics.inc("detections_total", source="llm")
+        return out
+    # one scan serves both fallbacks
+    hits = get_engine().scan(text)
+    metrics.inc("fallback_checks_total")
+
+    # 1) try error fallbacks (crash/billing/etc.)
+    out = _fallback_detect(text, hits)
+    for e in out:
+        metrics.inc("fallback_hits_total", rule=e.error_summary)
 
     # If still empty, try suggestion fallback
     if not out:
-        out = _fallback_suggestion(review.review)
+        out = _fallback_suggestion(text, hits)
+        if out:
+            metrics.inc("fallback_hits_total", rule="suggestion")
 
     # No placeholder rows; empty list means "nothing to log"
+    metrics.inc("detections_total", source="fallback" if out else "none")
+    return out
+
+
+def _llm_reply(review_text: str, ollama_model: str) -> Decoded:
+    # LLM output only (no keyword fallbacks), served from the on-disk cache when possible; malformed and
+    # empty replies are not cached, so the next run asks again
+    text = review_text[:4000]
+    cache = get_cache()
+    key = cache.key(text, ollama_model, PROMPT_FINGERPRINT) if cache else None
+    if cache:
+        hit = cache.get(key)
+        if hit is not None:
+            return Decoded("ok", [DetectedError(**e) for e in hit])
+
+    resp = _invoke(make_llm(ollama_model), build_prompt(text))
+    raw = getattr(resp, "content", "") or ""
+    record("single", raw)
+    decoded = decode_errors(raw)
+
+    if cache and decoded.usable:
+        cache.put(key, ollama_model, PROMPT_FINGERPRINT, [e.model_dump() for e in decoded.errors])
+    return decoded
+
+
+def _llm_detect(review_text: str, ollama_model: str) -> List[DetectedError]:
+    return _llm_reply(review_text, ollama_model).errors
+
+
+def _rule_hits(text: str) -> Set[Hashable]:
+    # fallback / suggestion rules the review trips (criticality and triage cues are not about what the issue is)
+    return {h for h in get_engine().scan(text) if h[0] in ("fallback", "suggestion")}
+
+
+def _route(text: str, ollama_model: str) -> str:
+    # short reviews and reviews that trip exactly one keyword rule are easy: small model first
+    small = OLLAMA_SMALL_MODEL
+    if not small or small == ollama_model:
+        return ollama_model
+    if len(text) <= ROUTE_MAX_CHARS or len(_rule_hits(text)) == 1:
+        return small
+    return ollama_model
+
+
+def _escalation(text: str, reply: Decoded) -> Optional[str]:
+    # why a small-model answer is not trusted, or None to keep it
+    if not reply.usable:
+        return reply.status  # malformed / empty
+    out = reply.errors
+    if not out and _rule_hits(text):
+        return "missed_keywords"  # found nothing where the keyword rules see something
+    for e in out:
+        # the decoder maps labels outside TYPES to "Other"; only feature requests are legitimately Other
+        if e.error_type == ["Other"] and not e.error_summary.lower().startswith(("feature request", "enhancement")):
+            return "untyped"
+    return None
+
+
+def _routed_detect(review_text: str, ollama_model: str) -> List[DetectedError]:
+    model = _route(review_text, ollama_model)
+    metrics.inc("llm_route_total", model=model)
+    if model == ollama_model:
+        return _llm_detect(review_text, ollama_model)
+    reply = _llm_reply(review_text, model)
+    reason = _escalation(review_text, reply)
+    if reason is None:
+        return reply.errors
+    metrics.inc("llm_escalations_total", reason=reason)
+    metrics.inc("llm_route_total", model=ollama_model)
+    return _llm_detect(review_text, ollama_model)
+
+
+def detect_errors_with_ollama(
+    review: RawReview,
+    ollama_model: str = "llama3.2:latest",
+) -> List[DetectedError]:
+    t0 = time.perf_counter()
+    out = _routed_detect(review.review, ollama_model)
+    out = _apply_fallbacks(review.review, out)
+    metrics.inc("detect_reviews_total")
+    metrics.observe("detect_review_seconds", time.perf_counter() - t0)
     return out
 
+
+# batched mode: several reviews per request so SYSTEM and the few-shots are paid once per batch
+BATCH_SYSTEM = """You are a precise QA assistant.
+Task: You are given a JSON list of customer reviews, each with a review_id. For EACH review, extract
+ZERO OR MORE concrete PRODUCT/SERVICE PROBLEMS OR FEATURE/ENHANCEMENT REQUESTS.
+
+Return ONLY valid JSON with this exact shape, with exactly one entry per input review_id:
+{"results":[{"review_id":"...","errors":[{"error_summary":"...", "error_type":["Crash","Billing","Auth","API","Performance","Docs","Permissions","Mobile","UI","Webhooks","Other"], "rationale":"..."}]}]}
+
+Guidelines:
+- error_summary <= 140 chars, actionable (what/where). For feature/enhancement requests, start with "Feature request:" or "Enhancement:" and name the request (e.g., "Feature request: dark mode").
+- If a review has no problem or request, return "errors": [] for that review_id.
+- Use multiple error_type labels if appropriate; for feature requests, use ["Other"] unless clearly UI/Docs/etc.
+- Copy each review_id exactly as given. Output must be ONLY the JSON object (no prose).
+"""
+
+BATCH_FEWSHOT_USER = """Reviews:
+[{"review_id":"EX-1","review":"Not thrilled about how the mobile app crashes whenever I switch workspaces. Lost my draft twice."},
+ {"review_id":"EX-2","review":"Could you add support for bulk edit on tasks?"},
+ {"review_id":"EX-3","review":"Setup took five minutes, love it."}]
+Return JSON only:"""
+
+BATCH_FEWSHOT_ASSISTANT = """{"results":[
+  {"review_id":"EX-1","errors":[{"error_summary":"Mobile app crashes when switching workspaces","error_type":["Mobile","Crash"],"rationale":"User reports reproducible crash and data loss while switching workspaces."}]},
+  {"review_id":"EX-2","errors":[{"error_summary":"Feature request: bulk edit for tasks","error_type":["Other"],"rationale":"User explicitly asks to add bulk-edit capability."}]},
+  {"review_id":"EX-3","errors":[]}
+]}"""
+
+BATCH_USER = """Reviews:
+{reviews_json}
+Return JSON only:"""
+
+BATCH_PROMPT_FINGERPRINT = fingerprint(BATCH_SYSTEM, BATCH_FEWSHOT_USER, BATCH_FEWSHOT_ASSISTANT, BATCH_USER)
+
+
+def build_batch_prompt(reviews: List[RawReview]) -> str:
+    items = [{"review_id": r.review_id, "review": r.review[:4000]} for r in reviews]
+    return f"""{BATCH_SYSTEM}
+
+{BATCH_FEWSHOT_USER}
+
+{BATCH_FEWSHOT_ASSISTANT}
+
+{BATCH_USER.format(reviews_json=json.dumps(items, ensure_ascii=False))}
+"""
+
+
+def _llm_detect_batch(reviews: List[RawReview], ollama_model: str) -> List[Optional[List[DetectedError]]]:
+    # LLM output only for a batch; None for reviews the batch did not answer (ids missing or malformed in
+    # the reply, repeated in the batch, or a batch of one), which the caller detects one by one
+    cache = get_cache()
+    results: List[Optional[List[DetectedError]]] = [None] * len(reviews)
+    # a batched answer depends on the other reviews in the prompt, so it is only reused for the same batch
+    batch_fp = fingerprint(BATCH_PROMPT_FINGERPRINT, *(f"{r.review_id}\x00{r.review[:4000]}" for r in reviews))
+    keys = [cache.key(r.review[:4000], ollama_model, batch_fp) if cache else None for r in reviews]
+    if cache:
+        for i, k in enumerate(keys):
+            hit = cache.get(k)
+            if hit is not None:
+                results[i] = [DetectedError(**e) for e in hit]
+
+    todo = [i for i, res in enumerate(results) if res is None]
+    # duplicate review_ids inside one batch would be ambiguous, send those on their own
+    seen: Dict[str, int] = {}
+    batch_idx: List[int] = []
+    for i in todo:
+        rid = reviews[i].review_id
+        if rid in seen:
+            continue
+        seen[rid] = i
+        batch_idx.append(i)
+
+    if len(batch_idx) > 1:
+        # batched prompts always go to ollama_model: a small model is not trusted to keep ids straight
+        resp = _invoke(make_llm(ollama_model), build_batch_prompt([reviews[i] for i in batch_idx]))
+        raw = getattr(resp, "content", "") or ""
+        ids = [reviews[i].review_id for i in batch_idx]
+        record("batch", raw, ids)
+        # only well-formed entries for ids we actually sent; anything else is treated as missing
+        _, parsed = decode_batch(raw, ids)
+        for i in batch_idx:
+            errs = parsed.get(reviews[i].review_id)
+            if errs is not None:
+                results[i] = errs
+                if cache:
+                    cache.put(keys[i], ollama_model, batch_fp, [e.model_dump() for e in errs])
+    return results
+
+
+def _detect_batch_isolated(reviews: List[RawReview], ollama_model: str) -> List[List[DetectedError]]:
+    try:
+        found = _llm_detect_batch(reviews, ollama_model)
+    except Exception as ex:
+        print(f"[detect] batch {reviews[0].review_id}..{reviews[-1].review_id} failed "
+              f"({type(ex).__name__}: {ex}); retrying reviews one by one")
+        return [_detect_isolated(r, ollama_model) for r in reviews]
+    metrics.inc("detect_reviews_total", sum(errs is not None for errs in found))
+    # the rest take the unbatched path: small/large routing, per-review latency and its own failure handling
+    return [_detect_isolated(r, ollama_model) if errs is None else _apply_fallbacks(r.review, errs)
+            for r, errs in zip(reviews, found)]
+
+
+def _chunks(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+
+def _ordered_map(fn: Callable[[T], R], items: Iterable[T], max_workers: int,
+                 window: Optional[Callable[[], int]] = None) -> Iterator[R]:
+    # bounded window of futures: at most max_workers calls in flight (or window(), read as it changes),
+    # results yielded in input order
+    if max_workers <= 1:
+        for it in items:
+            yield fn(it)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for it in items:
+            pending.append(pool.submit(fn, it))
+            while len(pending) >= (window() if window else max_workers):
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _detect_isolated(review: RawReview, ollama_model: str) -> List[DetectedError]:
+    # one bad review (timeout, 500, bad payload) must not abort the whole run
+    try:
+        return detect_errors_with_ollama(review, ollama_model)
+    except Exception as ex:
+        print(f"[detect] {review.review_id} failed ({type(ex).__name__}: {ex}); using keyword fallback")
+        return _fallback_detect(review.review) or _fallback_suggestion(review.review)
+
+
+def detect_errors_many(
+    reviews: Iterable[RawReview],
+    ollama_model: str = "llama3.2:latest",
+    max_workers: int = 4,
+    batch_size: int = 1,
+) -> Iterator[List[DetectedError]]:
+    #concurrent detection, one result list per review in the same order as the input
+    limit = adaptive_limit()
+    window = None
+    if limit is not None:
+        # threads for the limit's ceiling, but only a couple of reviews queued past the current limit: enough
+        # for it to see demand, without reviews sitting in the client queue and inflating their latency
+        max_workers = max(max_workers, limit.maximum)
+        window = lambda: limit.limit + 2
+    if batch_size <= 1:
+        return _ordered_map(lambda r: _detect_isolated(r, ollama_model), reviews, max_workers, window)
+    batches = _ordered_map(lambda b: _detect_batch_isolated(b, ollama_model), _chunks(reviews, batch_size),
+                           max_workers, window)
+    return (errs for batch in batches for errs in batch)
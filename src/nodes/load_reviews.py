@@ -1,29 +1,60 @@
+import gc
+import importlib.util
 import pandas as pd
-from typing import List
+from contextlib import contextmanager
+from typing import Iterator, List
+from pydantic import TypeAdapter
 from src.utils import RawReview
 
+# optional: multithreaded csv parser for whole-file loads (probed, not imported, to keep startup fast)
+_CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
 #check schema for required columns
 REQUIRED = {"review_id","review","username","email","date","reviewer_name","rating"}
+STR_COLS = ["review_id", "review", "username", "email", "date", "reviewer_name"]
+COLS = STR_COLS + ["rating"]
+
+# read text columns as text so ids like "00123" keep their zeros
+_DTYPES = {c: str for c in STR_COLS}
+
+_REVIEWS = TypeAdapter(List[RawReview])
+
+
+@contextmanager
+def _gc_paused():
+    # millions of fresh, acyclic objects would otherwise trigger repeated full gc passes
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
 
 
-def load_reviews(path: str) -> List[RawReview]:
-    df = pd.read_csv(path)
+def _to_reviews(df: pd.DataFrame, validate: bool = True) -> List[RawReview]:
     missing = REQUIRED - set(df.columns)
     if missing:
         raise ValueError(f"Missing columns: {missing}")
 
-# convert row from csv to model
-    records: List[RawReview] = []
-    for _, row in df.iterrows():
-        records.append(
-            RawReview(
-                review_id=str(row["review_id"]),
-                review=str(row["review"]),
-                username=str(row["username"]),
-                email=str(row["email"]),
-                date=str(row["date"]),
-                reviewer_name=str(row["reviewer_name"]),
-                rating=int(row["rating"]),
-            )
-        )
-    return records
+    # coerce whole columns at once instead of per row
+    cols = {c: df[c].astype(str).tolist() for c in STR_COLS}
+    cols["rating"] = pd.to_numeric(df["rating"], errors="raise").astype(int).tolist()
+
+    with _gc_paused():
+        rows = [dict(zip(COLS, r)) for r in zip(*(cols[c] for c in COLS))]
+        # trusted source: the columns were coerced above, so strict mode only checks types, no lax conversion
+        return _REVIEWS.validate_python(rows, strict=not validate)
+
+
+def load_reviews(path: str, validate: bool = True) -> List[RawReview]:
+    return _to_reviews(pd.read_csv(path, dtype=_DTYPES, engine=_CSV_ENGINE), validate)
+
+
+def iter_reviews(path: str, chunk_size: int, skip: int = 0, validate: bool = True) -> Iterator[List[RawReview]]:
+    #stream the csv in chunks so only chunk_size rows are in memory at once
+    #skip drops the first N data rows (header kept)
+    reader = pd.read_csv(path, dtype=_DTYPES, chunksize=chunk_size,
+                         skiprows=range(1, skip + 1) if skip else None)
+    for df in reader:
+        yield _to_reviews(df, validate)
@@ -1,23 +1,26 @@
 from typing import List, Dict
 from src.utils import RawReview, DetectedError, EnrichedError, hash_error
 from src.nodes.classify_criticality import classify_criticality
+from src.results import ResultStore
+
+
+def _unique(review: RawReview, detected: List[DetectedError]) -> Dict[str, DetectedError]:
+    # one error per hash: first position, last value
+    uniq: Dict[str, DetectedError] = {}
+    for e in detected:
+        uniq[hash_error(review.review_id, e.error_summary)] = e
+    return uniq
+
 
 #enrich erorr items
 def normalize(review: RawReview, detected: List[DetectedError]) -> List[EnrichedError]:
-    enriched: List[EnrichedError] = []
-    for e in detected:
-        crit = classify_criticality(e)
-        enriched.append(
-            EnrichedError(
-                review=review,
-                error=e,
-                criticality=crit,
-                error_hash=hash_error(review.review_id, e.error_summary),
-            )
-        )
+    return [
+        EnrichedError(review=review, error=e, criticality=classify_criticality(e), error_hash=h)
+        for h, e in _unique(review, detected).items()
+    ]
 
 
-    uniq: Dict[str, EnrichedError] = {}
-    for it in enriched:
-        uniq[it.error_hash] = it
-    return list(uniq.values())
+#same, appended to a columnar store instead of building an EnrichedError per error
+def normalize_into(store: ResultStore, review: RawReview, detected: List[DetectedError]) -> None:
+    for h, e in _unique(review, detected).items():
+        store.append(review, e, classify_criticality(e), h)
@@ -1,29 +1,62 @@
 # src/nodes/notion_logger.py
 import os
+import json
 import time
 import hashlib
-from typing import Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+import httpx
 from dotenv import load_dotenv
 from notion_client import Client
-from notion_client.errors import APIResponseError
+from notion_client.errors import APIResponseError, HTTPResponseError, RequestTimeoutError
 
-from src.utils import EnrichedError 
+from src import metrics
+from src.config import STATE_DIR
+from src.rate_limit import TokenBucket, backoff_delay
+from src.state_store import StateStore, get_state_store
+from src.utils import EnrichedError
 
 load_dotenv()
 
 NOTION_API_KEY = os.getenv("NOTION_API_KEY")
 NOTION_DATABASE_ID = os.getenv("NOTION_DATABASE_ID") or os.getenv("NOTION_DB_ID")
+# point at a local fake server for tests/benchmarks
+NOTION_BASE_URL = os.getenv("NOTION_BASE_URL", "https://api.notion.com")
+# concurrent page writes; Notion allows ~3 requests/s on average per integration
+NOTION_CONCURRENCY = int(os.getenv("NOTION_CONCURRENCY", "3"))
+# client-side request budget (requests/s) shared by every writer thread; 0 disables
+NOTION_RATE_LIMIT = float(os.getenv("NOTION_RATE_LIMIT", "3"))
+NOTION_MAX_RETRIES = int(os.getenv("NOTION_MAX_RETRIES", "5"))
+# items that still fail after retries are appended here as JSON lines for replay
+NOTION_DEAD_LETTER_PATH = os.getenv("NOTION_DEAD_LETTER_PATH", os.path.join(STATE_DIR, "notion_dead_letter.jsonl"))
 
-assert NOTION_API_KEY, "Missing NOTION_API_KEY"
-assert NOTION_DATABASE_ID, "Missing NOTION_DATABASE_ID"
+# rate limited, conflict (Notion asks clients to retry these) and transient server errors
+_RETRY_STATUSES = {409, 429, 500, 502, 503, 504}
 
-notion = Client(auth=NOTION_API_KEY)
+_client: Optional[Client] = None
+
+
+def _ambiguous(ex: Exception) -> bool:
+    # the request may have been applied although it failed: no response (timeout, connection dropped
+    # after sending), a 5xx or a 409. A 429 or a failed connect never reached Notion.
+    if isinstance(ex, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return False
+    status = getattr(ex, "status", None)
+    return status is None or status == 409 or status >= 500
 
 
 def _sha12(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
 
 
+def _hash_of(e: EnrichedError) -> str:
+    #use existing errorhash or compute one
+    return getattr(e, "error_hash", None) or _sha12(
+        f"{e.review.review_id}|{e.error.error_summary}"
+    )
+
+
 #match properties from enrichederror to databses columns
 def _props_from_enriched(e: EnrichedError, hash_value: str) -> Dict[str, Any]:
     review = e.review
@@ -41,27 +74,270 @@ def _props_from_enriched(e: EnrichedError, hash_value: str) -> Dict[str, Any]:
     }
 
 
-def _find_page_by_hash(hash_value: str) -> Optional[str]:
-    res = notion.databases.query(
-        database_id=NOTION_DATABASE_ID,
-        filter={"property": "Hash", "rich_text": {"equals": hash_value}},
-        page_size=1,
-    )
-    results = res.get("results", [])
-    return results[0]["id"] if results else None
+def _fingerprint(props: Dict[str, Any]) -> str:
+    # stable digest of the exact payload we would send
+    blob = json.dumps(props, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
 
-def upsert_enriched_error(e: EnrichedError) -> str:
-    #use existing errorhash or compute one 
-    hash_value = getattr(e, "error_hash", None) or _sha12(
-        f"{e.review.review_id}|{e.error.error_summary}"
-    )
 
-    props = _props_from_enriched(e, hash_value)
-    page_id = _find_page_by_hash(hash_value)
+def _retry_after(ex: Exception) -> Optional[float]:
+    headers = getattr(ex, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _hash_from_page(page: Dict[str, Any]) -> Optional[str]:
+    prop = (page.get("properties") or {}).get("Hash") or {}
+    text = "".join(t.get("plain_text", "") for t in prop.get("rich_text") or [])
+    return text or None
+
+
+class NotionLogger:
+    # keeps a local Hash -> page_id index so an upsert is one API call instead of query + write,
+    # plus a fingerprint of what was last written to each page so identical payloads are skipped
+
+    def __init__(self, client: Client, database_id: str, max_workers: int = NOTION_CONCURRENCY,
+                 rate_limit: float = NOTION_RATE_LIMIT, max_retries: int = NOTION_MAX_RETRIES,
+                 dead_letter_path: Optional[str] = NOTION_DEAD_LETTER_PATH,
+                 fingerprint_store: Optional[StateStore] = None):
+        self.client = client
+        self.database_id = database_id
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self.bucket = TokenBucket(rate_limit)
+        # persists fingerprints across runs; None keeps them in memory only
+        self.fingerprint_store = fingerprint_store
+        self._index: Dict[str, str] = {}
+        self._fingerprints: Dict[str, str] = {}
+        self._index_loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._stats = {"created": 0, "updated": 0, "skipped": 0, "failed": 0, "api_calls": 0, "retries": 0, "recovered": 0, "throttled": 0,
+                       "throttle_wait_seconds": 0.0, "index_pages": 0, "write_seconds": 0.0}
+
+    def _bump(self, key: str, n: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += n
+
+    def _call(self, fn: Callable[..., Any], recover: Optional[Callable[[], Any]] = None, **kwargs: Any) -> Any:
+        # every API call goes through the shared token bucket; 429/5xx/timeouts are retried with backoff.
+        # For calls that are not idempotent, recover() runs before retrying an ambiguous failure and its
+        # result, if not None, is returned instead of sending the request again
+        # op is e.g. "pages.create"
+        op = f"{type(getattr(fn, '__self__', None)).__name__.replace('Endpoint', '').lower()}.{fn.__name__}"
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            if waited:
+                self._bump("throttle_wait_seconds", waited)
+            self._bump("api_calls")
+            metrics.inc("notion_api_calls_total", op=op)
+            t0 = time.perf_counter()
+            try:
+                res = fn(**kwargs)
+                metrics.observe("notion_api_seconds", time.perf_counter() - t0, op=op)
+                return res
+            except (HTTPResponseError, RequestTimeoutError, httpx.TransportError) as ex:
+                metrics.observe("notion_api_seconds", time.perf_counter() - t0, op=op)
+                status = getattr(ex, "status", None)
+                metrics.inc("notion_api_errors_total", op=op, status=status if status is not None else "transport")
+                if (status is not None and status not in _RETRY_STATUSES) or attempt >= self.max_retries:
+                    raise
+                if recover is not None and _ambiguous(ex):
+                    found = recover()
+                    if found is not None:
+                        self._bump("recovered")
+                        return found
+                self._bump("retries")
+                wait = _retry_after(ex)
+                if status == 429:
+                    self._bump("throttled")
+                    # hold all writer threads, not just this one
+                    self.bucket.pause(wait if wait is not None else backoff_delay(attempt))
+                else:
+                    time.sleep(wait if wait is not None else backoff_delay(attempt))
+                attempt += 1
+
+    def _dead_letter(self, hash_value: str, e: EnrichedError, props: Dict[str, Any], ex: Exception) -> None:
+        self._bump("failed")
+        print(f"[notion] giving up on {e.review.review_id} ({hash_value}): {type(ex).__name__}: {ex}")
+        if not self.dead_letter_path:
+            return
+        d = os.path.dirname(self.dead_letter_path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        line = json.dumps({
+            "ts": time.time(),
+            "hash": hash_value,
+            "review_id": e.review.review_id,
+            "status": getattr(ex, "status", None),
+            "error": f"{type(ex).__name__}: {ex}",
+            "properties": props,
+        }, ensure_ascii=False)
+        with self._lock:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def load_index(self) -> int:
+        # one paged scan of the database at startup; only the Hash property is requested when we can
+        query: Dict[str, Any] = {"database_id": self.database_id, "page_size": 100}
+        try:
+            db = self._call(self.client.databases.retrieve, database_id=self.database_id)
+            hash_prop = (db.get("properties") or {}).get("Hash") or {}
+            if hash_prop.get("id"):
+                query["filter_properties"] = [hash_prop["id"]]
+        except APIResponseError:
+            pass
+
+        index: Dict[str, str] = {}
+        cursor = None
+        while True:
+            if cursor:
+                query["start_cursor"] = cursor
+            res = self._call(self.client.databases.query, **query)
+            self._bump("index_pages")
+            for page in res.get("results", []):
+                h = _hash_from_page(page)
+                if h:
+                    index.setdefault(h, page["id"])
+            if not res.get("has_more"):
+                break
+            cursor = res.get("next_cursor")
+
+        # a stored fingerprint only counts if it was written to the page that still holds the hash
+        fingerprints: Dict[str, str] = {}
+        if self.fingerprint_store is not None:
+            for h, (page_id, fp) in self.fingerprint_store.load_page_fingerprints().items():
+                if index.get(h) == page_id:
+                    fingerprints[h] = fp
+
+        with self._lock:
+            self._index = index
+            self._fingerprints = fingerprints
+            self._index_loaded = True
+        return len(index)
+
+    def _ensure_index(self) -> None:
+        if self._index_loaded:
+            return
+        with self._load_lock:
+            if not self._index_loaded:
+                self.load_index()
+
+    def _find_page(self, hash_value: str) -> Optional[Dict[str, Any]]:
+        # the page holding this Hash, if Notion has one
+        res = self._call(self.client.databases.query, database_id=self.database_id, page_size=1,
+                         filter={"property": "Hash", "rich_text": {"equals": hash_value}})
+        pages = res.get("results") or []
+        return pages[0] if pages else None
+
+    def _write(self, hash_value: str, page_id: Optional[str], props: Dict[str, Any]):
+        # Create or update
+        if page_id:
+            try:
+                return self._call(self.client.pages.update, page_id=page_id, properties=props), "updated"
+            except APIResponseError as ex:
+                if ex.status != 404:
+                    raise
+                # page was deleted in Notion since the index was built: recreate it
+        # pages.create is not idempotent: if a failed attempt may have landed, look for its page first
+        page = self._call(self.client.pages.create, recover=lambda: self._find_page(hash_value),
+                          parent={"database_id": self.database_id}, properties=props)
+        return page, "created"
+
+    def upsert(self, e: EnrichedError) -> Optional[str]:
+        # returns the page id, or None if the item was dead-lettered
+        self._ensure_index()
+        hash_value = _hash_of(e)
+        props = _props_from_enriched(e, hash_value)
+        fp = _fingerprint(props)
+        with self._lock:
+            page_id = self._index.get(hash_value)
+            if page_id and self._fingerprints.get(hash_value) == fp:
+                self._stats["skipped"] += 1
+                metrics.inc("notion_upserts_total", result="skipped")
+                return page_id
+
+        t0 = time.perf_counter()
+        try:
+            page, kind = self._write(hash_value, page_id, props)
+        except (HTTPResponseError, RequestTimeoutError, httpx.TransportError) as ex:
+            self._dead_letter(hash_value, e, props, ex)
+            metrics.inc("notion_upserts_total", result="failed")
+            return None
+        with self._lock:
+            self._index[hash_value] = page["id"]
+            self._fingerprints[hash_value] = fp
+            self._stats[kind] += 1
+            self._stats["write_seconds"] += time.perf_counter() - t0
+        metrics.inc("notion_upserts_total", result=kind)
+        if self.fingerprint_store is not None:
+            self.fingerprint_store.save_page_fingerprint(hash_value, page["id"], fp)
+        return page["id"]
+
+    def upsert_many(self, items: List[EnrichedError]) -> List[Optional[str]]:
+        # same hash twice in one batch would race into two creates; the last write wins anyway
+        self._ensure_index()
+        latest: Dict[str, EnrichedError] = {}
+        for e in items:
+            latest[_hash_of(e)] = e
+        unique = list(latest.values())
+
+        before = self.stats()
+        t0 = time.perf_counter()
+        if self.max_workers <= 1:
+            page_ids = [self.upsert(e) for e in unique]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                page_ids = list(pool.map(self.upsert, unique))
+        wall = time.perf_counter() - t0
+        if unique:
+            after = self.stats()
+            counts = ", ".join(f"{k}={after[k] - before[k]}" for k in ("created", "updated", "skipped", "failed"))
+            print(f"[notion] {len(unique)} items in {wall:.1f}s ({len(unique) / wall:.1f}/s): {counts}")
+        by_hash = dict(zip(latest.keys(), page_ids))
+        return [by_hash[_hash_of(e)] for e in items]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._stats, indexed=len(self._index))
+        writes = out["created"] + out["updated"]
+        out["avg_write_ms"] = round(1000 * out["write_seconds"] / writes, 1) if writes else 0.0
+        return out
+
+
+_logger: Optional[NotionLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_client() -> Client:
+    # credentials are checked when Notion is first used, not at import, so dry runs need none
+    global _client
+    if _client is None:
+        if not NOTION_API_KEY:
+            raise RuntimeError("Missing NOTION_API_KEY (set it, or NOTION_DRY_RUN=1 to skip Notion)")
+        _client = Client(auth=NOTION_API_KEY, base_url=NOTION_BASE_URL)
+    return _client
+
+
+def get_logger() -> NotionLogger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                if not NOTION_DATABASE_ID:
+                    raise RuntimeError("Missing NOTION_DATABASE_ID (set it, or NOTION_DRY_RUN=1 to skip Notion)")
+                _logger = NotionLogger(get_client(), NOTION_DATABASE_ID, fingerprint_store=get_state_store())
+    return _logger
+
+
+def upsert_enriched_error(e: EnrichedError) -> Optional[str]:
+    return get_logger().upsert(e)
+
 
-    # Create or update
-    if page_id:
-        page = notion.pages.update(page_id=page_id, properties=props)
-    else:
-        page = notion.pages.create(parent={"database_id": NOTION_DATABASE_ID}, properties=props)
-    return page["id"]
+def upsert_enriched_errors(items: List[EnrichedError]) -> List[Optional[str]]:
+    return get_logger().upsert_many(items)
@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from typing import Dict, List, Tuple
+
+from src.config import TRIAGE_POLICY, TRIAGE_MIN_RATING, TRIAGE_MAX_LENGTH, TRIAGE_SAMPLE_RATE
+from src.keywords import get_engine
+from src.utils import RawReview
+
+# cheap routing before the LLM: a high rating, short text and no hit from any rule list
+# (fallbacks, suggestions, criticality buckets, the cues below) means "nothing to report"
+
+# phrasing that signals a complaint even when no product keyword matches
+NEGATIVE_CUES = [
+    "not ", "n't", "but ", "however", "although", "issue", "bug", "error", "problem", "broken", "breaks",
+    "fail", "slow", "missing", "wrong", "unable", "frustrat", "disappoint", "annoying", "confusing",
+    "please", "hope the team", "alternatives", "fix", "refund", "cancel",
+]
+
+# policies for reviews triaged as clean:
+#   skip   -> never sent to the LLM
+#   sample -> a stable TRIAGE_SAMPLE_RATE fraction still goes to the LLM, to keep measuring misses
+#   force  -> everything goes to the LLM (triage only counts what it would have saved)
+#   off    -> triage disabled
+POLICIES = ("skip", "sample", "force", "off")
+
+_lock = threading.Lock()
+_stats = {"reviews": 0, "clean": 0, "skipped": 0, "sampled": 0, "forced": 0, "sampled_misses": 0}
+
+
+def triage(review: RawReview) -> Tuple[bool, str]:
+    # (clean, reason)
+    text = review.review
+    if review.rating < TRIAGE_MIN_RATING:
+        return False, "low rating"
+    if len(text) > TRIAGE_MAX_LENGTH:
+        return False, "long review"
+    if get_engine().scan(text):
+        return False, "keyword hit"
+    return True, "high rating, no keyword hits"
+
+
+def _sampled(review: RawReview, rate: float) -> bool:
+    # hash-based so the same review is sampled on every run
+    h = int(hashlib.sha256(review.review_id.encode("utf-8")).hexdigest()[:8], 16)
+    return h / 0xFFFFFFFF < rate
+
+
+def route(reviews: List[RawReview], policy: str = TRIAGE_POLICY,
+          sample_rate: float = TRIAGE_SAMPLE_RATE) -> Tuple[List[int], List[int], List[int]]:
+    # returns indices of (reviews for the LLM, skipped reviews, sampled clean reviews) in input order
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown TRIAGE_POLICY {policy!r}; expected one of {POLICIES}")
+    if policy == "off":
+        return list(range(len(reviews))), [], []
+
+    to_llm: List[int] = []
+    skipped: List[int] = []
+    sampled: List[int] = []
+    counts = {"reviews": len(reviews), "clean": 0, "skipped": 0, "sampled": 0, "forced": 0}
+    for i, r in enumerate(reviews):
+        clean, _ = triage(r)
+        if not clean:
+            to_llm.append(i)
+            continue
+        counts["clean"] += 1
+        if policy == "skip" or (policy == "sample" and not _sampled(r, sample_rate)):
+            skipped.append(i)
+            counts["skipped"] += 1
+        else:
+            to_llm.append(i)
+            if policy == "sample":
+                sampled.append(i)
+                counts["sampled"] += 1
+            else:
+                counts["forced"] += 1
+    with _lock:
+        for k, v in counts.items():
+            _stats[k] += v
+    return to_llm, skipped, sampled
+
+
+def record_sampled_miss(n: int = 1) -> None:
+    # a review triaged as clean, sampled into the LLM anyway, came back with issues
+    with _lock:
+        _stats["sampled_misses"] += n
+
+
+def triage_stats() -> Dict[str, float]:
+    with _lock:
+        out: Dict[str, float] = dict(_stats)
+    out["llm_calls_saved"] = out["skipped"]
+    out["sampled_miss_rate"] = round(out["sampled_misses"] / out["sampled"], 4) if out["sampled"] else 0.0
+    return out
@@ -0,0 +1,132 @@
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    # thread-safe token bucket: `rate` tokens/s refilled up to `capacity`; acquire() blocks until a token is free
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        # returns seconds spent waiting
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        # server told us to back off (e.g. Retry-After): hold every caller, not just the one that got the 429
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimit:
+    # AIMD cap on calls in flight: +1 after a window of calls whose p95 latency met the target while
+    # callers were queueing for a slot, x`decrease` after a window that missed it or saw an error.
+    # Extra concurrency past the server's parallel slots only adds queueing time on the server, which
+    # shows up as latency, so the limit settles near the point where throughput stops improving.
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 32, target_p95: float = 2.0,
+                 decrease: float = 0.9, min_window: int = 20, on_change: Optional[Callable[[int], None]] = None):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_p95 = target_p95
+        self.decrease = decrease
+        self.min_window = min_window
+        self.on_change = on_change
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._queued = False  # someone waited for a slot during this window
+        self._latencies: list = []
+        self._errors = 0
+        self.history: list = [(time.monotonic(), int(self._limit))]
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return self._waiting
+
+    def acquire(self) -> None:
+        with self._cond:
+            self._waiting += 1
+            while self._in_flight >= int(self._limit):
+                self._queued = True
+                self._cond.wait()
+            self._waiting -= 1
+            self._in_flight += 1
+
+    def release(self, latency: float, ok: bool = True) -> Optional[int]:
+        # returns the new limit when this call closed a window
+        with self._cond:
+            self._in_flight -= 1
+            self._latencies.append(latency)
+            self._errors += 0 if ok else 1
+            changed = None
+            if len(self._latencies) >= max(self.min_window, int(self._limit)):
+                changed = self._adjust()
+            self._cond.notify_all()
+        return changed
+
+    def _adjust(self) -> int:
+        lat = sorted(self._latencies)
+        p95 = lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+        if self._errors or p95 > self.target_p95:
+            self._limit = max(self.minimum, self._limit * self.decrease)
+        elif self._queued or self._waiting:
+            # only grow when the current limit is actually the bottleneck
+            self._limit = min(self.maximum, self._limit + 1)
+        self._latencies, self._errors, self._queued = [], 0, False
+        if int(self._limit) != self.history[-1][1]:
+            self.history.append((time.monotonic(), int(self._limit)))
+            if self.on_change:
+                self.on_change(int(self._limit))
+        return int(self._limit)
+
+    def call(self, fn):
+        # run fn() inside a slot, timing it; exceptions count as errors
+        self.acquire()
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            out = fn()
+            ok = True
+            return out
+        finally:
+            self.release(time.perf_counter() - t0, ok)
@@ -0,0 +1,223 @@
+import importlib.util
+from array import array
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Tuple, Union, overload
+
+from src.utils import Criticality, DetectedError, EnrichedError, RawReview
+
+# pandas / pyarrow load only for an export
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+# Compact, columnar home for enriched results. A list of EnrichedError holds one nested pydantic object per
+# error (plus its DetectedError, type list and freshly parsed strings); here each error is a handful of
+# integers: a row index into the reviews it came from, ids into interned summary / rationale / error-type
+# tables, a one-byte criticality code and the 8 raw bytes of its hash. EnrichedError objects are built on
+# access, so code that iterates or indexes results keeps working unchanged.
+
+CRITICALITY_LEVELS: Tuple[Criticality, ...] = ("Critical", "Major", "Minor", "Suggestion", "None")
+_CRIT_CODE = {c: i for i, c in enumerate(CRITICALITY_LEVELS)}
+
+REVIEW_COLS = list(RawReview.model_fields)
+COLUMNS = REVIEW_COLS + ["error_summary", "error_type", "rationale", "criticality", "error_hash"]
+
+
+class _Interned:
+    # value <-> small int
+    def __init__(self):
+        self.values: List[Any] = []
+        self._ids: Dict[Any, int] = {}
+
+    def id(self, v: Any) -> int:
+        i = self._ids.get(v)
+        if i is None:
+            i = self._ids[v] = len(self.values)
+            self.values.append(v)
+        return i
+
+
+class ResultStore(Sequence):
+    def __init__(self, items: Iterable[EnrichedError] = ()):
+        self.reviews: List[RawReview] = []
+        self._review_ids: Dict[str, int] = {}
+        self._summaries = _Interned()
+        self._rationales = _Interned()
+        self._type_sets = _Interned()  # tuples of labels, e.g. ("Mobile", "Crash")
+        self._review_idx = array("I")
+        self._summary = array("I")
+        self._rationale = array("I")
+        self._types = array("I")
+        self._crit = array("B")
+        self._hashes = bytearray()  # 8 bytes per row: hash_error() is 16 hex digits
+        self._odd_hashes: Dict[int, str] = {}  # anything else, verbatim, by row
+        self.extend(items)
+
+    def _review_row(self, review: RawReview) -> int:
+        # consecutive errors of one review share the row; ids seen again with other content get a new one
+        if self.reviews and self.reviews[-1] is review:
+            return len(self.reviews) - 1
+        i = self._review_ids.get(review.review_id)
+        if i is not None and (self.reviews[i] is review or self.reviews[i] == review):
+            return i
+        self._review_ids[review.review_id] = len(self.reviews)
+        self.reviews.append(review)
+        return len(self.reviews) - 1
+
+    def append(self, review: RawReview, error: DetectedError, criticality: Criticality, error_hash: str) -> None:
+        n = len(self._crit)
+        self._review_idx.append(self._review_row(review))
+        self._summary.append(self._summaries.id(error.error_summary))
+        self._rationale.append(self._rationales.id(error.rationale))
+        self._types.append(self._type_sets.id(tuple(error.error_type)))
+        self._crit.append(_CRIT_CODE[criticality])
+        try:
+            raw = bytes.fromhex(error_hash)
+        except ValueError:
+            raw = b""
+        if len(raw) != 8 or raw.hex() != error_hash:
+            # uppercase, whitespace or any other length would not come back the same from .hex()
+            self._odd_hashes[n] = error_hash
+            raw = bytes(8)
+        self._hashes += raw
+
+    def extend(self, items: Iterable[EnrichedError]) -> None:
+        for e in items:
+            self.append(e.review, e.error, e.criticality, e.error_hash)
+
+    def __len__(self) -> int:
+        return len(self._crit)
+
+    def _item(self, i: int) -> EnrichedError:
+        # model_construct: every field came from a validated model, no need to validate again
+        error = DetectedError.model_construct(
+            error_summary=self._summaries.values[self._summary[i]],
+            error_type=list(self._type_sets.values[self._types[i]]),
+            rationale=self._rationales.values[self._rationale[i]],
+        )
+        h = self._odd_hashes.get(i)
+        if h is None:
+            h = self._hashes[8 * i:8 * i + 8].hex()
+        return EnrichedError.model_construct(review=self.reviews[self._review_idx[i]], error=error,
+                                             criticality=CRITICALITY_LEVELS[self._crit[i]], error_hash=h)
+
+    @overload
+    def __getitem__(self, i: int) -> EnrichedError: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> List[EnrichedError]: ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[EnrichedError, List[EnrichedError]]:
+        if isinstance(i, slice):
+            return [self._item(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ResultStore index out of range")
+        return self._item(i)
+
+    def __iter__(self) -> Iterator[EnrichedError]:
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def __repr__(self) -> str:
+        return (f"ResultStore({len(self)} errors, {len(self.reviews)} reviews, "
+                f"{len(self._summaries.values)} distinct summaries)")
+
+    # bulk export
+
+    def _review_column(self, col: str) -> List[Any]:
+        return [getattr(r, col) for r in self.reviews]
+
+    def encoded(self) -> Dict[str, Tuple[array, List[Any]]]:
+        # dictionary-encoded view, name -> (codes per row, values): writers encode each distinct value once
+        return {
+            "review": (self._review_idx, self.reviews),
+            "error_summary": (self._summary, self._summaries.values),
+            "error_type": (self._types, self._type_sets.values),
+            "rationale": (self._rationale, self._rationales.values),
+            "criticality": (self._crit, list(CRITICALITY_LEVELS)),
+        }
+
+    def iter_rows(self) -> Iterator[Tuple[Any, ...]]:
+        # plain tuples in COLUMNS order (error_type as a tuple of labels), without building models
+        fields = [[getattr(r, c) for c in REVIEW_COLS] for r in self.reviews]
+        summaries, rationales = self._summaries.values, self._rationales.values
+        types = self._type_sets.values
+        for i, h in enumerate(self.error_hashes()):
+            yield (*fields[self._review_idx[i]], summaries[self._summary[i]], types[self._types[i]],
+                   rationales[self._rationale[i]], CRITICALITY_LEVELS[self._crit[i]], h)
+
+    def error_hashes(self) -> List[str]:
+        h, odd = self._hashes, self._odd_hashes
+        return [odd[i] if i in odd else h[8 * i:8 * i + 8].hex() for i in range(len(self))]
+
+    def to_frame(self) -> "pd.DataFrame":
+        # one row per error; repeated strings become pandas categoricals
+        import numpy as np
+        import pandas as pd
+
+        idx = np.asarray(self._review_idx, dtype=np.int64)
+        df = pd.DataFrame({c: self._review_column(c) for c in REVIEW_COLS}).iloc[idx].reset_index(drop=True)
+
+        def cat(codes: array, table: _Interned) -> pd.Categorical:
+            return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int64), categories=table.values)
+
+        df["error_summary"] = cat(self._summary, self._summaries)
+        types = ["; ".join(t) for t in self._type_sets.values]
+        if len(set(types)) == len(types):
+            df["error_type"] = pd.Categorical.from_codes(np.asarray(self._types, dtype=np.int64), categories=types)
+        else:  # a label containing "; " made two sets print the same
+            df["error_type"] = np.array(types, dtype=object)[np.asarray(self._types, dtype=np.int64)]
+        df["rationale"] = cat(self._rationale, self._rationales)
+        df["criticality"] = pd.Categorical.from_codes(np.asarray(self._crit, dtype=np.int64),
+                                                      categories=list(CRITICALITY_LEVELS), ordered=True)
+        df["error_hash"] = self.error_hashes()
+        return df
+
+    def to_arrow(self) -> "pa.Table":
+        # needs pyarrow; repeated strings become dictionary arrays, error_type a list<string> column
+        import numpy as np
+        import pyarrow as pa
+
+        def codes(a: array) -> pa.Array:
+            return pa.array(np.asarray(a, dtype=np.int32))
+
+        def dictionary(a: array, values: List[str]) -> pa.DictionaryArray:
+            return pa.DictionaryArray.from_arrays(codes(a), pa.array(values, type=pa.string()))
+
+        table = pa.table({c: self._review_column(c) for c in REVIEW_COLS}).take(codes(self._review_idx))
+        columns = {
+            "error_summary": dictionary(self._summary, self._summaries.values),
+            "error_type": pa.array([list(t) for t in self._type_sets.values],
+                                   type=pa.list_(pa.string())).take(codes(self._types)),
+            "rationale": dictionary(self._rationale, self._rationales.values),
+            "criticality": dictionary(self._crit, list(CRITICALITY_LEVELS)),
+            "error_hash": pa.array(self.error_hashes(), type=pa.string()),
+        }
+        for name, col in columns.items():
+            table = table.append_column(name, col)
+        return table
+
+    def to_parquet(self, path: str) -> None:
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path, compression="zstd")
+
+    def to_csv(self, path: str) -> None:
+        self.to_frame().to_csv(path, index=False)
+
+    def export(self, path: str) -> None:
+        # by extension: .parquet / .pq or .csv
+        if path.endswith((".parquet", ".pq")):
+            self.to_parquet(path)
+        elif path.endswith(".csv"):
+            self.to_csv(path)
+        else:
+            raise ValueError(f"unknown export format for {path!r} (use .parquet or .csv)")
+
+
+def as_store(items: Iterable[EnrichedError]) -> ResultStore:
+    return items if isinstance(items, ResultStore) else ResultStore(items)
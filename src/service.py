@@ -0,0 +1,418 @@
+import json
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from pydantic import TypeAdapter
+
+from src import metrics
+from src.config import (
+    SERVICE_BATCH_SIZE, SERVICE_BATCH_WAIT, SERVICE_QUEUE_SIZE, SERVICE_SPOOL_POLL,
+    DETECT_MODE, OLLAMA_MODEL, OLLAMA_SMALL_MODEL, ISSUE_INDEX_ENABLED, NOTION_MODE,
+)
+from src.results import ResultStore
+from src.utils import EnrichedError, RawReview
+
+# Service mode (python -m src serve): one resident process keeps the compiled batch graph, the LLM
+# clients (and the model loaded in Ollama), the sinks, the Notion index and the issue index warm.
+# Reviews come in through POST /reviews or files dropped into a spool directory, wait in a bounded
+# queue, and a single worker runs them through detect -> normalize -> tee in micro-batches of up to
+# SERVICE_BATCH_SIZE, started once full or SERVICE_BATCH_WAIT seconds after the first one arrived.
+# Backpressure: HTTP gets 429 + Retry-After when the queue has no room, the spool reader waits.
+# Reviews already logged with the same content are skipped (the incremental-run watermark), unless --full.
+
+_REVIEWS = TypeAdapter(List[RawReview])
+MAX_BODY = 16 * 2**20
+SPOOL_SUFFIXES = (".csv", ".jsonl", ".json")
+
+
+def _guarded(what: str, fn: Callable[[], Any]) -> None:
+    # callbacks run on the only worker thread: a failure is logged and counted, never raised
+    try:
+        fn()
+    except Exception as ex:
+        metrics.inc("service_callback_failures_total", callback=what)
+        print(f"[serve] {what} failed: {type(ex).__name__}: {ex}", file=sys.stderr)
+
+
+class Ticket:
+    # one submission (an HTTP request or a spool file); done once every review in it went through a batch
+    def __init__(self, n: int, on_done: Optional[Callable[["Ticket"], None]] = None):
+        self.remaining = n
+        self.failed = 0  # reviews whose batch raised
+        self.items: List[EnrichedError] = []
+        self.done = threading.Event()
+        self._on_done = on_done
+        self._lock = threading.Lock()
+        if n == 0:
+            self._finish()
+
+    def _settle(self, n: int, items: Sequence[EnrichedError], ok: bool) -> None:
+        with self._lock:
+            self.remaining -= n
+            self.items.extend(items)
+            if not ok:
+                self.failed += n
+            finished = self.remaining == 0
+        if finished:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self._on_done is not None:
+            _guarded("on_done", lambda: self._on_done(self))
+        self.done.set()
+
+
+class _Entry(NamedTuple):
+    review: RawReview
+    queued_at: float  # monotonic
+    ticket: Ticket
+
+
+def item_json(e: EnrichedError) -> Dict[str, Any]:
+    return {"review_id": e.review.review_id, "error_hash": e.error_hash, "criticality": e.criticality,
+            "error_summary": e.error.error_summary, "error_type": e.error.error_type,
+            "rationale": e.error.rationale}
+
+
+class ReviewService:
+    def __init__(self, batch_size: int = SERVICE_BATCH_SIZE, batch_wait: float = SERVICE_BATCH_WAIT,
+                 queue_size: int = SERVICE_QUEUE_SIZE, full: bool = False,
+                 on_items: Optional[Callable[[ResultStore], None]] = None):
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.queue_size = max(1, queue_size)
+        self.full = full
+        self.on_items = on_items
+        self._queue: "queue.Queue[_Entry]" = queue.Queue()
+        # room in the queue is counted here, so an HTTP request is accepted or refused as a whole
+        self._room = threading.Condition()
+        self._queued = 0
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._app: Any = None
+        self._stats = {"received": 0, "rejected": 0, "batches": 0, "failed_batches": 0, "items": 0}
+        self._stats_lock = threading.Lock()
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += n
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._stats, queued=self._queued, queue_size=self.queue_size)
+
+    def warm(self) -> None:
+        # everything a first batch would otherwise pay for, paid once at startup
+        from src.graph import _dry_run, _issue_index, build_batch_graph
+        from src.sinks import NotionSink, get_sinks
+
+        t0 = time.perf_counter()
+        self._app = build_batch_graph().compile()
+        sinks = get_sinks(_dry_run())
+        if any(isinstance(s, NotionSink) for s in sinks):
+            from src.nodes.notion_logger import get_logger
+
+            print(f"[serve] Notion index: {get_logger().load_index()} pages")
+        if ISSUE_INDEX_ENABLED or NOTION_MODE == "issue":
+            _issue_index()
+        if DETECT_MODE != "rules":
+            from src.llm_client import get_chat_model
+
+            # also makes Ollama load the model(s), which is most of a cold first request
+            for model in dict.fromkeys(m for m in (OLLAMA_MODEL, OLLAMA_SMALL_MODEL) if m):
+                try:
+                    get_chat_model(model).invoke('Reply with {}')
+                except Exception as ex:
+                    print(f"[serve] warm-up of {model} failed, continuing: {type(ex).__name__}: {ex}", file=sys.stderr)
+        print(f"[serve] warm in {time.perf_counter() - t0:.2f}s")
+
+    def start(self) -> None:
+        if self._app is None:
+            self.warm()
+        self._worker = threading.Thread(target=self._run, name="service-worker", daemon=True)
+        self._worker.start()
+
+    def close(self) -> None:
+        # finishes everything already queued, then stops the worker
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+
+    def submit(self, reviews: List[RawReview], block: bool = True, source: str = "http",
+               on_done: Optional[Callable[[Ticket], None]] = None) -> Ticket:
+        # block=False raises queue.Full unless all of them fit; block=True waits for room (backpressure)
+        if not block:
+            with self._room:
+                if self._queued + len(reviews) > self.queue_size:
+                    self._bump("rejected", len(reviews))
+                    metrics.inc("service_rejected_total", len(reviews), source=source)
+                    raise queue.Full
+                self._queued += len(reviews)
+        ticket = Ticket(len(reviews), on_done)
+        now = time.monotonic()
+        for r in reviews:
+            if block:
+                with self._room:
+                    while self._queued >= self.queue_size:
+                        self._room.wait()
+                    self._queued += 1
+            self._queue.put(_Entry(r, now, ticket))
+        self._bump("received", len(reviews))
+        metrics.inc("service_reviews_total", len(reviews), source=source)
+        metrics.gauge("service_queue_depth", self._queued)
+        return ticket
+
+    def _next_batch(self) -> Optional[List[_Entry]]:
+        # None once stopped and drained
+        while True:
+            try:
+                first = self._queue.get(timeout=0.2)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    return None
+        batch = [first]
+        # the wait counts from the first review's arrival, so a backlog is batched without waiting
+        deadline = first.queued_at + self.batch_wait
+        while len(batch) < self.batch_size:
+            left = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=left) if left > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._room:
+            self._queued -= len(batch)
+            self._room.notify_all()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._process(batch)
+            except Exception as ex:
+                # last resort, so the worker survives and nobody waits on a ticket forever
+                metrics.inc("service_batch_failures_total")
+                print(f"[serve] batch of {len(batch)} failed: {type(ex).__name__}: {ex}", file=sys.stderr)
+                for e in batch:
+                    if not e.ticket.done.is_set():
+                        e.ticket._settle(1, (), False)
+
+    def _process(self, batch: List[_Entry]) -> None:
+        from src.graph import _only_new
+
+        items: Sequence[EnrichedError] = ResultStore()
+        ok = True
+        try:
+            fresh = _only_new([e.review for e in batch], self.full)
+            if fresh:
+                items = self._app.invoke({"reviews": fresh})["items"]
+        except Exception as ex:
+            # the service outlives a failed batch (Ollama or Notion down); its reviews are not marked
+            # processed, so sending them again retries them
+            ok = False
+            self._bump("failed_batches")
+            metrics.inc("service_batch_failures_total")
+            print(f"[serve] batch of {len(batch)} failed: {type(ex).__name__}: {ex}", file=sys.stderr)
+        finished = time.monotonic()
+        self._bump("batches")
+        self._bump("items", len(items))
+        metrics.inc("service_batches_total")
+        metrics.gauge("service_queue_depth", self._queued)
+        for e in batch:
+            metrics.observe("service_latency_seconds", finished - e.queued_at)
+        if items and self.on_items is not None:
+            _guarded("on_items", lambda: self.on_items(items))
+
+        by_review: Dict[str, List[EnrichedError]] = {}
+        for e in items:
+            by_review.setdefault(e.review.review_id, []).append(e)
+        tickets: Dict[int, List[Any]] = {}
+        for e in batch:
+            tickets.setdefault(id(e.ticket), [e.ticket, []])[1].append(e.review.review_id)
+        for ticket, ids in tickets.values():
+            ticket._settle(len(ids), [x for rid in ids for x in by_review.pop(rid, ())], ok)
+
+
+def _handler(service: ReviewService) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "review-agent"
+
+        def log_message(self, fmt: str, *args: Any) -> None:
+            pass  # counted in the service_* metrics instead
+
+        def _send(self, code: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            if isinstance(body, str):
+                data, ctype = body.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                data, ctype = json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json"
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            path = urlsplit(self.path).path
+            if path == "/health":
+                self._send(200, dict(service.stats(), status="ok"))
+            elif path == "/metrics":
+                self._send(200, metrics.to_prometheus())
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            url = urlsplit(self.path)
+            if url.path != "/reviews":
+                self._send(404, {"error": "not found"})
+                return
+            n = int(self.headers.get("Content-Length") or 0)
+            if n > MAX_BODY:
+                self._send(413, {"error": f"body over {MAX_BODY} bytes"})
+                return
+            try:
+                data = json.loads(self.rfile.read(n) or b"null")
+                reviews = _REVIEWS.validate_python(data if isinstance(data, list) else [data])
+            except ValueError as ex:  # bad JSON, or a pydantic ValidationError
+                self._send(400, {"error": str(ex)})
+                return
+            if len(reviews) > service.queue_size:
+                self._send(413, {"error": f"{len(reviews)} reviews is more than the queue holds ({service.queue_size})"})
+                return
+            try:
+                ticket = service.submit(reviews, block=False, source="http")
+            except queue.Full:
+                self._send(429, {"error": "queue full", "queued": service.queued}, {"Retry-After": "1"})
+                return
+            # ?wait=1 answers once the reviews are logged, with what was found
+            if parse_qs(url.query).get("wait", ["0"])[0] not in ("1", "true"):
+                self._send(202, {"accepted": len(reviews), "queued": service.queued})
+                return
+            ticket.done.wait()
+            self._send(200, {"reviews": len(reviews), "failed": ticket.failed,
+                             "items": [item_json(e) for e in ticket.items]})
+
+    return Handler
+
+
+class SpoolWatcher:
+    # files dropped into `directory` (.csv like DATA_PATH, .jsonl or .json of reviews) are claimed into
+    # .work/, queued, and moved to done/ (or failed/) once every review in them went through a batch.
+    # Write them elsewhere and rename them in, or give them a leading "." until complete: dot-files
+    # are ignored. Files still in .work/ after a crash are queued again at startup.
+    def __init__(self, service: ReviewService, directory: str, poll: float = SERVICE_SPOOL_POLL):
+        self.service = service
+        self.directory = directory
+        self.poll = poll
+        self.work, self.done, self.failed = (os.path.join(directory, d) for d in (".work", "done", "failed"))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read(self, path: str) -> List[RawReview]:
+        if path.endswith(".csv"):
+            from src.nodes.load_reviews import load_reviews
+
+            return load_reviews(path)
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                data = [json.loads(line) for line in f if line.strip()]
+            else:
+                data = json.load(f)
+        return _REVIEWS.validate_python(data if isinstance(data, list) else [data])
+
+    def _claim(self) -> List[str]:
+        names = [n for n in os.listdir(self.directory)
+                 if not n.startswith(".") and n.endswith(SPOOL_SUFFIXES)
+                 and os.path.isfile(os.path.join(self.directory, n))]
+        names.sort(key=lambda n: os.path.getmtime(os.path.join(self.directory, n)))
+        claimed = []
+        for name in names:
+            # prefixed so a second file with the same name cannot overwrite one still in .work/
+            dst = os.path.join(self.work, f"{time.time_ns()}-{name}")
+            try:
+                os.replace(os.path.join(self.directory, name), dst)
+            except FileNotFoundError:
+                continue
+            claimed.append(dst)
+        return claimed
+
+    def _settle(self, path: str, ok: bool) -> None:
+        os.replace(path, os.path.join(self.done if ok else self.failed, os.path.basename(path)))
+
+    def _queue(self, path: str) -> None:
+        try:
+            reviews = self._read(path)
+        except Exception as ex:
+            print(f"[serve] cannot read {path}: {type(ex).__name__}: {ex}", file=sys.stderr)
+            metrics.inc("service_spool_files_total", result="unreadable")
+            self._settle(path, False)
+            return
+        metrics.inc("service_spool_files_total", result="queued")
+        self.service.submit(reviews, block=True, source="spool",
+                            on_done=lambda t: self._settle(path, not t.failed))
+
+    def _run(self) -> None:
+        for d in (self.work, self.done, self.failed):
+            os.makedirs(d, exist_ok=True)
+        for name in sorted(os.listdir(self.work)):
+            self._queue(os.path.join(self.work, name))
+        while not self._stop.is_set():
+            for path in self._claim():
+                self._queue(path)
+            self._stop.wait(self.poll)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="spool-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def serve(service: ReviewService, host: str, port: int, spool_dir: str = "",
+          poll: float = SERVICE_SPOOL_POLL) -> None:
+    # blocks until SIGINT / SIGTERM, then stops taking reviews and finishes the queued ones
+    if not port and not spool_dir:
+        raise ValueError("nothing to listen on: set a port or a spool directory")
+    service.start()
+    server = watcher = None
+    if port:
+        server = ThreadingHTTPServer((host, port), _handler(service))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="service-http", daemon=True).start()
+        print(f"[serve] POST http://{host}:{server.server_port}/reviews  (GET /health, /metrics)")
+    if spool_dir:
+        watcher = SpoolWatcher(service, spool_dir, poll)
+        watcher.start()
+        print(f"[serve] watching {spool_dir} every {poll:g}s")
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print(f"[serve] stopping, {service.queued} reviews still queued")
+    if server is not None:
+        server.shutdown()
+    if watcher is not None:
+        watcher.close()
+    service.close()
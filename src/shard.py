@@ -0,0 +1,236 @@
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from src.config import DATA_PATH, REVIEW_OFFSET, REVIEWS_TRUSTED, STATE_DIR, SHARD_CHUNK_SIZE, DETECT_MODE
+from src.nodes.load_reviews import _DTYPES, _to_reviews
+from src.nodes.normalize import normalize
+from src.results import ResultStore
+from src.state_store import content_hash, get_state_store
+from src.utils import EnrichedError
+
+# Sharded runs: the parent reads the csv once and splits its rows by a stable hash of review_id, each
+# shard runs load -> detect -> normalize over its own rows in its own process (or on another host with
+# --only), and a checkpoint per shard records the results plus how many of its parts are done. The
+# parent merges the shards in csv order and runs tee once.
+
+
+def shard_of(review_id: str, shards: int) -> int:
+    # crc32, not hash(): must agree across processes and hosts
+    return zlib.crc32(review_id.encode("utf-8")) % shards
+
+
+def default_run_id(path: str, shards: int, offset: int, full: bool) -> str:
+    # same file + settings = same run, so re-running after a crash picks up the checkpoints
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{shards}|{offset}|{full}|{DETECT_MODE}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+class ShardCheckpoint:
+    # one sqlite file per shard: csv cursor, enriched items and the reviews they came from.
+    # A chunk's rows and the new cursor are committed together, so a killed worker redoes at most one chunk.
+
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # row = position in the csv, seq = order within that review's items
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS items (
+                row INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (row, seq)
+            )"""
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reviews (review_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def _get(self, key: str, default: str) -> str:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def cursor(self) -> int:
+        return int(self._get("cursor", "0"))
+
+    def done(self) -> bool:
+        return self._get("done", "0") == "1"
+
+    def stats(self) -> Dict[str, Any]:
+        return json.loads(self._get("stats", "{}"))
+
+    def commit_chunk(self, cursor: int, items: List[Tuple[int, int, str]], reviews: List[Tuple[str, str]]) -> None:
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?)", items)
+            self._db.executemany("INSERT OR REPLACE INTO reviews VALUES (?, ?)", reviews)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('cursor', ?)", (str(cursor),))
+
+    def finish(self, stats: Dict[str, Any]) -> None:
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('stats', ?)", (json.dumps(stats),))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('done', '1')")
+
+    def counts(self) -> Dict[str, int]:
+        (items,) = self._db.execute("SELECT COUNT(*) FROM items").fetchone()
+        (reviews,) = self._db.execute("SELECT COUNT(*) FROM reviews").fetchone()
+        return {"items": items, "reviews": reviews}
+
+    def iter_items(self) -> Iterator[Tuple[int, int, str]]:
+        # in csv order, for the k-way merge
+        yield from self._db.execute("SELECT row, seq, payload FROM items ORDER BY row, seq")
+
+    def iter_reviews(self) -> Iterator[Tuple[str, str]]:
+        yield from self._db.execute("SELECT review_id, content_hash FROM reviews")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def checkpoint_dir(run_id: str, base: Optional[str] = None) -> str:
+    return os.path.join(base or os.path.join(STATE_DIR, "shards"), run_id)
+
+
+def _checkpoint_path(ckpt_dir: str, shard: int, shards: int) -> str:
+    return os.path.join(ckpt_dir, f"shard-{shard:03d}-of-{shards:03d}.sqlite")
+
+
+def _split_dir(ckpt_dir: str, shards: int) -> str:
+    return os.path.join(ckpt_dir, f"split-of-{shards:03d}")
+
+
+def _split_parts(ckpt_dir: str, shard: int, shards: int) -> List[str]:
+    d = os.path.join(_split_dir(ckpt_dir, shards), f"{shard:03d}")
+    return [os.path.join(d, n) for n in sorted(os.listdir(d))] if os.path.isdir(d) else []
+
+
+def split_csv(shards: int, ckpt_dir: str, path: str = DATA_PATH, chunk_size: int = SHARD_CHUNK_SIZE,
+              offset: int = REVIEW_OFFSET) -> int:
+    # one pass over the csv, in the parent: each chunk's rows are hashed once and written as one pickled
+    # part per shard (with their csv position), so a worker reads only its own rows and total parsing
+    # stays O(rows) however many shards there are. Returns the rows split; a finished split is reused.
+    # Parts are written under a temporary name and renamed, so hosts sharing ckpt_dir can split at once.
+    d = _split_dir(ckpt_dir, shards)
+    marker = os.path.join(d, "done.json")
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            return json.load(f)["rows"]
+    for k in range(shards):
+        os.makedirs(os.path.join(d, f"{k:03d}"), exist_ok=True)
+    rows = 0
+    reader = pd.read_csv(path, dtype=_DTYPES, chunksize=chunk_size,
+                         skiprows=range(1, offset + 1) if offset else None)
+    for i, df in enumerate(reader):
+        df.insert(0, "_row", range(rows, rows + len(df)))
+        rows += len(df)
+        keys = [shard_of(rid, shards) for rid in df["review_id"].astype(str)]
+        for k, part in df.groupby(keys, sort=False):
+            dst = os.path.join(d, f"{k:03d}", f"{i:06d}.pkl")
+            part.to_pickle(f"{dst}.{os.getpid()}.tmp")
+            os.replace(f"{dst}.{os.getpid()}.tmp", dst)
+    with open(f"{marker}.{os.getpid()}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"rows": rows}, f)
+    os.replace(f"{marker}.{os.getpid()}.tmp", marker)
+    return rows
+
+
+def run_shard(shard: int, shards: int, ckpt_dir: str, full: bool = False) -> Dict[str, Any]:
+    # process one shard of a finished split to completion, resuming from its checkpoint;
+    # safe to call in a fresh process
+    from src.graph import _detect, _only_new
+
+    ckpt = ShardCheckpoint(_checkpoint_path(ckpt_dir, shard, shards))
+    try:
+        if ckpt.done():
+            return dict(ckpt.stats(), shard=shard, resumed=True)
+        # cursor = split parts of this shard already committed
+        start = ckpt.cursor()
+        t0, c0 = time.perf_counter(), time.process_time()
+        parts = _split_parts(ckpt_dir, shard, shards)
+        rows = 0
+        for cursor, part in enumerate(parts, 1):
+            df = pd.read_pickle(part)
+            rows += len(df)
+            if cursor <= start:
+                continue
+            reviews = _to_reviews(df, validate=not REVIEWS_TRUSTED)
+            # csv position per review (by identity: ids can repeat), so the merge restores the unsharded order
+            pos = {id(r): int(row) for r, row in zip(reviews, df["_row"])}
+            fresh = _only_new(reviews, full)
+            items: List[Tuple[int, int, str]] = []
+            for r, errs in _detect(fresh):
+                for seq, e in enumerate(normalize(r, errs)):
+                    items.append((pos[id(r)], seq, e.model_dump_json()))
+            ckpt.commit_chunk(cursor, items, [(r.review_id, content_hash(r)) for r in fresh])
+        # cpu_seconds: this shard's own work, the critical path once every shard has a core
+        stats = dict(ckpt.counts(), rows=rows, seconds=round(time.perf_counter() - t0, 3),
+                     cpu_seconds=round(time.process_time() - c0, 3))
+        ckpt.finish(stats)
+        return dict(stats, shard=shard, resumed=start > 0)
+    finally:
+        ckpt.close()
+
+
+def run_shards(shards: int, workers: int, ckpt_dir: str, only: Optional[List[int]] = None,
+               **kwargs: Any) -> List[Dict[str, Any]]:
+    # shards of a finished split_csv as separate processes; each inherits the environment, so settings
+    # match the parent
+    todo = sorted(only if only is not None else range(shards))
+    if workers <= 1 or len(todo) <= 1:
+        return [run_shard(k, shards, ckpt_dir, **kwargs) for k in todo]
+    with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+        futures = [pool.submit(run_shard, k, shards, ckpt_dir, **kwargs) for k in todo]
+        return sorted((f.result() for f in as_completed(futures)), key=lambda s: s["shard"])
+
+
+def merge(shards: int, ckpt_dir: str) -> Tuple[ResultStore, List[Tuple[str, str]]]:
+    # k-way merge of the shard checkpoints in csv order; an error_hash seen in two places
+    # (duplicate rows, a shard re-run) is kept once, so the result does not depend on the shard count
+    ckpts = [ShardCheckpoint(_checkpoint_path(ckpt_dir, k, shards)) for k in range(shards)]
+    try:
+        missing = [k for k, c in enumerate(ckpts) if not c.done()]
+        if missing:
+            raise RuntimeError(f"shards not finished: {missing} (run them first, or re-run to resume)")
+        # decoded items share one review row per review in the columnar store
+        items = ResultStore()
+        seen: Set[str] = set()
+        for _, _, payload in heapq.merge(*(c.iter_items() for c in ckpts)):
+            e = EnrichedError.model_validate_json(payload)
+            if e.error_hash not in seen:
+                seen.add(e.error_hash)
+                items.append(e.review, e.error, e.criticality, e.error_hash)
+        reviews = [pair for c in ckpts for pair in c.iter_reviews()]
+        return items, reviews
+    finally:
+        for c in ckpts:
+            c.close()
+
+
+def log_merged(items: ResultStore, reviews: List[Tuple[str, str]]) -> ResultStore:
+    # tee + watermark once, in the parent, exactly like the unsharded pipeline
+    from src.graph import _dry_run, _tee
+
+    out, failed = _tee(items)
+    if not _dry_run():
+        get_state_store().mark_processed_hashes((rid, h) for rid, h in reviews if rid not in failed)
+    return out
+
+
+def cleanup(ckpt_dir: str) -> None:
+    shutil.rmtree(ckpt_dir, ignore_errors=True)
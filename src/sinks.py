@@ -0,0 +1,277 @@
+import atexit
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Sequence, Set
+
+from src import metrics
+from src.config import (
+    NOTION_MODE, SINKS, SINK_SQLITE_PATH, SINK_JSONL_PATH, SINK_PARQUET_DIR,
+)
+from src.issue_index import get_issue_index, issue_as_enriched
+from src.results import COLUMNS, REVIEW_COLS, as_store
+from src.utils import EnrichedError
+
+try:
+    import orjson
+except ImportError:  # optional; encodes jsonl records ~2x faster than json
+    orjson = None
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# Where tee sends each batch. Every sink gets the whole batch and returns the review_ids it could not
+# write, which stay unmarked so the next run retries them. Sinks run side by side on threads: Notion
+# waits on HTTP, the local sinks on disk.
+
+
+class Sink:
+    name = "sink"
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        # issue_keys: the issue-index key of each item (empty when the index is off)
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class NotionSink(Sink):
+    name = "notion"
+
+    def __init__(self, mode: str = NOTION_MODE):
+        self.mode = mode
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        from src.nodes.notion_logger import upsert_enriched_errors
+
+        if self.mode == "issue":
+            # one row per touched issue carrying its running count, instead of one write per mention
+            issues = [issue_as_enriched(it) for it in get_issue_index().issues(sorted(set(issue_keys)))]
+            page_ids = upsert_enriched_errors(issues)
+            failed = {it.error_hash for it, pid in zip(issues, page_ids) if pid is None}
+            return {e.review.review_id for e, k in zip(items, issue_keys) if k in failed}
+        # one concurrent bulk write per batch, against the local Hash -> page index
+        page_ids = upsert_enriched_errors(items)
+        return {e.review.review_id for e, pid in zip(items, page_ids) if pid is None}
+
+
+class DryRunSink(Sink):
+    # what the Notion sink would do, printed
+    name = "notion"
+
+    def __init__(self, mode: str = NOTION_MODE):
+        self.mode = mode
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        if self.mode == "issue":
+            index = get_issue_index(":memory:")
+            for it in (issue_as_enriched(it) for it in index.issues(sorted(set(issue_keys)))):
+                print(f"[dry-run] Would upsert issue {it.error_hash} | {it.error.error_summary} | {it.review.reviewer_name}")
+            return set()
+        for i, e in enumerate(items, 1):
+            print(f"[dry-run] Would upsert {e.review.review_id} | {e.error.error_summary} | {e.error_hash}")
+            if i % 20 == 0:
+                print(f"… processed {i} rows")
+        return set()
+
+
+class SQLiteSink(Sink):
+    # one row per error, upserted on error_hash with one executemany per batch
+    name = "sqlite"
+
+    def __init__(self, path: str = SINK_SQLITE_PATH):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                error_hash TEXT PRIMARY KEY,
+                review_id TEXT NOT NULL,
+                review TEXT NOT NULL,
+                username TEXT NOT NULL,
+                email TEXT NOT NULL,
+                date TEXT NOT NULL,
+                reviewer_name TEXT NOT NULL,
+                rating INTEGER NOT NULL,
+                error_summary TEXT NOT NULL,
+                error_type TEXT NOT NULL,
+                rationale TEXT NOT NULL,
+                criticality TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_criticality ON results(criticality)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_date ON results(date)")
+        self._db.commit()
+        cols = COLUMNS[:-1] + ["updated_at"]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols)
+        self._sql = (f"INSERT INTO results (error_hash, {', '.join(cols)}) VALUES ({', '.join('?' * (len(cols) + 1))}) "
+                     f"ON CONFLICT(error_hash) DO UPDATE SET {updates}")
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        now = time.time()
+        store = as_store(items)
+        cols = store.encoded()
+        ri, reviews = cols["review"]
+        reviews = [tuple(getattr(r, c) for c in REVIEW_COLS) for r in reviews]
+        si, summaries = cols["error_summary"]
+        ti, types = cols["error_type"]
+        types = [json.dumps(list(t)) for t in types]
+        ai, rationales = cols["rationale"]
+        ci, levels = cols["criticality"]
+        rows = [(h, *reviews[ri[i]], summaries[si[i]], types[ti[i]], rationales[ai[i]], levels[ci[i]], now)
+                for i, h in enumerate(store.error_hashes())]
+        with self._lock:
+            with self._db:
+                self._db.executemany(self._sql, rows)
+        return set()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JSONLSink(Sink):
+    # append-only, one JSON object per error
+    name = "jsonl"
+
+    def __init__(self, path: str = SINK_JSONL_PATH):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        # plain row tuples, so no models are built; one dumps per record
+        rows = (dict(zip(COLUMNS, row)) for row in as_store(items).iter_rows())
+        if orjson:
+            text = b"".join(orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE) for r in rows).decode("utf-8")
+        else:
+            text = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+        with self._lock:
+            self._f.write(text)
+            self._f.flush()
+        return set()
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+class ParquetSink(Sink):
+    # one part file per run, one row group per batch; readable as a dataset, e.g. pd.read_parquet(dir)
+    name = "parquet"
+
+    def __init__(self, directory: str = SINK_PARQUET_DIR):
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("the parquet sink needs pyarrow: pip install pyarrow")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.parquet")
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def write(self, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+        import pyarrow.parquet as pq
+
+        if not items:
+            return set()
+        # plain strings: dictionary arrays differ batch to batch, and the writer needs one schema
+        table = as_store(items).to_arrow()
+        table = table.cast(_plain_schema(table.schema))
+        with self._lock:
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema, compression="zstd")
+            self._writer.write_table(table)
+        return set()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+def _plain_schema(schema: "pa.Schema") -> "pa.Schema":
+    import pyarrow as pa
+
+    return pa.schema([pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in schema])
+
+
+_LOCAL = {"sqlite": SQLiteSink, "jsonl": JSONLSink, "parquet": ParquetSink}
+
+
+def make_sinks(names: str = SINKS, dry_run: bool = False) -> List[Sink]:
+    out: List[Sink] = []
+    for name in (n.strip() for n in names.split(",") if n.strip()):
+        if name == "notion":
+            out.append(DryRunSink() if dry_run else NotionSink())
+        elif name in _LOCAL:
+            out.append(_LOCAL[name]())
+        else:
+            raise ValueError(f"unknown sink {name!r} (choose from notion, {', '.join(_LOCAL)})")
+    return out
+
+
+# one set per dry_run value, so a dry run never gets the real sinks or the other way round
+_sinks: Dict[bool, List[Sink]] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sinks(dry_run: bool = False) -> List[Sink]:
+    sinks = _sinks.get(dry_run)
+    if sinks is None:
+        with _sinks_lock:
+            sinks = _sinks.get(dry_run)
+            if sinks is None:
+                if not _sinks:
+                    # flushes the parquet footer even if the caller never closes
+                    atexit.register(close_sinks)
+                sinks = _sinks[dry_run] = make_sinks(SINKS, dry_run)
+    return sinks
+
+
+def close_sinks() -> None:
+    with _sinks_lock:
+        for sinks in _sinks.values():
+            for s in sinks:
+                s.close()
+        _sinks.clear()
+
+
+def _timed_write(sink: Sink, items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+    t0 = time.perf_counter()
+    try:
+        failed = sink.write(items, issue_keys)
+    except Exception as ex:
+        # a broken sink must not lose the batch for the others; its reviews are retried next run
+        print(f"[sink] {sink.name} failed on {len(items)} items ({type(ex).__name__}: {ex})")
+        metrics.inc("sink_errors_total", sink=sink.name)
+        return {e.review.review_id for e in items}
+    metrics.observe("sink_seconds", time.perf_counter() - t0, sink=sink.name)
+    metrics.inc("sink_rows_total", len(items), sink=sink.name)
+    return failed
+
+
+def write_all(sinks: List[Sink], items: Sequence[EnrichedError], issue_keys: List[str]) -> Set[str]:
+    # every sink in parallel; returns the union of review_ids some sink could not write
+    if not items or not sinks:
+        return set()
+    items = as_store(items)
+    if len(sinks) == 1:
+        return _timed_write(sinks[0], items, issue_keys)
+    with ThreadPoolExecutor(max_workers=len(sinks), thread_name_prefix="sink") as pool:
+        results = list(pool.map(lambda s: _timed_write(s, items, issue_keys), sinks))
+    return set().union(*results)
+
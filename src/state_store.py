@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import DETECT_MODE, OLLAMA_MODEL, OLLAMA_SMALL_MODEL, STATE_DB_PATH
+from src.utils import RawReview
+
+# sqlite caps bound parameters per statement
+_IN_CHUNK = 500
+
+
+@lru_cache(maxsize=1)
+def detector_fingerprint() -> str:
+    # how reviews are detected, like the LLM cache key: mode, models and prompt. A review processed by
+    # one detector (say a rules-only run) is still new to another
+    if DETECT_MODE == "rules":
+        return "rules"
+    from src.llm_cache import fingerprint
+    from src.nodes.detect_errors import PROMPT_FINGERPRINT
+
+    return fingerprint(DETECT_MODE, OLLAMA_MODEL, OLLAMA_SMALL_MODEL, PROMPT_FINGERPRINT)
+
+
+def content_hash(r: RawReview) -> str:
+    # every field that ends up in Notion, so an edited review is picked up again, plus the detector
+    key = "\x1f".join([r.review, r.username, r.email, r.date, r.reviewer_name, str(r.rating),
+                        detector_fingerprint()])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+class StateStore:
+    # watermark of reviews that made it all the way through detect + log
+
+    def __init__(self, path: str):
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS processed (
+                review_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )"""
+        )
+        # fingerprint of the properties last written to each Notion page, to skip no-op updates
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS notion_pages (
+                hash TEXT PRIMARY KEY,
+                page_id TEXT NOT NULL,
+                fingerprint TEXT NOT NULL
+            )"""
+        )
+        self._db.commit()
+
+    def filter_new(self, reviews: List[RawReview]) -> List[RawReview]:
+        # keep reviews never seen before or whose content changed since they were processed
+        seen = {}
+        ids = [r.review_id for r in reviews]
+        with self._lock:
+            for i in range(0, len(ids), _IN_CHUNK):
+                part = ids[i:i + _IN_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT review_id, content_hash FROM processed WHERE review_id IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                seen.update(rows)
+        return [r for r in reviews if seen.get(r.review_id) != content_hash(r)]
+
+    def mark_processed(self, reviews: Iterable[RawReview]) -> None:
+        self.mark_processed_hashes((r.review_id, content_hash(r)) for r in reviews)
+
+    def mark_processed_hashes(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        # (review_id, content_hash) pairs, e.g. collected by shard workers
+        now = time.time()
+        rows = [(rid, h, now) for rid, h in pairs]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO processed VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def load_page_fingerprints(self) -> Dict[str, Tuple[str, str]]:
+        # hash -> (page_id, fingerprint)
+        with self._lock:
+            rows = self._db.execute("SELECT hash, page_id, fingerprint FROM notion_pages").fetchall()
+        return {h: (pid, fp) for h, pid, fp in rows}
+
+    def save_page_fingerprint(self, hash_value: str, page_id: str, fingerprint: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO notion_pages VALUES (?, ?, ?)", (hash_value, page_id, fingerprint))
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            (n,) = self._db.execute("SELECT COUNT(*) FROM processed").fetchone()
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def get_state_store() -> StateStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = StateStore(STATE_DB_PATH)
+    return _store
@@ -0,0 +1,63 @@
+# tests/bench_adaptive.py
+# fixed concurrency levels vs the adaptive limit (DETECT_TARGET_P95) against the fake Ollama with a few
+# parallel slots, so extra requests queue on the server; then the same reviews with small/large model routing
+#   python -m tests.bench_adaptive --n 400 --parallel 4 --latency 0.2 --target-p95 0.35
+import argparse
+import os
+import time
+
+from tests.fake_ollama import start
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=300, help="reviews per run")
+    ap.add_argument("--parallel", type=int, default=4, help="fake server slots (OLLAMA_NUM_PARALLEL)")
+    ap.add_argument("--latency", type=float, default=0.2, help="large model seconds per request")
+    ap.add_argument("--jitter", type=float, default=0.05)
+    ap.add_argument("--small-latency", type=float, default=0.05, help="small model seconds per request")
+    ap.add_argument("--small-malformed", type=float, default=0.1, help="small model malformed reply rate")
+    ap.add_argument("--fixed", default="1,2,4,8,16", help="fixed concurrency levels to compare")
+    ap.add_argument("--target-p95", type=float, default=0.35)
+    args = ap.parse_args()
+
+    server, fake, url = start(latency=args.latency, jitter=args.jitter, parallel=args.parallel, seed=7,
+                              model_latency={"small": args.small_latency},
+                              model_malformed={"small": args.small_malformed})
+    # before any src import: config is read once
+    os.environ.update(OLLAMA_BASE_URL=url, LLM_CACHE_PATH="", OLLAMA_MODEL="large", DETECT_CONCURRENCY="4",
+                      DETECT_MAX_CONCURRENCY="32")
+
+    from src import metrics
+    from src.config import DATA_PATH
+    from src.nodes import detect_errors as d
+    from src.nodes.load_reviews import load_reviews
+
+    base = load_reviews(DATA_PATH)
+    reviews = [base[i % len(base)].model_copy(update={"review_id": f"B-{i}"}) for i in range(args.n)]
+
+    def run(label: str, workers: int, target: float = 0.0, small: str = "") -> None:
+        d.DETECT_TARGET_P95, d.OLLAMA_SMALL_MODEL, d._limit = target, small, None
+        metrics.reset()
+        before = dict(fake.by_model)
+        t0 = time.perf_counter()
+        found = sum(len(errs) for errs in d.detect_errors_many(reviews, "large", max_workers=workers))
+        wall = time.perf_counter() - t0
+        rep = metrics.report()
+        llm = rep["llm"]["latency_ms"]
+        calls = {m: n - before.get(m, 0) for m, n in fake.by_model.items() if n - before.get(m, 0)}
+        limit = d._limit.history[-1][1] if d._limit else workers
+        print(f"{label:<18} {len(reviews) / wall:>9.1f} {llm['p50']:>8.0f} {llm['p95']:>8.0f} "
+              f"{rep['detect']['latency_ms']['p95']:>10.0f} {limit:>6} {found:>7}  "
+              f"{' '.join(f'{m}={n}' for m, n in sorted(calls.items()))}"
+              f"{'  esc ' + str(rep['llm']['escalations']) if rep['llm']['escalations'] else ''}")
+
+    print(f"{args.n} reviews, fake server: {args.parallel} slots, large {args.latency}s, small {args.small_latency}s")
+    print(f"{'':<18} {'reviews/s':>9} {'llm p50':>8} {'llm p95':>8} {'review p95':>10} {'limit':>6} {'issues':>7}  calls")
+    for w in (int(x) for x in args.fixed.split(",")):
+        run(f"fixed {w}", w)
+    run(f"adaptive p95<{args.target_p95}", 4, args.target_p95)
+    run("routed, fixed 4", 4, small="small")
+    run("routed, adaptive", 4, args.target_p95, small="small")
+    history = d._limit.history
+    print("limit over time (last run): " + " ".join(f"{t - history[0][0]:.1f}s:{n}" for t, n in history))
+    server.shutdown()
@@ -0,0 +1,40 @@
+# tests/bench_batching.py
+# compare per-review prompts against batched prompts on the same reviews (needs a running Ollama)
+#   python -m tests.bench_batching --n 60 --batch-sizes 1,5,10
+import argparse
+import os
+import time
+
+os.environ["LLM_CACHE_PATH"] = ""  # always hit the model, never the cache
+
+from src.config import DATA_PATH, OLLAMA_MODEL, DETECT_CONCURRENCY
+from src.nodes.load_reviews import load_reviews
+from src.nodes.detect_errors import detect_errors_many
+from src.llm_client import usage_stats
+
+
+def _delta(before: dict, after: dict) -> dict:
+    return {k: after[k] - before[k] for k in after}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=60)
+    ap.add_argument("--batch-sizes", default="1,5,10")
+    ap.add_argument("--workers", type=int, default=DETECT_CONCURRENCY)
+    ap.add_argument("--model", default=OLLAMA_MODEL)
+    args = ap.parse_args()
+
+    reviews = load_reviews(DATA_PATH)[: args.n]
+    print(f"{len(reviews)} reviews, model={args.model}, workers={args.workers}\n")
+    print(f"{'batch':>5} {'wall s':>8} {'calls':>6} {'prompt tok':>11} {'compl tok':>10} {'tok/s':>8} {'reviews/s':>10} {'issues':>7}")
+
+    for bs in [int(x) for x in args.batch_sizes.split(",")]:
+        before = usage_stats()
+        t0 = time.perf_counter()
+        found = sum(len(errs) for errs in detect_errors_many(reviews, args.model, args.workers, batch_size=bs))
+        wall = time.perf_counter() - t0
+        u = _delta(before, usage_stats())
+        tokens = u["prompt_tokens"] + u["completion_tokens"]
+        print(f"{bs:>5} {wall:>8.2f} {u['calls']:>6} {u['prompt_tokens']:>11} {u['completion_tokens']:>10} "
+              f"{tokens / wall:>8.1f} {len(reviews) / wall:>10.2f} {found:>7}")
@@ -0,0 +1,134 @@
+# tests/bench_decode.py
+# decode speed of LLM replies over a corpus of recorded Ollama outputs: the old json.loads + pydantic path
+# vs src/llm_decode.py on the stdlib json and orjson backends, plus how many replies each could use
+# record a corpus from a real model (or pass none to record one from the fake Ollama, with sloppy variants):
+#   LLM_RECORD_PATH=replies.jsonl python -m src run --full
+#   python -m tests.bench_decode --corpus replies.jsonl --repeat 20
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from typing import List, Optional
+
+from tests.fake_ollama import start
+
+
+def _legacy(raw: str) -> Optional[list]:
+    # the decoder this replaced: None where it silently produced {"errors": []} from unusable JSON
+    from src.llm_decode import TYPES
+    from src.utils import DetectedError
+
+    s = (raw or "").strip()
+    if not s:
+        return []
+    try:
+        data = json.loads(s)
+    except Exception:
+        a, b = s.find("{"), s.rfind("}")
+        try:
+            data = json.loads(s[a:b + 1]) if a != -1 and b > a else None
+        except Exception:
+            data = None
+    if not isinstance(data, dict):
+        return None
+    out = []
+    items = data.get("errors", [])
+    for e in items if isinstance(items, list) else []:
+        if not isinstance(e, dict):
+            continue
+        summary = (e.get("error_summary") or "").strip()[:140]
+        types = e.get("error_type") or []
+        if isinstance(types, str):
+            types = [types]
+        types = [t for t in types if isinstance(t, str) and t in TYPES] or ["Other"]
+        if summary:
+            out.append(DetectedError(error_summary=summary, error_type=types,
+                                     rationale=(e.get("rationale") or "").strip()))
+    return out
+
+
+def _sloppy(content: str, rng: random.Random) -> str:
+    # shapes small local models produce instead of the bare object
+    errors = json.loads(content)["errors"]
+    return rng.choice([
+        lambda: f"Here is the JSON you asked for:\n```json\n{content}\n```",
+        lambda: json.dumps({"errors": errors}, indent=2),
+        lambda: json.dumps(errors),
+        lambda: json.dumps(errors[0]) if errors else content,
+        lambda: json.dumps({"errors": [dict(e, error_type=e["error_type"] + ["Usability"]) for e in errors]}),
+        lambda: "",
+    ])()
+
+
+def _record(n: int, path: str, malformed: float, sloppy: float) -> List[dict]:
+    server, fake, url = start(malformed_rate=malformed, seed=3)
+    os.environ.update(OLLAMA_BASE_URL=url, LLM_CACHE_PATH="", LLM_RECORD_PATH=path)
+    from src.config import DATA_PATH
+    from src.nodes.detect_errors import detect_errors_many
+    from src.nodes.load_reviews import load_reviews
+
+    base = load_reviews(DATA_PATH)
+    reviews = [base[i % len(base)].model_copy(update={"review_id": f"D-{i}"}) for i in range(n)]
+    list(detect_errors_many(reviews, "fake", max_workers=8))
+    server.shutdown()
+    rng = random.Random(5)
+    corpus = [json.loads(line) for line in open(path, encoding="utf-8")]
+    for rec in corpus:
+        if rng.random() < sloppy and rec["content"].endswith("}") and _legacy(rec["content"]) is not None:
+            rec["content"] = _sloppy(rec["content"], rng)
+    return corpus
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=None, help="JSONL written with LLM_RECORD_PATH")
+    ap.add_argument("--record", type=int, default=2000, help="replies to record from the fake Ollama")
+    ap.add_argument("--malformed", type=float, default=0.03, help="fake server truncated-JSON rate")
+    ap.add_argument("--sloppy", type=float, default=0.1, help="fraction turned into prose/fenced/bare replies")
+    ap.add_argument("--repeat", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.corpus:
+        corpus = [json.loads(line) for line in open(args.corpus, encoding="utf-8")]
+    else:
+        tmp = tempfile.mkdtemp()
+        corpus = _record(args.record, os.path.join(tmp, "replies.jsonl"), args.malformed, args.sloppy)
+    replies = [r["content"] for r in corpus if r.get("kind", "single") == "single"]
+
+    from src import llm_decode
+    from src.llm_decode import decode_errors
+
+    def bench(fn) -> float:
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            for raw in replies:
+                fn(raw)
+        return len(replies) * args.repeat / (time.perf_counter() - t0)
+
+    n_errors = sum(len(_legacy(r) or []) for r in replies)
+    print(f"{len(replies):,} single-review replies, {n_errors:,} errors, x{args.repeat}")
+    print(f"{'':<24} {'replies/s':>10} {'us/reply':>9}")
+    rates = {"legacy (json+pydantic)": bench(_legacy)}
+    loads = llm_decode._loads
+    llm_decode._loads = json.loads
+    rates["decoder, json"] = bench(decode_errors)
+    llm_decode._loads = loads
+    if llm_decode.orjson is not None:
+        rates["decoder, orjson"] = bench(decode_errors)
+    for name, rate in rates.items():
+        print(f"{name:<24} {rate:>10,.0f} {1e6 / rate:>9.1f}")
+
+    decoded = [decode_errors(r) for r in replies]
+    print("\nstatus: " + ", ".join(f"{k}={v}" for k, v in Counter(d.status for d in decoded).most_common()))
+    legacy_lost = sum(1 for r in replies if _legacy(r) is None)
+    print(f"legacy silently turned {legacy_lost} unusable replies into no errors")
+    rescued_found = sum(len(d.errors) for d, r in zip(decoded, replies) if d.status == "rescued" and not _legacy(r))
+    print(f"decoder recovered {rescued_found} errors the legacy path lost")
+    same = sum(1 for d, r in zip(decoded, replies) if d.status == "ok" and
+               [e.model_dump() for e in d.errors] == [e.model_dump() for e in _legacy(r) or []])
+    print(f"identical to legacy on {same} of {sum(d.status == 'ok' for d in decoded)} ok replies")
+    for problem, n in Counter(d.problem.split(":")[0] for d in decoded if d.problem).most_common(6):
+        print(f"  {n:>5}  {problem}")
@@ -0,0 +1,47 @@
+# tests/bench_dedup.py
+# near-duplicate clustering on a synthetic feed built from the bundled reviews with small edits
+# (casing, punctuation, dropped/duplicated characters): how many LLM calls are left, and how fast
+#   python -m tests.bench_dedup --rows 200000 --noise 0.3
+import argparse
+import random
+import time
+
+from src.config import DATA_PATH
+from src.nodes.dedup import cluster
+from src.nodes.load_reviews import load_reviews
+
+
+def _perturb(text: str, rng: random.Random) -> str:
+    op = rng.randrange(4)
+    if op == 0:
+        return text.upper() if rng.random() < 0.2 else text.lower()
+    if op == 1:
+        return text.rstrip(".") + rng.choice(["!", "!!", " :(", "..."])
+    i = rng.randrange(len(text))
+    if op == 2:
+        return text[:i] + text[i + 1:]
+    return text[:i] + text[i] + text[i:]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--noise", type=float, default=0.3, help="fraction of rows with a small random edit")
+    ap.add_argument("--thresholds", default="1.0,0.85,0.7")
+    args = ap.parse_args()
+
+    rng = random.Random(0)
+    base = load_reviews(DATA_PATH)
+    reviews = []
+    for i in range(args.rows):
+        r = base[i % len(base)]
+        text = _perturb(r.review, rng) if rng.random() < args.noise else r.review
+        reviews.append(r.model_copy(update={"review_id": f"S-{i}", "review": text}))
+    print(f"{len(reviews):,} reviews ({len({r.review for r in reviews}):,} distinct texts)")
+
+    for th in (float(x) for x in args.thresholds.split(",")):
+        t0 = time.perf_counter()
+        reps, _ = cluster(reviews, threshold=th)
+        dt = time.perf_counter() - t0
+        print(f"threshold {th:<5} {len(reps):>8,} LLM calls ({len(reps) / len(reviews):.2%} of rows)  "
+              f"{dt:.2f}s = {len(reviews) / dt:,.0f} reviews/s")
@@ -0,0 +1,59 @@
+# tests/bench_keywords.py
+# rules-only throughput: keyword fallbacks + criticality on every review, no LLM
+#   python -m tests.bench_keywords --rows 200000 --extra-keywords 500
+import argparse
+import random
+import time
+
+from src.config import DATA_PATH
+from src.keywords import KeywordMatcher, get_engine
+from src.nodes.classify_criticality import classify_criticality
+from src.nodes.detect_errors import _apply_fallbacks
+from src.nodes.load_reviews import load_reviews
+
+
+def _rules_only(texts):
+    n = 0
+    for t in texts:
+        for err in _apply_fallbacks(t, []):
+            classify_criticality(err)
+            n += 1
+    return n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--extra-keywords", type=int, default=500,
+                    help="synthetic keywords added to test how matching scales with list size")
+    args = ap.parse_args()
+
+    base = [r.review for r in load_reviews(DATA_PATH)]
+    texts = (base * (args.rows // len(base) + 1))[: args.rows]
+
+    t0 = time.perf_counter()
+    found = _rules_only(texts)
+    dt = time.perf_counter() - t0
+    print(f"rules-only pipeline: {len(texts):,} reviews in {dt:.2f}s = {len(texts) / dt * 60:,.0f} reviews/min "
+          f"({found:,} issues)")
+
+    # scaling: the same texts against the real keyword set vs. a much larger one
+    random.seed(0)
+    vocab = "account export sync invoice team plan seat report chart widget upload folder sso token quota".split()
+    extra = {f"{random.choice(vocab)} {random.choice(vocab)} {random.choice(['broken', 'fails', 'stuck'])}"
+             for _ in range(args.extra_keywords)}
+    engine = get_engine()
+    small = sorted(engine.keywords)
+    big = small + sorted(extra)
+    sample = [t.lower() for t in texts[:50_000]]
+    for label, kws in (("current keywords", small), (f"+{len(extra)} keywords", big)):
+        matcher = KeywordMatcher([("kw", kws)])
+        t0 = time.perf_counter()
+        for t in sample:
+            matcher.scan(t)
+        compiled = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for t in sample:
+            [k for k in kws if k in t]
+        loop = time.perf_counter() - t0
+        print(f"{label:<18} {len(kws):>5} kws  compiled {compiled:.2f}s  vs per-keyword loop {loop:.2f}s")
@@ -0,0 +1,65 @@
+# tests/bench_load_reviews.py
+# time csv -> RawReview loading on a synthetic copy of the bundled dataset
+#   python -m tests.bench_load_reviews --rows 1000000
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from src.config import DATA_PATH
+from src.nodes.load_reviews import load_reviews, iter_reviews
+from src.utils import RawReview
+
+
+def make_synthetic(rows: int, path: str) -> None:
+    # tile the bundled csv and give every row a unique review_id
+    base = pd.read_csv(DATA_PATH)
+    reps = rows // len(base) + 1
+    df = pd.concat([base] * reps, ignore_index=True).iloc[:rows]
+    df["review_id"] = [f"REV-{i:08d}" for i in range(rows)]
+    df.to_csv(path, index=False)
+
+
+def legacy_load(path: str):
+    # the original iterrows loader, kept here as the baseline
+    df = pd.read_csv(path)
+    return [
+        RawReview(
+            review_id=str(row["review_id"]), review=str(row["review"]), username=str(row["username"]),
+            email=str(row["email"]), date=str(row["date"]), reviewer_name=str(row["reviewer_name"]),
+            rating=int(row["rating"]),
+        )
+        for _, row in df.iterrows()
+    ]
+
+
+def _timed(label: str, rows: int, fn) -> None:
+    t0 = time.perf_counter()
+    n = fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<28} {n:>9} rows {dt:>8.2f}s {rows / dt if dt else 0:>12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--chunk-size", type=int, default=100_000)
+    ap.add_argument("--legacy-rows", type=int, default=100_000,
+                    help="rows for the iterrows baseline (it is slow); 0 to skip")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "reviews.csv")
+        make_synthetic(args.rows, path)
+        print(f"synthetic csv: {args.rows:,} rows, {os.path.getsize(path) / 1e6:.1f} MB\n")
+
+        if args.legacy_rows:
+            small = os.path.join(tmp, "legacy.csv")
+            make_synthetic(args.legacy_rows, small)
+            _timed("legacy iterrows", args.legacy_rows, lambda: len(legacy_load(small)))
+        _timed("fast, validated", args.rows, lambda: len(load_reviews(path)))
+        _timed("fast, trusted", args.rows, lambda: len(load_reviews(path, validate=False)))
+        _timed(f"chunked ({args.chunk_size:,}), validated", args.rows,
+               lambda: sum(len(c) for c in iter_reviews(path, args.chunk_size)))
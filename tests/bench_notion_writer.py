@@ -0,0 +1,64 @@
+# tests/bench_notion_writer.py
+# exercise the Notion writer against the local fake server (no real credentials needed)
+#   python -m tests.bench_notion_writer --items 300 --latency 0.05
+#   python -m tests.bench_notion_writer --server-rate-limit 3 --error-rate 0.1 --reject-rate 0.02 --workers 6
+#   python -m tests.bench_notion_writer --lost-rate 0.2     # creates that land but time out: no duplicate pages
+import argparse
+import os
+import tempfile
+import time
+
+from tests.fake_notion import _plain, start
+
+
+def _items(n: int):
+    from src.utils import RawReview, DetectedError, EnrichedError, hash_error
+    out = []
+    for i in range(n):
+        r = RawReview(review_id=f"REV-{i:06d}", review="App crashes when switching workspaces.",
+                      username="u", email="u@mail.com", date="2024-01-01", reviewer_name="U", rating=1)
+        err = DetectedError(error_summary="Mobile app crashes when switching workspaces",
+                            error_type=["Mobile", "Crash"], rationale="bench")
+        out.append(EnrichedError(review=r, error=err, criticality="Critical",
+                                 error_hash=hash_error(r.review_id, err.error_summary)))
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.05, help="fake server latency per request (s)")
+    ap.add_argument("--workers", type=int, default=3)
+    ap.add_argument("--client-rate", type=float, default=3.0, help="client token bucket, requests/s (0 = off)")
+    ap.add_argument("--server-rate-limit", type=float, default=0.0, help="fake server 429s above this rate")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fake server random 429/503 fraction")
+    ap.add_argument("--reject-rate", type=float, default=0.0, help="fake server random 400 fraction on writes")
+    ap.add_argument("--lost-rate", type=float, default=0.0, help="fake server creates answered 504 after applying")
+    args = ap.parse_args()
+
+    server, fake, url = start(latency=args.latency, rate_limit=args.server_rate_limit, error_rate=args.error_rate,
+                              reject_rate=args.reject_rate, lost_rate=args.lost_rate, seed=7)
+    os.environ.update({"NOTION_BASE_URL": url, "NOTION_API_KEY": "fake", "NOTION_DATABASE_ID": "bench-db"})
+    from src.nodes.notion_logger import NotionLogger, get_client
+    from src.state_store import StateStore
+
+    items = _items(args.items)
+    dead_letter = os.path.join(tempfile.mkdtemp(), "dead_letter.jsonl")
+    store = StateStore(os.path.join(os.path.dirname(dead_letter), "state.sqlite"))
+    runs = [("first run (creates)", items), ("re-run (unchanged)", items),
+            ("re-run (all edited)", [e.model_copy(update={"criticality": "Major"}) for e in items])]
+    for label, batch in runs:
+        logger = NotionLogger(get_client(), "bench-db", max_workers=args.workers, rate_limit=args.client_rate,
+                              dead_letter_path=dead_letter, fingerprint_store=store)
+        t0 = time.perf_counter()
+        logger.upsert_many(batch)
+        wall = time.perf_counter() - t0
+        st = logger.stats()
+        print(f"{label:<22} {len(batch) / wall:>7.1f} items/s  api calls/item={st['api_calls'] / len(batch):.2f}  {st}")
+    print(f"server saw: {fake.calls}")
+    hashes = [_plain(p["properties"]["Hash"]) for p in fake.pages.values()]
+    print(f"pages: {len(hashes)} for {len(set(hashes))} hashes ({len(hashes) - len(set(hashes))} duplicates)")
+    if os.path.exists(dead_letter):
+        with open(dead_letter) as f:
+            print(f"dead-lettered: {sum(1 for _ in f)} items ({dead_letter})")
+    server.shutdown()
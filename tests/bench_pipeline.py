@@ -0,0 +1,110 @@
+# tests/bench_pipeline.py
+# full pipeline (load -> triage/dedup/detect -> normalize -> tee) over synthetic datasets, offline:
+# a fake Ollama and a fake Notion run in this process, and each size runs the graph in a fresh child
+# process, so memory and metrics are per run. Reports throughput, per-stage time/items/peak-RSS growth,
+# LLM latency and Notion call counts.
+#   python -m tests.bench_pipeline --sizes 1000,10000,100000 --llm-latency 0.05 --notion-latency 0.01
+#   python -m tests.bench_pipeline --sizes 1000000 --notion-mode issue --stream
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from src.config import DATA_PATH
+from tests import fake_notion, fake_ollama
+
+
+_VOCAB = ("workspace export report sidebar calendar invite billing admin mobile desktop sync upload folder "
+          "project template widget chart filter search comment reminder timeline import token plan").split()
+
+
+def make_dataset(rows: int, path: str, unique: float, seed: int = 0) -> None:
+    # tile the bundled csv with unique review_ids; a `unique` fraction of rows gets a random extra
+    # sentence, different enough that dedup and the cache cannot collapse those rows
+    rng = random.Random(seed)
+    base = pd.read_csv(DATA_PATH)
+    df = pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows].copy()
+    df["review_id"] = [f"SYN-{i:08d}" for i in range(rows)]
+    marked = df.sample(frac=unique, random_state=seed).index
+    extra = [" Also: " + " ".join(rng.sample(_VOCAB, 8)) + "." for _ in range(len(marked))]
+    df.loc[marked, "review"] = df.loc[marked, "review"] + pd.Series(extra, index=marked)
+    df.to_csv(path, index=False)
+
+
+def child(stream: bool, chunk_size: int) -> None:
+    # runs inside the per-size subprocess; env is already pointed at the fakes
+    from src import metrics
+    from src.graph import build_graph, stream_enriched
+
+    t0 = time.perf_counter()
+    if stream:
+        n = sum(len(chunk) for chunk in stream_enriched(chunk_size=chunk_size, full=True))
+    else:
+        n = len(build_graph(full=True).compile().invoke({}))
+    wall = time.perf_counter() - t0
+    print("RESULT " + json.dumps({"wall": wall, "items": n, "report": metrics.report()}))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000")
+    ap.add_argument("--unique", type=float, default=0.2, help="fraction of rows with distinct text")
+    ap.add_argument("--llm-latency", type=float, default=0.05)
+    ap.add_argument("--llm-parallel", type=int, default=4, help="requests the fake Ollama serves at once")
+    ap.add_argument("--notion-latency", type=float, default=0.0)
+    ap.add_argument("--notion-mode", default="review", choices=["review", "issue"])
+    ap.add_argument("--concurrency", type=int, default=4, help="DETECT_CONCURRENCY")
+    ap.add_argument("--batch-size", type=int, default=1, help="DETECT_BATCH_SIZE")
+    ap.add_argument("--stream", action="store_true")
+    ap.add_argument("--chunk-size", type=int, default=1000)
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.stream, args.chunk_size)
+        sys.exit(0)
+
+    _, ollama, ollama_url = fake_ollama.start(latency=args.llm_latency, parallel=args.llm_parallel, seed=0)
+    print(f"fake Ollama {ollama_url} (latency {args.llm_latency}s, {args.llm_parallel} parallel), "
+          f"notion_mode={args.notion_mode}, stream={args.stream}\n")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        # a fresh fake Notion per size, so every run starts from an empty database
+        server, notion, notion_url = fake_notion.start(latency=args.notion_latency)
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "reviews.csv")
+            make_dataset(size, csv_path, args.unique)
+            env = dict(
+                os.environ, DATA_PATH=csv_path, REVIEW_OFFSET="0", STATE_DIR=os.path.join(tmp, "state"),
+                LLM_CACHE_PATH="", METRICS_PATH="", OLLAMA_BASE_URL=ollama_url, NOTION_BASE_URL=notion_url,
+                NOTION_API_KEY="bench", NOTION_DATABASE_ID="bench", NOTION_DRY_RUN="0", NOTION_RATE_LIMIT="0",
+                NOTION_CONCURRENCY="8", NOTION_MODE=args.notion_mode, DETECT_CONCURRENCY=str(args.concurrency),
+                DETECT_BATCH_SIZE=str(args.batch_size),
+            )
+            cmd = [sys.executable, "-m", "tests.bench_pipeline", "--child", "--chunk-size", str(args.chunk_size)]
+            if args.stream:
+                cmd.append("--stream")
+            proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        server.shutdown()
+        line = next((l for l in proc.stdout.splitlines() if l.startswith("RESULT ")), None)
+        if proc.returncode or line is None:
+            print(f"size {size}: child failed\n{proc.stderr[-2000:]}")
+            continue
+        res = json.loads(line[len("RESULT "):])
+        rep = res["report"]
+        print(f"== {size:,} reviews: {res['wall']:.2f}s = {size / res['wall']:,.0f} reviews/s, "
+              f"{res['items']:,} items logged, peak RSS {rep['peak_rss_mb']} MB")
+        print(f"   {'stage':<10} {'calls':>6} {'seconds':>9} {'items in':>10} {'items out':>10} {'RSS +MB':>8}")
+        for name, node in rep["nodes"].items():
+            print(f"   {name:<10} {node['calls']:>6} {node['seconds']:>9.2f} {node['items_in']:>10,} "
+                  f"{node['items_out']:>10,} {node['peak_rss_growth_mb']:>8}")
+        lat = rep["llm"]["latency_ms"]
+        print(f"   llm: {rep['llm']['requests']:,} requests, p50 {lat.get('p50', 0)}ms p95 {lat.get('p95', 0)}ms, "
+              f"{rep['llm']['prompt_tokens']:,}+{rep['llm']['completion_tokens']:,} tokens")
+        print(f"   notion: {rep['notion']['api_calls']}  fake saw {len(notion.pages):,} pages\n")
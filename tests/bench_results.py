@@ -0,0 +1,82 @@
+# tests/bench_results.py
+# memory and speed of the columnar ResultStore vs a plain list of EnrichedError, built the way the pipeline
+# builds them (every review's errors freshly parsed, as from an LLM reply), plus bulk export time
+#   python -m tests.bench_results --reviews 200000 --errors 3
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.nodes.load_reviews import load_reviews
+from src.nodes.normalize import normalize, normalize_into
+from src.config import DATA_PATH
+from src.results import ResultStore
+from src.utils import DetectedError
+from tests.fake_ollama import RULES
+
+
+def _inputs(n_reviews: int, n_errors: int):
+    base = load_reviews(DATA_PATH)
+    reply = json.dumps({"errors": [{"error_summary": s, "error_type": t, "rationale": "Matched a keyword rule."}
+                                   for _, s, t in (RULES * n_errors)[:n_errors]]})
+    for i in range(n_reviews):
+        r = base[i % len(base)].model_copy(update={"review_id": f"SYN-{i:08d}"})
+        # json.loads per review, so strings are distinct objects like real LLM output
+        yield r, [DetectedError(**e) for e in json.loads(reply)["errors"]]
+
+
+def _measure(build):
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = build()
+    wall = time.perf_counter() - t0
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, wall, size
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reviews", type=int, default=100000)
+    ap.add_argument("--errors", type=int, default=3, help="errors per review")
+    args = ap.parse_args()
+
+    inputs = list(_inputs(args.reviews, args.errors))
+    # the reviews themselves are shared by both layouts and already in memory, so only results are counted
+    as_list, t_list, m_list = _measure(lambda: [e for r, errs in inputs for e in normalize(r, errs)])
+
+    def build_store():
+        store = ResultStore()
+        for r, errs in inputs:
+            normalize_into(store, r, errs)
+        return store
+
+    store, t_store, m_store = _measure(build_store)
+    del inputs
+
+    n = len(store)
+    print(f"{args.reviews:,} reviews x {args.errors} errors = {n:,} results")
+    print(f"{'':<22} {'build s':>8} {'MB':>8} {'bytes/result':>13}")
+    print(f"{'list[EnrichedError]':<22} {t_list:>8.2f} {m_list / 2**20:>8.1f} {m_list / n:>13.0f}")
+    print(f"{'ResultStore':<22} {t_store:>8.2f} {m_store / 2**20:>8.1f} {m_store / n:>13.0f}")
+    print(f"-> {m_list / m_store:.1f}x smaller")
+
+    assert [e.model_dump() for e in store[:1000]] == [e.model_dump() for e in as_list[:1000]]
+    t0 = time.perf_counter()
+    k = sum(1 for _ in store)
+    print(f"iterate (lazy EnrichedError): {k / (time.perf_counter() - t0):,.0f} items/s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in ("csv", "parquet"):
+            path = os.path.join(tmp, f"results.{ext}")
+            t0 = time.perf_counter()
+            try:
+                store.export(path)
+            except ImportError as ex:
+                print(f"export .{ext}: skipped ({ex})")
+                continue
+            print(f"export .{ext}: {time.perf_counter() - t0:.2f}s, {os.path.getsize(path) / 2**20:.1f} MB")
@@ -0,0 +1,125 @@
+# tests/bench_service.py
+# service mode against the fake Ollama: the cold cost of a one-shot run for a handful of reviews vs the
+# per-review latency of a warm `python -m src serve` (POST /reviews?wait=1 from concurrent clients),
+# how often a small queue pushes back with 429, and a csv dropped into the spool directory
+#   python -m tests.bench_service --clients 8 --requests 200 --latency 0.05 --queue-size 50
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.bench_pipeline import make_dataset
+from tests.fake_ollama import start
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _post(url: str, body: list) -> tuple:
+    # (status, seconds); 429s are retried after Retry-After, and counted
+    retries = 0
+    t0 = time.perf_counter()
+    while True:
+        req = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=120) as r:
+                return r.status, time.perf_counter() - t0, retries
+        except urllib.error.HTTPError as ex:
+            if ex.code != 429:
+                return ex.code, time.perf_counter() - t0, retries
+            retries += 1
+            time.sleep(float(ex.headers.get("Retry-After", "1")) / 10)
+
+
+def _pct(xs: list, p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))] * 1000
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="POSTs of one review each")
+    ap.add_argument("--latency", type=float, default=0.05, help="fake Ollama seconds per request")
+    ap.add_argument("--batch-size", type=int, default=20)
+    ap.add_argument("--batch-wait", type=float, default=0.2)
+    ap.add_argument("--queue-size", type=int, default=50)
+    ap.add_argument("--spool-rows", type=int, default=300)
+    args = ap.parse_args()
+
+    server, fake, ollama_url = start(latency=args.latency, seed=13)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "reviews.csv")
+        make_dataset(args.requests + args.spool_rows, csv_path, unique=1.0)
+        env = dict(os.environ, DATA_PATH=csv_path, REVIEW_OFFSET="0", STATE_DIR=os.path.join(tmp, "state"),
+                   OLLAMA_BASE_URL=ollama_url, LLM_CACHE_PATH="", METRICS_PATH="", TRIAGE_POLICY="off")
+
+        import pandas as pd
+
+        rows = pd.read_csv(csv_path, dtype=str).to_dict("records")
+        posted, spooled = rows[:args.requests], rows[args.requests:]
+
+        # one-shot: what a cron run pays before its first review is logged
+        few = os.path.join(tmp, "few.csv")
+        pd.DataFrame(posted[:5]).to_csv(few, index=False)
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src", "run", "--dry-run", "--quiet", "--full", "--top-issues", "0"],
+                       env=dict(env, DATA_PATH=few), check=True, capture_output=True)
+        print(f"one-shot run of 5 reviews: {time.perf_counter() - t0:.2f}s (imports, graph compile, first request)")
+
+        port = _free_port()
+        spool = os.path.join(tmp, "spool")
+        os.makedirs(spool)
+        log = open(os.path.join(tmp, "serve.txt"), "w")
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-m", "src", "serve", "--port", str(port), "--spool", spool,
+                                 "--dry-run", "--quiet", "--full", "--batch-size", str(args.batch_size),
+                                 "--batch-wait", str(args.batch_wait), "--queue-size", str(args.queue_size)],
+                                env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        base = f"http://127.0.0.1:{port}"
+        while True:
+            try:
+                urllib.request.urlopen(base + "/health", timeout=1).read()
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise SystemExit(open(log.name).read()[-2000:])
+                time.sleep(0.05)
+        print(f"service up and warm in {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            results = list(pool.map(lambda r: _post(base + "/reviews?wait=1", [r]), posted))
+        wall = time.perf_counter() - t0
+        lat = [s for code, s, _ in results if code == 200]
+        print(f"{len(lat)}/{len(posted)} POSTs ok from {args.clients} clients in {wall:.2f}s "
+              f"({len(posted) / wall:.1f} reviews/s), {sum(r for *_, r in results)} 429 retries")
+        print(f"per-review latency: p50 {_pct(lat, 50):.0f}ms  p95 {_pct(lat, 95):.0f}ms  max {max(lat) * 1000:.0f}ms")
+
+        t0 = time.perf_counter()
+        pd.DataFrame(spooled).to_csv(os.path.join(spool, ".drop.csv"), index=False)
+        os.replace(os.path.join(spool, ".drop.csv"), os.path.join(spool, "drop.csv"))
+        done = os.path.join(spool, "done")
+        while not (os.path.isdir(done) and os.listdir(done)):
+            time.sleep(0.05)
+        print(f"spool: {len(spooled)} reviews from one csv logged in {time.perf_counter() - t0:.2f}s")
+
+        health = json.loads(urllib.request.urlopen(base + "/health").read())
+        print(f"health: {health}")
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=60)
+        log.close()
+        print("shutdown: " + " | ".join(l.strip() for l in open(log.name) if "Done." in l or "[metrics] service" in l))
+    server.shutdown()
@@ -0,0 +1,64 @@
+# tests/bench_shard.py
+# rules-only throughput of the sharded runner vs worker count on a synthetic csv, plus a check that
+# every worker count logs exactly what the single-process pipeline logs (same items, same order).
+# Wall time only speeds up with as many free cores as workers, so the scaling figure is also computed
+# from each shard's own cpu time: total work should stay flat as workers grow, and the projected wall
+# (split + slowest shard + merge) is what the run takes once every shard has a core. The shard speedup
+# (total work / slowest shard) is the shard phase alone; the serial merge and tee bound the rest.
+#   python -m tests.bench_shard --rows 1000000 --workers 1,2,4,8,16,32
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests.bench_pipeline import make_dataset
+
+
+def _run(cmd, env):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "src", *cmd], env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        raise SystemExit(f"{' '.join(cmd)} failed:\n{proc.stderr[-2000:]}")
+    lines = proc.stdout.splitlines()
+    return wall, [l for l in lines if l.startswith("[dry-run] Would upsert")], "\n".join(lines)
+
+
+def _shard_times(out: str) -> tuple:
+    # (split seconds, shard phase wall, cpu seconds per shard) from the [shard] lines
+    split = float(re.search(r"\[shard\] split \d+ rows in ([\d.]+)s", out).group(1))
+    phase = float(re.search(r"\[shard\] \d+ shards in ([\d.]+)s", out).group(1))
+    cpu = [float(x) for x in re.findall(r"\(cpu ([\d.]+)s\)", out)]
+    return split, phase, cpu
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200000)
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--chunk-size", type=int, default=20000, help="SHARD_CHUNK_SIZE")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "reviews.csv")
+        make_dataset(args.rows, csv_path, unique=0.2)
+        env = dict(os.environ, DATA_PATH=csv_path, REVIEW_OFFSET="0", STATE_DIR=os.path.join(tmp, "state"),
+                   METRICS_PATH="", REVIEWS_TRUSTED="1")
+        flags = ["--rules-only", "--dry-run", "--quiet", "--full", "--top-issues", "0"]
+
+        base, ref, _ = _run(["run", *flags], env)
+        print(f"{os.cpu_count()} cores, {args.rows:,} rows, {len(ref):,} items")
+        print(f"{'workers':>8} {'seconds':>9} {'reviews/s':>11} {'speedup':>8} {'split':>7} {'work cpu':>9} "
+              f"{'slowest':>8} {'shard speedup':>14} {'projected':>10} {'proj. speedup':>14}  same output")
+        print(f"{'run':>8} {base:>9.2f} {args.rows / base:>11,.0f} {1.0:>8.2f}")
+        for w in (int(x) for x in args.workers.split(",")):
+            wall, out, text = _run(["shard", "--workers", str(w), "--shards", str(w),
+                                    "--chunk-size", str(args.chunk_size), *flags], env)
+            split, phase, cpu = _shard_times(text)
+            # the shard phase replaced by its slowest shard: the wall time with one core per worker
+            projected = wall - phase + max(cpu)
+            print(f"{w:>8} {wall:>9.2f} {args.rows / wall:>11,.0f} {base / wall:>8.2f} {split:>7.2f} {sum(cpu):>9.2f} "
+                  f"{max(cpu):>8.2f} {sum(cpu) / max(cpu):>14.2f} {projected:>10.2f} {base / projected:>14.2f}  {out == ref}")
@@ -0,0 +1,61 @@
+# tests/bench_sinks.py
+# write throughput of the local result sinks (sqlite upserts, jsonl, parquet) one at a time and all
+# together in parallel, in batches the size tee sees in whole-list or streaming runs
+#   python -m tests.bench_sinks --results 1000000 --batch 50000
+import argparse
+import importlib.util
+import os
+import tempfile
+import time
+
+from src.results import ResultStore
+from tests.bench_results import _inputs
+from src.nodes.normalize import normalize_into
+
+
+def _batches(n: int, batch: int):
+    store = ResultStore()
+    for r, errs in _inputs(max(1, n // 2), 2):
+        normalize_into(store, r, errs)
+    rows = list(store)[:n]
+    return [ResultStore(rows[i:i + batch]) for i in range(0, len(rows), batch)]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--results", type=int, default=200000)
+    ap.add_argument("--batch", type=int, default=20000)
+    args = ap.parse_args()
+
+    from src.sinks import JSONLSink, ParquetSink, SQLiteSink, write_all
+
+    batches = _batches(args.results, args.batch)
+    n = sum(len(b) for b in batches)
+    print(f"{n:,} results in batches of {args.batch:,}")
+    with tempfile.TemporaryDirectory() as tmp:
+        def make(kind: str, tag: str):
+            if kind == "sqlite":
+                return SQLiteSink(os.path.join(tmp, f"{tag}.sqlite"))
+            if kind == "jsonl":
+                return JSONLSink(os.path.join(tmp, f"{tag}.jsonl"))
+            return ParquetSink(os.path.join(tmp, f"{tag}_parquet"))
+
+        kinds = ["sqlite", "jsonl"] + (["parquet"] if importlib.util.find_spec("pyarrow") else [])
+        runs = [[k] for k in kinds] + [kinds]
+        for run in runs:
+            sinks = [make(k, "+".join(run) + k) for k in run]
+            t0 = time.perf_counter()
+            for b in batches:
+                write_all(sinks, b, [])
+            for s in sinks:
+                s.close()
+            wall = time.perf_counter() - t0
+            print(f"{' + '.join(run):<24} {wall:>7.2f}s {n / wall:>12,.0f} results/s")
+        # upserting the same rows again (every row a conflict)
+        s = make("sqlite", "again")
+        write_all([s], batches[0], [])
+        t0 = time.perf_counter()
+        write_all([s], batches[0], [])
+        print(f"{'sqlite re-upsert':<24} {time.perf_counter() - t0:>7.2f}s "
+              f"{len(batches[0]) / (time.perf_counter() - t0):>12,.0f} results/s")
+        s.close()
@@ -0,0 +1,49 @@
+# tests/check_incremental.py
+# the processed-review watermark is per detector: a rules-only run followed by an LLM run still sends every
+# review to the LLM, and a second LLM run sends none. Exits non-zero when either does not hold
+#   python -m tests.check_incremental --rows 200
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from tests.bench_pipeline import make_dataset
+from tests.fake_ollama import start
+
+
+def _run(extra, env):
+    out = subprocess.run([sys.executable, "-m", "src", "run", "--quiet", "--sinks", "sqlite", "--top-issues", "0",
+                          *extra], env=env, capture_output=True, text=True)
+    if out.returncode:
+        raise SystemExit(out.stdout[-2000:] + out.stderr[-2000:])
+    return out.stdout
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200)
+    args = ap.parse_args()
+
+    server, fake, url = start(latency=0.0, seed=5)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "reviews.csv")
+        make_dataset(args.rows, csv_path, unique=1.0)
+        # one LLM call per review: no cache, triage, near-duplicate grouping, batching or small model
+        env = dict(os.environ, DATA_PATH=csv_path, REVIEW_OFFSET="0", STATE_DIR=os.path.join(tmp, "state"),
+                   OLLAMA_BASE_URL=url, LLM_CACHE_PATH="", METRICS_PATH="", TRIAGE_POLICY="off",
+                   DEDUP_ENABLED="0", DETECT_BATCH_SIZE="1", OLLAMA_SMALL_MODEL="", NOTION_DRY_RUN="0")
+
+        _run(["--rules-only"], env)
+        print(f"rules-only run: {fake.calls['chat']} LLM calls")
+        _run([], env)
+        first = fake.calls["chat"]
+        print(f"LLM run after it: {first} LLM calls for {args.rows} reviews")
+        _run([], env)
+        second = fake.calls["chat"] - first
+        print(f"second LLM run: {second} LLM calls")
+    server.shutdown()
+
+    ok = first == args.rows and second == 0
+    print("ok" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
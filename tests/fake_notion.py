@@ -0,0 +1,208 @@
+# tests/fake_notion.py
+# in-memory stand-in for the slice of the Notion API the logger uses:
+#   GET /v1/databases/{id}, POST /v1/databases/{id}/query, POST /v1/pages, PATCH /v1/pages/{id}
+# optional fault injection: a server-side rate limit answered with 429 + Retry-After, random 429/503s,
+# random 400 validation errors (permanent failures that should end up in the dead-letter file), and
+# lost responses: a page create that is applied but answered with 504, as when only the response is lost
+# run standalone:  python -m tests.fake_notion --port 8765
+# then:            NOTION_BASE_URL=http://127.0.0.1:8765 NOTION_API_KEY=x NOTION_DATABASE_ID=db python -m src.run
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+_PROP_IDS = {"ReviewID": "title", "Reviewer": "rvwr", "Date": "date", "ReviewText": "rtxt",
+             "ErrorSummary": "esum", "ErrorType": "etyp", "Criticality": "crit", "Rationale": "rtnl",
+             "Hash": "hash"}
+
+
+def _to_response(props: Dict[str, Any]) -> Dict[str, Any]:
+    # request payloads use text.content; responses also carry plain_text like the real API
+    out = {}
+    for name, value in props.items():
+        value = json.loads(json.dumps(value))
+        for key in ("title", "rich_text"):
+            for t in value.get(key) or []:
+                t["plain_text"] = (t.get("text") or {}).get("content", "")
+        value["id"] = _PROP_IDS.get(name, name)
+        out[name] = value
+    return out
+
+
+def _plain(prop: Dict[str, Any]) -> str:
+    items = prop.get("rich_text") or prop.get("title") or []
+    return "".join(t.get("plain_text", "") for t in items)
+
+
+def _error(status: int, code: str, message: str, retry_after: Optional[float] = None) -> tuple:
+    payload: Dict[str, Any] = {"object": "error", "status": status, "code": code, "message": message}
+    if retry_after is not None:
+        payload["_headers"] = {"Retry-After": f"{retry_after:g}"}
+    return status, payload
+
+
+class FakeNotion:
+    def __init__(self, latency: float = 0.0, rate_limit: float = 0.0, error_rate: float = 0.0,
+                 reject_rate: float = 0.0, lost_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.lost_rate = lost_rate
+        self.rng = random.Random(seed)
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self.order: List[str] = []
+        self.calls: Dict[str, int] = {"retrieve": 0, "query": 0, "create": 0, "update": 0,
+                                      "throttled": 0, "injected_errors": 0, "rejected": 0,
+                                      "lost": 0}
+        self.lock = threading.Lock()
+        self._window: List[float] = []
+
+    def _over_limit(self) -> Optional[float]:
+        # sliding one-second window; returns a Retry-After when the request exceeds rate_limit
+        if not self.rate_limit:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                self.calls["throttled"] += 1
+                return round(1.0 - (now - self._window[0]), 3)
+            self._window.append(now)
+        return None
+
+    def handle(self, method: str, path: str, query: Dict[str, List[str]], body: Dict[str, Any]):
+        if self.latency:
+            time.sleep(self.latency)
+        retry_after = self._over_limit()
+        if retry_after is not None:
+            return _error(429, "rate_limited", "You have been rate limited.", retry_after)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            with self.lock:
+                self.calls["injected_errors"] += 1
+            if self.rng.random() < 0.5:
+                return _error(429, "rate_limited", "Injected rate limit.", 0.2)
+            return _error(503, "service_unavailable", "Injected outage.")
+        if self.reject_rate and method in ("POST", "PATCH") and "pages" in path and self.rng.random() < self.reject_rate:
+            with self.lock:
+                self.calls["rejected"] += 1
+            return _error(400, "validation_error", "Injected validation error.")
+        parts = [p for p in path.split("/") if p][1:]  # drop "v1"
+        if method == "GET" and len(parts) == 2 and parts[0] == "databases":
+            return 200, self._retrieve(parts[1])
+        if method == "POST" and len(parts) == 3 and parts[0] == "databases" and parts[2] == "query":
+            return 200, self._query(body, query.get("filter_properties"))
+        if method == "POST" and parts == ["pages"]:
+            page = self._create(body)
+            if self.lost_rate and self.rng.random() < self.lost_rate:
+                with self.lock:
+                    self.calls["lost"] += 1
+                return _error(504, "gateway_timeout", "Injected lost response (page was created).")
+            return 200, page
+        if method == "PATCH" and len(parts) == 2 and parts[0] == "pages":
+            return self._update(parts[1], body)
+        return _error(404, "object_not_found", f"{method} {path}")
+
+    def _retrieve(self, db_id: str) -> Dict[str, Any]:
+        with self.lock:
+            self.calls["retrieve"] += 1
+        return {"object": "database", "id": db_id, "title": [{"plain_text": "Fake reviews"}],
+                "properties": {name: {"id": pid, "name": name} for name, pid in _PROP_IDS.items()}}
+
+    def _query(self, body: Dict[str, Any], only: Optional[List[str]]) -> Dict[str, Any]:
+        with self.lock:
+            self.calls["query"] += 1
+            pages = [self.pages[i] for i in self.order]
+        flt = body.get("filter") or {}
+        if flt.get("property"):
+            want = (flt.get("rich_text") or {}).get("equals")
+            pages = [p for p in pages if _plain(p["properties"].get(flt["property"], {})) == want]
+        start = int(body.get("start_cursor") or 0)
+        size = int(body.get("page_size") or 100)
+        chunk = pages[start:start + size]
+        if only:
+            chunk = [dict(p, properties={k: v for k, v in p["properties"].items() if v["id"] in only})
+                     for p in chunk]
+        more = start + size < len(pages)
+        return {"object": "list", "results": chunk, "has_more": more,
+                "next_cursor": str(start + size) if more else None}
+
+    def _create(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        page = {"object": "page", "id": str(uuid.uuid4()), "parent": body.get("parent"),
+                "properties": _to_response(body.get("properties") or {})}
+        with self.lock:
+            self.calls["create"] += 1
+            self.pages[page["id"]] = page
+            self.order.append(page["id"])
+        return page
+
+    def _update(self, page_id: str, body: Dict[str, Any]):
+        with self.lock:
+            self.calls["update"] += 1
+            page = self.pages.get(page_id)
+            if page is None:
+                return _error(404, "object_not_found", page_id)
+            page["properties"].update(_to_response(body.get("properties") or {}))
+        return 200, page
+
+
+def _handler(fake: FakeNotion):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out as separate writes; without this, delayed ACKs add ~40ms per request
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _serve(self):
+            url = urlparse(self.path)
+            n = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(n) or b"{}") if n else {}
+            status, payload = fake.handle(self.command, url.path, parse_qs(url.query), body)
+            headers = payload.pop("_headers", {}) if isinstance(payload, dict) else {}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _serve
+
+    return Handler
+
+
+def start(port: int = 0, **kwargs) -> tuple:
+    # returns (server, fake, base_url); the server runs on a daemon thread
+    fake = FakeNotion(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(fake))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    ap.add_argument("--rate-limit", type=float, default=0.0, help="requests/s before answering 429 (0 = off)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 429/503")
+    ap.add_argument("--reject-rate", type=float, default=0.0, help="fraction of page writes failing with 400")
+    ap.add_argument("--lost-rate", type=float, default=0.0, help="fraction of creates applied but answered 504")
+    args = ap.parse_args()
+    server, fake, url = start(args.port, latency=args.latency, rate_limit=args.rate_limit,
+                              error_rate=args.error_rate, reject_rate=args.reject_rate, lost_rate=args.lost_rate)
+    print(f"fake Notion listening on {url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"pages={len(fake.pages)} calls={fake.calls}")
+    except KeyboardInterrupt:
+        server.shutdown()
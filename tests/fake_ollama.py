@@ -0,0 +1,205 @@
+# tests/fake_ollama.py
+# stand-in for the slice of the Ollama API the pipeline uses: POST /api/chat (single and batched
+# detection prompts), POST /api/embeddings, GET /api/tags
+# answers are built from a few keyword rules over the review text, so downstream stages see realistic
+# output; latency, parallel slots (like OLLAMA_NUM_PARALLEL), slowdown under load, 500s and malformed JSON
+# are configurable, latency and malformed rate also per model (e.g. a fast, sloppier small model)
+# run standalone:  python -m tests.fake_ollama --port 11500 --latency 0.2 --parallel 4
+# then:            OLLAMA_BASE_URL=http://127.0.0.1:11500 python -m src.run
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# (keywords, summary, types) checked against the lowercased review text
+RULES = [
+    (("crash",), "Mobile app crashes when switching workspaces", ["Mobile", "Crash"]),
+    (("invoice", "overcharged", "billing"), "Invoice amounts do not match usage", ["Billing"]),
+    (("authentication", "session", "login"), "Sessions expire unexpectedly", ["Auth"]),
+    (("api v2", "backward compatib"), "API v2 breaks backward compatibility", ["API"]),
+    (("slow", "latency", "timeout"), "Dashboard is slow to load", ["Performance"]),
+    (("webhook",), "Webhooks are not delivered", ["Webhooks"]),
+    (("could you add", "please add", "feature request", "would love"), "Feature request from review", ["Other"]),
+]
+
+# the last block: the few-shot examples before it use the same layout
+_SINGLE = re.compile(r".*Review:\n```\n(.*?)\n```\nReturn JSON only:\s*$", re.S)
+_BATCH = re.compile(r"Reviews:\n(\[[^\n]*\])\nReturn JSON only:\s*$")
+
+
+def errors_for(text: str) -> List[Dict[str, Any]]:
+    t = text.lower()
+    return [{"error_summary": summary, "error_type": types, "rationale": "Matched a fake-Ollama keyword rule."}
+            for kws, summary, types in RULES if any(k in t for k in kws)]
+
+
+class FakeOllama:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, per_token: float = 0.0, parallel: int = 0,
+                 error_rate: float = 0.0, malformed_rate: float = 0.0, output: Optional[str] = None,
+                 seed: Optional[int] = None, contention: float = 0.0,
+                 model_latency: Optional[Dict[str, float]] = None, model_malformed: Optional[Dict[str, float]] = None):
+        self.latency = latency
+        self.contention = contention  # extra seconds per other request being served at the same time
+        self.model_latency = model_latency or {}
+        self.model_malformed = model_malformed or {}
+        self.active = 0
+        self.jitter = jitter
+        self.per_token = per_token  # extra seconds per completion token, so batched replies take longer
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.output = output  # fixed reply content instead of the keyword rules
+        self.rng = random.Random(seed)
+        self.slots = threading.Semaphore(parallel) if parallel else None
+        self.calls: Dict[str, int] = {"chat": 0, "batched": 0, "embeddings": 0, "errors": 0, "malformed": 0,
+                                      "prompt_tokens": 0, "completion_tokens": 0}
+        self.by_model: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def _bump(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.calls[key] += n
+
+    def _reply(self, prompt: str) -> str:
+        if self.output is not None:
+            return self.output
+        m = _BATCH.search(prompt)
+        if m:
+            self._bump("batched")
+            items = json.loads(m.group(1))
+            return json.dumps({"results": [{"review_id": it["review_id"], "errors": errors_for(it["review"])}
+                                           for it in items]})
+        m = _SINGLE.search(prompt)
+        return json.dumps({"errors": errors_for(m.group(1) if m else "")})
+
+    def chat(self, body: Dict[str, Any]):
+        self._bump("chat")
+        model = body.get("model", "fake")
+        with self.lock:
+            self.by_model[model] = self.by_model.get(model, 0) + 1
+            malformed_rate = self.model_malformed.get(model, self.malformed_rate)
+            fail = self.error_rate and self.rng.random() < self.error_rate
+            garble = malformed_rate and self.rng.random() < malformed_rate
+            delay = self.model_latency.get(model, self.latency)
+            delay += self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages") or [])
+        content = self._reply(prompt)
+        if garble:
+            self._bump("malformed")
+            content = content[: len(content) // 2]
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = max(1, len(content) // 4)
+        delay += self.per_token * completion_tokens
+        if self.slots:
+            with self.slots:
+                self._serve(delay)
+        else:
+            self._serve(delay)
+        if fail:
+            self._bump("errors")
+            return 500, {"error": "injected server error"}
+        self._bump("prompt_tokens", prompt_tokens)
+        self._bump("completion_tokens", completion_tokens)
+        return 200, {
+            "model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "message": {"role": "assistant", "content": content}, "done": True,
+            "total_duration": int(delay * 1e9), "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens,
+        }
+
+    def _serve(self, delay: float) -> None:
+        with self.lock:
+            self.active += 1
+            delay += self.contention * (self.active - 1)
+        try:
+            if delay:
+                time.sleep(delay)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def embeddings(self, body: Dict[str, Any]):
+        # hashed bag of words, so summaries sharing words get a high cosine similarity
+        self._bump("embeddings")
+        vec = [0.0] * 64
+        for w in re.findall(r"[a-z0-9]+", (body.get("prompt") or "").lower()):
+            vec[int(hashlib.md5(w.encode()).hexdigest(), 16) % 64] += 1.0
+        return 200, {"embedding": vec}
+
+
+def _handler(fake: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out as separate writes; without this, delayed ACKs add ~40ms per request
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload: Dict[str, Any], ndjson: bool = False):
+            data = json.dumps(payload).encode() + (b"\n" if ndjson else b"")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/x-ndjson" if ndjson else "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/api/tags":
+                return self._send(200, {"models": [{"name": "fake:latest"}]})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(n) or b"{}") if n else {}
+            if self.path == "/api/chat":
+                status, payload = fake.chat(body)
+                return self._send(status, payload, ndjson=status == 200)
+            if self.path == "/api/embeddings":
+                return self._send(*fake.embeddings(body))
+            self._send(404, {"error": f"unknown path {self.path}"})
+
+    return Handler
+
+
+def start(port: int = 0, **kwargs) -> tuple:
+    # returns (server, fake, base_url); the server runs on a daemon thread
+    fake = FakeOllama(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=11500)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    ap.add_argument("--jitter", type=float, default=0.0, help="extra uniform random seconds per request")
+    ap.add_argument("--per-token", type=float, default=0.0, help="extra seconds per completion token")
+    ap.add_argument("--parallel", type=int, default=0, help="requests served at once (0 = unlimited)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    ap.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of replies with truncated JSON")
+    ap.add_argument("--contention", type=float, default=0.0,
+                    help="extra seconds per request already being served (slowdown under load)")
+    ap.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                    help="latency for one model instead of --latency (repeatable)")
+    ap.add_argument("--model-malformed", action="append", default=[], metavar="MODEL=RATE",
+                    help="malformed rate for one model instead of --malformed-rate (repeatable)")
+    ap.add_argument("--output", default=None, help="fixed reply content, e.g. '{\"errors\":[]}'")
+    args = ap.parse_args()
+    server, fake, url = start(args.port, latency=args.latency, jitter=args.jitter, per_token=args.per_token,
+                              parallel=args.parallel, error_rate=args.error_rate,
+                              malformed_rate=args.malformed_rate, output=args.output, contention=args.contention,
+                              model_latency={m: float(v) for m, v in (x.split("=", 1) for x in args.model_latency)},
+                              model_malformed={m: float(v) for m, v in (x.split("=", 1) for x in args.model_malformed)})
+    print(f"fake Ollama listening on {url}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"calls={fake.calls}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,63 @@
+# tests/triage_report.py
+# how much the rules-only triage saves and what it misses, against a full-LLM run on the same reviews
+# (needs a running Ollama; repeated runs are served from the LLM cache)
+#   python -m tests.triage_report --n 200
+import argparse
+from collections import Counter
+
+from src.config import DATA_PATH, OLLAMA_MODEL, DETECT_CONCURRENCY, TRIAGE_SAMPLE_RATE
+from src.nodes.load_reviews import load_reviews
+from src.nodes.detect_errors import detect_errors_many
+from src.nodes.triage import route, triage
+
+
+def _issue_keys(errs) -> set:
+    return {(tuple(e.error_type), e.error_summary.strip().lower()) for e in errs}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=0, help="first N reviews (0 = all)")
+    ap.add_argument("--model", default=OLLAMA_MODEL)
+    ap.add_argument("--workers", type=int, default=DETECT_CONCURRENCY)
+    ap.add_argument("--show-misses", type=int, default=10)
+    args = ap.parse_args()
+
+    reviews = load_reviews(DATA_PATH)
+    if args.n:
+        reviews = reviews[: args.n]
+
+    reasons = Counter(triage(r)[1] for r in reviews)
+    print(f"{len(reviews)} reviews, model={args.model}")
+    for reason, n in reasons.most_common():
+        print(f"  {reason:<32} {n:>6}")
+
+    # reference: every review through the LLM (plus keyword fallbacks), as with TRIAGE_POLICY=off
+    full = list(detect_errors_many(reviews, args.model, max_workers=args.workers))
+
+    # flagged reviews can only be lost, never gained, so precision is 1 by construction; what triage gets
+    # wrong is calling a review clean. "sampled miss" is the share of sampled clean reviews the LLM flagged,
+    # the estimate a sample run reports (triage.sampled_misses / sampled), next to the true rate below
+    print(f"\n{'policy':<7} {'LLM calls':>10} {'saved':>7} {'rev recall':>11} {'issue recall':>13} {'sampled miss':>13}")
+    truth = {i for i, errs in enumerate(full) if errs}
+    issues = sum(len(_issue_keys(errs)) for errs in full)
+    for policy in ("off", "sample", "skip"):
+        to_llm, skipped, sampled = route(reviews, policy=policy, sample_rate=TRIAGE_SAMPLE_RATE)
+        skip = set(skipped)
+        # a triaged run reports exactly the full run's output for reviews it sends, nothing for skipped ones
+        flagged = truth - skip
+        kept = sum(len(_issue_keys(errs)) for i, errs in enumerate(full) if i not in skip)
+        rec = len(flagged) / len(truth) if truth else 1.0
+        miss = f"{len(truth.intersection(sampled)) / len(sampled):.3f}" if sampled else "-"
+        print(f"{policy:<7} {len(to_llm):>10} {len(skipped):>7} {rec:>11.3f} "
+              f"{(kept / issues if issues else 1.0):>13.3f} {miss:>13}")
+
+    _, skipped, _ = route(reviews, policy="skip")
+    misses = [i for i in skipped if full[i]]
+    rate = f" ({len(misses) / len(skipped):.3f})" if skipped else ""
+    print(f"\nclean (skipped) reviews the full run flagged: {len(misses)} of {len(skipped)}{rate}")
+    for i in misses[: args.show_misses]:
+        r = reviews[i]
+        print(f"  {r.review_id} (rating={r.rating}) {r.review!r}")
+        for e in full[i]:
+            print(f"      -> [{e.error_type}] {e.error_summary}")